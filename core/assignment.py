@@ -0,0 +1,91 @@
+EXACT_MAX_SIDE = 12  # tập nhỏ (chiều ngắn <= này) thì ghép tối ưu bằng Hungarian
+EXACT_MAX_CELLS = 4096  # và ma trận chi phí không quá số ô này
+
+def travel_cost(ax, ay, bx, by):
+    # Số bước đi 8 hướng trên lưới khi không có vật cản
+    return max(abs(ax - bx), abs(ay - by))
+
+def role_weighted_cost(distance, task_type, preferred, weight):
+    """
+    Chi phí = quãng đường + weight * thứ hạng của task_type trong preferred;
+    loại không có trong preferred xếp sau cùng.
+    """
+    try:
+        rank = preferred.index(task_type)
+    except ValueError:
+        rank = len(preferred)
+    return distance + weight * rank
+
+def assign(workers, tasks, cost, exact_max_side=EXACT_MAX_SIDE):
+    """
+    Ghép mỗi worker với nhiều nhất một task sao cho tổng cost(worker, task)
+    nhỏ. cost trả về None nghĩa là không được ghép cặp đó. Tập nhỏ dùng
+    Hungarian (tối ưu), tập lớn dùng greedy theo cặp rẻ nhất. Kết quả là list
+    (worker, task) theo thứ tự worker, tất định với cùng đầu vào.
+    """
+    if not workers or not tasks:
+        return []
+    matrix = [[cost(w, t) for t in tasks] for w in workers]
+    n, m = len(workers), len(tasks)
+    if min(n, m) <= exact_max_side and n * m <= EXACT_MAX_CELLS:
+        pairs = _hungarian(matrix)
+    else:
+        pairs = _greedy(matrix)
+    return [(workers[i], tasks[j]) for i, j in pairs]
+
+def _greedy(matrix):
+    cells = sorted((c, i, j) for i, row in enumerate(matrix) for j, c in enumerate(row) if c is not None)
+    used_w, used_t, pairs = set(), set(), []
+    for _, i, j in cells:
+        if i in used_w or j in used_t:
+            continue
+        used_w.add(i)
+        used_t.add(j)
+        pairs.append((i, j))
+    return sorted(pairs)
+
+def _hungarian(matrix):
+    # Thuật toán Hungarian với thế vị, O(n^2 m), n <= m (chuyển vị nếu cần)
+    n, m = len(matrix), len(matrix[0])
+    transposed = n > m
+    if transposed:
+        matrix = [list(col) for col in zip(*matrix)]
+        n, m = m, n
+    inf = float("inf")
+    big = 1 + sum(max((c for c in row if c is not None), default=0) for row in matrix)
+    a = [[big if c is None else c for c in row] for row in matrix]
+    u, v = [0] * (n + 1), [0] * (m + 1)
+    p, way = [0] * (m + 1), [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], inf, 0
+            row = a[i0 - 1]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j], way[j] = cur, j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    pairs = [(p[j] - 1, j - 1) for j in range(1, m + 1) if p[j] and a[p[j] - 1][j - 1] < big]
+    if transposed:
+        pairs = [(j, i) for i, j in pairs]
+    return sorted(pairs)
@@ -1,4 +1,4 @@
-import random
+from core.rng import get_rng
 from core.npc import NPC
 from core.quest import Quest
 
@@ -9,21 +9,23 @@ SKILLS = ["gather", "farm", "combat", "defend", "trade", "negotiation", "magic",
 class AutoGen:
     @staticmethod
     def gen_npc(npcid=None):
-        name = random.choice(NAMES)
-        job = random.choice(JOBS)
-        level = random.randint(1, 7)
-        exp = random.randint(0, 90)
-        skills = random.sample(SKILLS, k=2)
-        return NPC(npcid or f"npc_auto_{random.randint(1000,9999)}", name, {
+        rng = get_rng("autogen")
+        name = rng.choice(NAMES)
+        job = rng.choice(JOBS)
+        level = rng.randint(1, 7)
+        exp = rng.randint(0, 90)
+        skills = rng.sample(SKILLS, k=2)
+        return NPC(npcid or f"npc_auto_{rng.randint(1000,9999)}", name, {
             "name": name, "job": job, "level": level, "exp": exp, "skills": skills, 
             "house": None, "party": None, "morale": 1.0, "loyalty": 1.0
         })
     
     @staticmethod
     def gen_quest():
-        key = f"quest_auto_{random.randint(1000,9999)}"
-        name = random.choice(["Thám hiểm rừng sâu", "Tiêu diệt boss", "Khám phá kho báu", "Hộ tống thương nhân", "Xây dựng công trình"])
+        rng = get_rng("autogen")
+        key = f"quest_auto_{rng.randint(1000,9999)}"
+        name = rng.choice(["Thám hiểm rừng sâu", "Tiêu diệt boss", "Khám phá kho báu", "Hộ tống thương nhân", "Xây dựng công trình"])
         desc = f"Nhiệm vụ tự động sinh: {name}"
-        reward = {"gold": random.randint(50,300), "exp": random.randint(10,40)}
-        require = {"party": 1, "job": random.choice(JOBS)}
+        reward = {"gold": rng.randint(50,300), "exp": rng.randint(10,40)}
+        require = {"party": 1, "job": rng.choice(JOBS)}
         return Quest(key, {"name": name, "desc": desc, "reward": reward, "require": require})
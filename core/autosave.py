@@ -0,0 +1,271 @@
+import json
+import os
+import queue
+import re
+import struct
+import sys
+import threading
+import time
+from itertools import islice
+
+from core.savegame import (MEMBER, StringTable, build_simulation, capture_state, layout, list_lengths,
+                           merge_meta, pack_commands, pack_member, read_state, state_meta, unpack_commands,
+                           unpack_members, write_sections, write_state)
+from core.worldmap import TileBlock
+
+DELTA_MAGIC = b"FWDELTA\0"
+DELTA_VERSION = 1
+# magic, version, cờ little-endian, base seq, delta seq, rồi (offset, length) của meta, tiles, members, commands
+DELTA_HEADER = struct.Struct("<8sHBxII8Q")
+# x, y rồi đủ các trường của TileBlock theo thứ tự fields()
+TILE = struct.Struct("<II" + "".join(TileBlock.FIELD_TYPES))
+MEMBER_INDEX = struct.Struct("<I")
+BASE_NAME = "base-{:06d}.fws"
+DELTA_NAME = "delta-{:06d}-{:06d}.fwd"
+BASE_RE = re.compile(r"base-(\d{6})\.fws$")
+DELTA_RE = re.compile(r"delta-(\d{6})-(\d{6})\.fwd$")
+
+class AutoSaver:
+    """
+    Autosave nền theo delta. Tile bị sửa được đánh dấu qua tile listener của
+    WorldMap (cạn tài nguyên, đặt/xong công trình, mọc lại), member qua member
+    listener của WorldMap và change listener của Sect; hàng lệnh và tập tile
+    đang mọc lại chỉ ghi khi version của chúng đổi. Mỗi checkpoint chụp ở ranh
+    giới tick chỉ phần đã đổi, rồi một thread ghi ra file delta; cứ
+    compact_every delta thì ghi lại một base đầy đủ và xoá delta cũ. Thread
+    ghi còn bận thì checkpoint bị hoãn (thay đổi vẫn được giữ), vòng lặp
+    chính không bao giờ phải chờ I/O.
+    """
+    def __init__(self, sim, directory="saves/autosave", interval=300, compact_every=20):
+        if sim.worldmap.chunks is not None:
+            raise ValueError("Chưa hỗ trợ autosave world dạng chunk")
+        os.makedirs(directory, exist_ok=True)
+        self.sim = sim
+        self.directory = directory
+        self.interval = interval  # số tick giữa hai checkpoint
+        self.compact_every = compact_every
+        self.base_seq = max(_bases(directory), default=0)
+        self.delta_seq = 0
+        self.last_tick = sim.tick
+        self.last_error = None
+        self.stats = {"bases": 0, "deltas": 0, "tiles_written": 0, "deferred": 0, "errors": 0,
+                      "capture_ms": 0.0, "max_capture_ms": 0.0}
+        self._dirty = set()  # (x,y) đã sửa từ checkpoint trước
+        self._strings = StringTable()  # dùng chung mọi checkpoint để record so sánh được với nhau
+        self._members = []  # (record, extra) đã ghi, theo thứ tự member
+        self._index = {}  # member id: chỉ số trong _members
+        self._dirty_members = set()  # id member đã đổi từ checkpoint trước
+        self._versions = None  # version hàng lệnh collect/build lúc ghi lần trước
+        self._ecology_version = None
+        self._since = None
+        self._need_base = True
+        self._jobs = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._writer, name="autosave", daemon=True)
+        self._thread.start()
+        sim.worldmap.add_tile_listener(self._on_tiles_changed)
+        sim.worldmap.add_member_listener(self._on_members_changed)
+        sim.sect.add_change_listener(self._on_member_changed)
+
+    def _on_tiles_changed(self, cells):
+        self._dirty.update(cells)
+
+    def _on_members_changed(self, members):
+        self._dirty_members.update(m.id for m in members)
+
+    def _on_member_changed(self, member):
+        self._dirty_members.add(member.id)
+
+    def _queue_versions(self):
+        ai = self.sim.leader_ai
+        return ai.collect_queue.version, ai.build_queue.version
+
+    def maybe_checkpoint(self):
+        if self.sim.tick - self.last_tick < self.interval:
+            return False
+        if self.checkpoint():
+            return True
+        # Thread ghi còn bận: thay đổi vẫn được giữ, thử lại ở mốc interval sau thay vì mỗi tick
+        self.last_tick = self.sim.tick
+        return False
+
+    def checkpoint(self, full=False):
+        """Chụp trạng thái hiện tại và giao cho thread ghi. Trả về False nếu thread còn bận."""
+        if self._jobs.full():
+            self.stats["deferred"] += 1
+            return False
+        t0 = time.perf_counter()
+        if full or self._need_base or self.delta_seq >= self.compact_every:
+            job = self._capture_base()
+        else:
+            job = self._capture_delta()
+        self._jobs.put_nowait(job)
+        self.last_tick = self.sim.tick
+        ms = (time.perf_counter() - t0) * 1000
+        self.stats["capture_ms"] += ms
+        self.stats["max_capture_ms"] = max(self.stats["max_capture_ms"], ms)
+        return True
+
+    def _capture_base(self):
+        sim = self.sim
+        self.base_seq += 1
+        self.delta_seq = 0
+        self._need_base = False
+        self._dirty.clear()
+        self._dirty_members.clear()
+        state = capture_state(sim, self._strings)
+        extras = state["meta"]["members_extra"]
+        recs = state["members"]
+        self._members = [(recs[k:k + MEMBER.size], extras.get(str(i), {}))
+                         for i, k in enumerate(range(0, len(recs), MEMBER.size))]
+        self._index = {mid: i for i, mid in enumerate(sim.sect.members)}
+        self._versions = self._queue_versions()
+        self._ecology_version = sim.ecology.version
+        self._since = list_lengths(sim)
+        return ("base", self.base_seq, state)
+
+    def _capture_delta(self):
+        sim = self.sim
+        wm = sim.worldmap
+        fields, h = wm.grid.fields(), wm.h
+        tiles = bytearray()
+        for x, y in self._dirty:
+            i = x * h + y
+            tiles += TILE.pack(x, y, *(a[i] for a in fields))
+        self.stats["tiles_written"] += len(self._dirty)
+        self._dirty.clear()
+
+        # Chỉ đóng gói member được báo đổi và member mới thêm vào sect
+        members = sim.sect.members
+        todo = sorted((self._index[mid], members[mid]) for mid in self._dirty_members if mid in self._index)
+        self._dirty_members.clear()
+        for m in islice(members.values(), len(self._members), None):
+            self._index[m.id] = len(self._members)
+            todo.append((len(self._members), m))
+            self._members.append(None)
+        changed, extras = bytearray(), {}
+        for i, m in todo:
+            packed = pack_member(m, self._strings)
+            if self._members[i] == packed:
+                continue
+            self._members[i] = packed
+            changed += MEMBER_INDEX.pack(i) + packed[0]
+            extras[str(i)] = packed[1]
+        versions = self._queue_versions()
+        commands_changed = versions != self._versions
+        if commands_changed:
+            commands = pack_commands(sim.leader_ai, self._index, self._strings)
+            self._versions = versions
+        ecology_changed = sim.ecology.version != self._ecology_version
+        self._ecology_version = sim.ecology.version
+
+        meta = state_meta(sim, self._since, ecology=ecology_changed)
+        self._since = list_lengths(sim)
+        meta["members_extra"] = extras
+        meta["commands_changed"] = commands_changed
+        meta["strings"] = list(self._strings.items)
+        self.delta_seq += 1
+        return ("delta", self.base_seq, self.delta_seq, meta, bytes(tiles), bytes(changed),
+                commands if commands_changed else b"")
+
+    def _writer(self):
+        while True:
+            job = self._jobs.get()
+            try:
+                if job is None:
+                    return
+                if job[0] == "base":
+                    self._write_base(*job[1:])
+                else:
+                    self._write_delta(*job[1:])
+            except OSError as e:
+                # Chuỗi delta đã đứt: lần sau ghi base mới
+                self.last_error = e
+                self.stats["errors"] += 1
+                self._need_base = True
+            finally:
+                self._jobs.task_done()
+
+    def _write_base(self, seq, state):
+        write_state(state, os.path.join(self.directory, BASE_NAME.format(seq)))
+        self.stats["bases"] += 1
+        # Base mới đã nằm trên đĩa: bỏ base và delta cũ hơn
+        for name in os.listdir(self.directory):
+            m = BASE_RE.match(name) or DELTA_RE.match(name)
+            if m and int(m.group(1)) < seq:
+                os.remove(os.path.join(self.directory, name))
+
+    def _write_delta(self, base_seq, seq, meta, tiles, members, commands):
+        meta_raw = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        table, placed = layout([meta_raw, tiles, members, commands], DELTA_HEADER.size)
+        header = DELTA_HEADER.pack(DELTA_MAGIC, DELTA_VERSION, sys.byteorder == "little", base_seq, seq, *table)
+        write_sections(os.path.join(self.directory, DELTA_NAME.format(base_seq, seq)), header, placed)
+        self.stats["deltas"] += 1
+
+    def flush(self):
+        # Chờ mọi checkpoint đã chụp được ghi xong
+        self._jobs.join()
+
+    def close(self, final=True):
+        if final:
+            while not self.checkpoint():
+                self.flush()
+        self._jobs.put(None)
+        self._thread.join()
+        self.sim.worldmap.remove_tile_listener(self._on_tiles_changed)
+        self.sim.worldmap.remove_member_listener(self._on_members_changed)
+        self.sim.sect.remove_change_listener(self._on_member_changed)
+
+def _bases(directory):
+    if not os.path.isdir(directory):
+        return []
+    return [int(m.group(1)) for m in map(BASE_RE.match, os.listdir(directory)) if m]
+
+def _read_delta(path, base_seq, seq):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, _, file_base, file_seq, *table = DELTA_HEADER.unpack_from(data, 0)
+    if magic != DELTA_MAGIC or version > DELTA_VERSION or (file_base, file_seq) != (base_seq, seq):
+        raise ValueError(f"{path} không phải delta {seq} của base {base_seq}")
+    sections = [data[table[k]:table[k] + table[k + 1]] for k in range(0, len(table), 2)]
+    meta = json.loads(sections[0].decode("utf-8"))
+    return meta, sections[1], sections[2], sections[3]
+
+def load_autosave(directory="saves/autosave"):
+    """
+    Dựng lại Simulation từ base mới nhất trong directory cộng chuỗi delta liền
+    mạch của nó. Tile của delta được ghi thẳng vào mảng tile đã mmap trước khi
+    dựng world, nên chi phí nạp theo kích thước base cộng lượng thay đổi.
+    """
+    bases = _bases(directory)
+    if not bases:
+        raise FileNotFoundError(f"Không có autosave trong {directory}")
+    base_seq = max(bases)
+    w, h, meta, grid, members, commands = read_state(os.path.join(directory, BASE_NAME.format(base_seq)))
+    fields = grid.fields()
+    extras = dict(meta["members_extra"])
+    seq = 1
+    while True:
+        path = os.path.join(directory, DELTA_NAME.format(base_seq, seq))
+        if not os.path.exists(path):
+            break
+        dmeta, tiles, member_data, command_data = _read_delta(path, base_seq, seq)
+        strings = dmeta["strings"]
+        for x, y, *values in TILE.iter_unpack(tiles):
+            i = x * h + y
+            for a, v in zip(fields, values):
+                a[i] = v
+        step = MEMBER_INDEX.size + MEMBER.size
+        for k in range(0, len(member_data), step):
+            (i,) = MEMBER_INDEX.unpack_from(member_data, k)
+            (rec,) = unpack_members(member_data[k + MEMBER_INDEX.size:k + step], strings)
+            if i == len(members):
+                members.append(rec)
+            else:
+                members[i] = rec
+            extras[str(i)] = dmeta["members_extra"][str(i)]
+        if dmeta["commands_changed"]:
+            commands = unpack_commands(command_data, strings)
+        meta = merge_meta(meta, dmeta)
+        seq += 1
+    meta["members_extra"] = extras
+    return build_simulation(w, h, meta, grid, members, commands)
@@ -36,6 +36,12 @@ class Camera:
     def set_zoom(self, zoom):
         self.zoom = max(1, min(zoom, 4))
 
+    def view_rect(self, margin=0):
+        # Vùng tile (x1,y1,x2,y2) camera đang nhìn, nới thêm margin ô mỗi phía
+        ts = self.tile_size * self.zoom
+        return (self.x - margin, self.y - margin,
+                self.x + self.screen_w // ts - 1 + margin, self.y + self.screen_h // ts - 1 + margin)
+
     def world_to_screen(self, wx, wy):
         px = (wx - self.x) * self.tile_size * self.zoom
         py = (wy - self.y) * self.tile_size * self.zoom
@@ -0,0 +1,108 @@
+import os
+import random
+import shutil
+import tempfile
+import weakref
+import zlib
+from collections import OrderedDict
+
+class ChunkStore:
+    """
+    Giữ các chunk TileBlock kích thước chunk_size x chunk_size, sinh lần đầu khi
+    được truy cập (từ seed nên sinh lại luôn ra cùng kết quả). Khi quá
+    max_resident thì đẩy chunk ít dùng nhất ra: chunk chưa sửa thì bỏ luôn,
+    chunk đã sửa thì nén ghi xuống cache_dir. Chunk đang pin() không bị đẩy ra.
+    cache_dir tự tạo (không truyền vào) được xoá khi close(), khi store bị thu
+    gom hoặc khi thoát process.
+    """
+    def __init__(self, worldmap, chunk_size=32, seed=0, max_resident=256, cache_dir=None):
+        self.worldmap = worldmap
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.max_resident = max(16, max_resident)
+        self._own_dir = cache_dir is None
+        self.cache_dir = cache_dir or tempfile.mkdtemp(prefix="frostworld_chunks_")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # finalize chạy tối đa một lần: ở close(), khi store bị thu gom, hoặc lúc thoát
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.cache_dir, ignore_errors=True) if self._own_dir else None
+        self.resident = OrderedDict()  # (cx,cy): TileBlock, theo thứ tự LRU
+        self.on_disk = set()
+        self.pinned = {}  # (cx,cy): số lần pin đang mở
+        self.seen = set()  # chunk đã từng sinh, đã tính vào bộ đếm của map
+        self.stats = {"generated": 0, "loaded": 0, "evicted": 0, "written": 0}
+
+    def chunk_rng(self, cx, cy):
+        return random.Random((self.seed * 1000003 + cx) * 1000003 + cy)
+
+    def locate(self, x, y):
+        cs = self.chunk_size
+        cx, cy = x // cs, y // cs
+        return self.block(cx, cy), (x - cx * cs) * cs + (y - cy * cs)
+
+    def key_of(self, x, y):
+        cs = self.chunk_size
+        return x // cs, y // cs
+
+    def holds(self, x, y, block):
+        # block có còn là chunk đang nạp của ô (x,y) không (chưa bị evict)
+        return self.resident.get(self.key_of(x, y)) is block
+
+    def pin(self, x, y):
+        # Giữ chunk của ô (x,y) trong bộ nhớ tới khi unpin, trả về key để unpin
+        key = self.key_of(x, y)
+        self.pinned[key] = self.pinned.get(key, 0) + 1
+        return key
+
+    def unpin(self, key):
+        n = self.pinned[key] - 1
+        if n:
+            self.pinned[key] = n
+        else:
+            del self.pinned[key]
+
+    def block(self, cx, cy):
+        key = (cx, cy)
+        block = self.resident.get(key)
+        if block is not None:
+            self.resident.move_to_end(key)
+            return block
+        if key in self.on_disk:
+            block = self._read(key)
+            self.stats["loaded"] += 1
+        else:
+            block = self.worldmap._new_chunk(cx, cy, self.chunk_rng(cx, cy), first=key not in self.seen)
+            self.seen.add(key)
+            self.stats["generated"] += 1
+        self.resident[key] = block
+        while len(self.resident) > self.max_resident and self._evict():
+            pass
+        return block
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"chunk_{key[0]}_{key[1]}.bin")
+
+    def _evict(self):
+        # Đẩy chunk ít dùng nhất không bị pin; False nếu mọi chunk đều đang pin
+        key = next((k for k in self.resident if k not in self.pinned), None)
+        if key is None:
+            return False
+        block = self.resident.pop(key)
+        self.stats["evicted"] += 1
+        if block.dirty:
+            with open(self._path(key), "wb") as f:
+                f.write(zlib.compress(block.to_bytes(), 1))
+            block.dirty = False
+            self.on_disk.add(key)
+            self.stats["written"] += 1
+        return True
+
+    def _read(self, key):
+        with open(self._path(key), "rb") as f:
+            data = zlib.decompress(f.read())
+        return self.worldmap._block_from_bytes(self.chunk_size * self.chunk_size, data)
+
+    def close(self):
+        self.resident.clear()
+        self.on_disk.clear()
+        if self._cleanup is not None:
+            self._cleanup()
@@ -0,0 +1,86 @@
+class CommandTable:
+    """
+    Bảng lệnh collect/build (mỗi lệnh là dict có "member", "x", "y"), giữ
+    thứ tự thêm vào cho UI nhưng có chỉ mục theo member và theo tile nên
+    tra cứu, thêm và xoá đều O(1). Mỗi lệnh được gán "id" tăng dần.
+    Không sửa "member"/"x"/"y" của lệnh sau khi đã append; "progress" chỉ
+    tăng qua advance() để version đổi theo mọi thay đổi của bảng.
+    """
+    def __init__(self, commands=()):
+        self._cmds = {}  # id: cmd, theo thứ tự thêm
+        self._by_member = {}  # member key: {id: cmd}
+        self._by_tile = {}  # (x,y): {id: cmd}
+        self._next_id = 0
+        self.version = 0  # tăng mỗi lần bảng hoặc progress của một lệnh đổi
+        for cmd in commands:
+            self.append(cmd)
+
+    @staticmethod
+    def _member_key(m):
+        return getattr(m, "id", None) or id(m)
+
+    def append(self, cmd):
+        cid = cmd.get("id")
+        if cid is None or cid in self._cmds:
+            cid = cmd["id"] = self._next_id
+        self._next_id = max(self._next_id, cid + 1)
+        self._cmds[cid] = cmd
+        self._by_member.setdefault(self._member_key(cmd.get("member")), {})[cid] = cmd
+        self._by_tile.setdefault((cmd.get("x"), cmd.get("y")), {})[cid] = cmd
+        self.version += 1
+        return cmd
+
+    def _unindex(self, index, key, cid):
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(cid, None)
+            if not bucket:
+                del index[key]
+
+    def remove(self, cmd):
+        cid = cmd.get("id")
+        if self._cmds.get(cid) is not cmd:
+            raise ValueError("command not in table")
+        del self._cmds[cid]
+        self._unindex(self._by_member, self._member_key(cmd.get("member")), cid)
+        self._unindex(self._by_tile, (cmd.get("x"), cmd.get("y")), cid)
+        self.version += 1
+
+    def discard(self, cmd):
+        if cmd in self:
+            self.remove(cmd)
+
+    def clear(self):
+        self._cmds.clear()
+        self._by_member.clear()
+        self._by_tile.clear()
+        self.version += 1
+
+    def advance(self, cmd, amount):
+        cmd["progress"] += amount
+        self.version += 1
+        return cmd["progress"]
+
+    def for_member(self, m):
+        # Lệnh cũ nhất của member, None nếu không có
+        bucket = self._by_member.get(self._member_key(m))
+        return next(iter(bucket.values())) if bucket else None
+
+    def at_tile(self, x, y):
+        bucket = self._by_tile.get((x, y))
+        return list(bucket.values()) if bucket else []
+
+    def has_tile(self, x, y):
+        return (x, y) in self._by_tile
+
+    def __contains__(self, cmd):
+        return self._cmds.get(cmd.get("id")) is cmd
+
+    def __iter__(self):
+        return iter(self._cmds.values())
+
+    def __len__(self):
+        return len(self._cmds)
+
+    def __repr__(self):
+        return f"CommandTable({len(self._cmds)} commands)"
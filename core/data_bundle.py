@@ -0,0 +1,162 @@
+import argparse
+import hashlib
+import json
+import marshal
+import os
+import sys
+import time
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+BUNDLE_NAME = ".bundle.marshal"
+BUNDLE_MAGIC = b"FWDATA\0\1"
+# marshal đổi định dạng theo bản Python: bundle của bản khác coi như không có
+BUNDLE_TAG = (sys.version_info[:2], marshal.version)
+
+def _digest(raw):
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+class DataBundle:
+    """
+    Gói mọi data/*.json thành một file marshal duy nhất. Mỗi bảng lưu dạng
+    bytes marshal riêng, chỉ giải khi có người hỏi tới, và được khoá theo
+    (mtime, size, hash nội dung) của file nguồn: stat khớp thì dùng luôn,
+    stat lệch thì đọc lại file, hash vẫn khớp thì giữ bảng cũ, không thì
+    parse lại. Lần đầu table() gặp bảng lệch (bundle chưa có hoặc cũ), cả
+    thư mục được compile() và bundle ghi đúng một lần; sau đó chỉ file nào
+    đổi mới được làm mới riêng. Mỗi lần table() trả về một bản mới nên
+    manager sửa dữ liệu của mình không làm bẩn cache.
+    """
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, BUNDLE_NAME)
+        self.sources = {}  # tên file: (mtime_ns, size, digest)
+        self.tables = {}  # tên file: bytes marshal
+        self.dirty = False
+        self.compiled = False  # đã đối chiếu cả thư mục trong process này
+        self.stats = {"hits": 0, "parsed": 0, "rehashed": 0, "bundle_writes": 0}
+        self._read_bundle()
+
+    def _read_bundle(self):
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        except OSError:
+            return
+        if not raw.startswith(BUNDLE_MAGIC):
+            return
+        try:
+            bundle = marshal.loads(raw[len(BUNDLE_MAGIC):])
+        except (ValueError, EOFError, TypeError):
+            return
+        if bundle.get("tag") != BUNDLE_TAG:
+            return
+        self.sources = {name: tuple(src) for name, src in bundle["sources"].items()}
+        self.tables = bundle["tables"]
+
+    def _source_path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def _fresh(self, name):
+        st = os.stat(self._source_path(name))
+        known = self.sources.get(name)
+        return known is not None and known[:2] == (st.st_mtime_ns, st.st_size) and name in self.tables
+
+    def _refresh(self, name):
+        # Đảm bảo tables[name] khớp file nguồn hiện tại
+        st = os.stat(self._source_path(name))
+        known = self.sources.get(name)
+        if known is not None and known[:2] == (st.st_mtime_ns, st.st_size) and name in self.tables:
+            self.stats["hits"] += 1
+            return
+        with open(self._source_path(name), "rb") as f:
+            raw = f.read()
+        digest = _digest(raw)
+        if known is not None and known[2] == digest and name in self.tables:
+            self.stats["rehashed"] += 1
+        else:
+            try:
+                data = json.loads(raw.decode("utf-8"))
+            except ValueError as e:
+                raise ValueError(f"{self._source_path(name)}: JSON lỗi: {e}") from e
+            if not isinstance(data, (dict, list)):
+                raise ValueError(f"{self._source_path(name)}: cần object hoặc array ở gốc")
+            self.tables[name] = marshal.dumps(data)
+            self.stats["parsed"] += 1
+        self.sources[name] = (st.st_mtime_ns, st.st_size, digest)
+        self.dirty = True
+
+    def table(self, name):
+        if self._fresh(name):
+            self.stats["hits"] += 1
+        elif not self.compiled:
+            # Lệch lần đầu: làm mới mọi file rồi ghi bundle một lần, thay vì ghi lại sau từng bảng
+            self.compile()
+        else:
+            self._refresh(name)
+            if self.dirty:
+                self.save()
+        return marshal.loads(self.tables[name])
+
+    def compile(self):
+        # Kiểm tra và nạp mọi file json trong thư mục, bỏ bảng của file đã xoá
+        names = sorted(n for n in os.listdir(self.data_dir) if n.endswith(".json"))
+        for name in names:
+            self._refresh(name)
+        for name in set(self.tables) - set(names):
+            del self.tables[name]
+            self.sources.pop(name, None)
+            self.dirty = True
+        if self.dirty:
+            self.save()
+        self.compiled = True
+        return names
+
+    def save(self):
+        # Không ghi được (thư mục chỉ đọc...) thì vẫn chạy với cache trong process
+        bundle = {"tag": BUNDLE_TAG, "sources": self.sources, "tables": self.tables}
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(BUNDLE_MAGIC + marshal.dumps(bundle))
+            os.replace(tmp, self.path)
+        except OSError:
+            return
+        self.dirty = False
+        self.stats["bundle_writes"] += 1
+
+_bundles = {}
+
+def get_bundle(data_dir=DATA_DIR):
+    """Bundle dùng chung trong process cho data_dir (tạo và đọc file bundle khi cần)."""
+    key = os.path.abspath(data_dir)
+    bundle = _bundles.get(key)
+    if bundle is None:
+        bundle = _bundles[key] = DataBundle(key)
+    return bundle
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Biên dịch data/*.json thành một bundle marshal.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--bench", type=int, default=0, help="So thời gian nạp N lần: json từng file và bundle")
+    args = parser.parse_args(argv)
+    t0 = time.perf_counter()
+    bundle = DataBundle(args.data_dir)
+    names = bundle.compile()
+    print(f"{len(names)} bảng -> {bundle.path} ({os.path.getsize(bundle.path)} byte) trong {time.perf_counter() - t0:.4f}s")
+    if args.bench:
+        t0 = time.perf_counter()
+        for _ in range(args.bench):
+            for name in names:
+                with open(os.path.join(args.data_dir, name), "r", encoding="utf-8") as f:
+                    json.load(f)
+        t_json = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(args.bench):
+            b = DataBundle(args.data_dir)
+            for name in names:
+                b.table(name)
+        t_bundle = time.perf_counter() - t0
+        print(f"json: {t_json / args.bench * 1000:.3f}ms, bundle (đọc lại file bundle): {t_bundle / args.bench * 1000:.3f}ms mỗi lượt")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+from array import array
+
+from core.utils import load_json
+from core.worldmap import RESOURCE_CODE, RESOURCE_NONE, TILE_CODE
+
+REGROW_BLOCKED_CODES = frozenset(TILE_CODE[t] for t in ("building", "farm", "home", "workshop"))
+SLICE_MIN_RUN = 8  # đoạn chỉ số liền nhau ngắn hơn thì ghi từng phần tử, rẻ hơn dựng slice
+
+class RegrowRule:
+    __slots__ = ("code", "amount", "every", "max")
+
+    def __init__(self, code, amount, every, max_amount):
+        self.code = code
+        self.amount = amount
+        self.every = every
+        self.max = max_amount
+
+class ResourceEcology:
+    """
+    Tài nguyên mọc lại theo tham số "regrow" trong data/resources.json
+    (amount mỗi lần, every tick một lần, max trần). Chỉ tile dưới trần mới nằm
+    trong tập regrowing, nhận qua tile listener của WorldMap. Tập này được gom
+    sẵn theo block (chunk, hoặc cả grid) thành chỉ số trong mảng của block, nên
+    mỗi lượt chỉ tra block một lần rồi cập nhật resource_amt/resource theo từng
+    đoạn chỉ số liền nhau bằng gán slice, cuối cùng báo lại cả lô một lần.
+    """
+    def __init__(self, worldmap, json_path="data/resources.json", bounds=None):
+        self.worldmap = worldmap
+        self.bounds = bounds  # (x1,y1,x2,y2): chỉ cho tile trong vùng này mọc lại, None = cả map
+        self.rules = {}  # resource code: RegrowRule
+        for name, data in load_json(json_path).items():
+            regrow = data.get("regrow")
+            if not regrow or name not in RESOURCE_CODE:
+                continue
+            if regrow.get("amount", 0) > 0 and regrow.get("every", 0) > 0:
+                code = RESOURCE_CODE[name]
+                self.rules[code] = RegrowRule(code, regrow["amount"], regrow["every"], regrow.get("max", 20))
+        self._groups = {code: {} for code in self.rules}  # code: {chunk key (None = grid): set chỉ số trong block}
+        self.version = 0  # tăng mỗi lần tập regrowing đổi
+        self.stats = {"steps": 0, "tiles_regrown": 0}
+        worldmap.add_tile_listener(self._on_tiles_changed)
+
+    def _key(self, x, y):
+        # (chunk key, chỉ số trong block) của tile, không nạp chunk
+        chunks = self.worldmap.chunks
+        if chunks is None:
+            return None, x * self.worldmap.h + y
+        cs = chunks.chunk_size
+        cx, cy = x // cs, y // cs
+        return (cx, cy), (x - cx * cs) * cs + (y - cy * cs)
+
+    def _cell(self, key, i):
+        if key is None:
+            return divmod(i, self.worldmap.h)
+        cs = self.worldmap.chunks.chunk_size
+        return key[0] * cs + i // cs, key[1] * cs + i % cs
+
+    def _cells(self, key, idx):
+        if key is None:
+            h = self.worldmap.h
+            return [divmod(i, h) for i in idx]
+        return [self._cell(key, i) for i in idx]
+
+    def _block(self, key):
+        return self.worldmap.grid if key is None else self.worldmap.chunks.block(*key)
+
+    @property
+    def regrowing(self):
+        # {code: set (x,y)} đang mọc lại, dựng từ các nhóm theo block (để lưu/kiểm tra)
+        return {code: {self._cell(key, i) for key, idx in groups.items() for i in idx}
+                for code, groups in self._groups.items()}
+
+    def add(self, code, cells):
+        # Đưa tile vào tập mọc lại của code (vd khi nạp save)
+        groups = self._groups[code]
+        for x, y in cells:
+            key, i = self._key(x, y)
+            groups.setdefault(key, set()).add(i)
+        self.version += 1
+
+    def _on_tiles_changed(self, cells):
+        bounds = self.bounds
+        for x, y in cells:
+            if bounds is not None and not (bounds[0] <= x <= bounds[2] and bounds[1] <= y <= bounds[3]):
+                continue
+            key, i = self._key(x, y)
+            block = self._block(key)
+            code = block.origin[i]
+            rule = self.rules.get(code)
+            if rule is not None and block.resource_amt[i] < rule.max and block.resource[i] in (code, RESOURCE_NONE):
+                idx = self._groups[code].setdefault(key, set())
+                if i not in idx:
+                    idx.add(i)
+                    self.version += 1
+
+    def step(self, tick):
+        changed = []
+        for code, rule in self.rules.items():
+            groups = self._groups[code]
+            if tick % rule.every or not groups:
+                continue
+            done = False
+            for key, idx in list(groups.items()):
+                regrown, finished = self._regrow(self._block(key), sorted(idx), rule)
+                if finished:
+                    idx.difference_update(finished)
+                    done = True
+                    if not idx:
+                        del groups[key]
+                changed.extend(self._cells(key, regrown))
+            if done:
+                self.version += 1
+        if changed:
+            self.stats["steps"] += 1
+            self.stats["tiles_regrown"] += len(changed)
+            self.worldmap.tiles_changed(changed)
+        return changed
+
+    @staticmethod
+    def _regrow(block, idx, rule):
+        """
+        Mọc lại các chỉ số idx (đã sắp xếp) của một block. Đoạn chỉ số liền
+        nhau đủ dài đọc và ghi resource_amt/resource bằng một lần slice, chỉ số
+        lẻ thì ghi thẳng. Trả về (chỉ số đã mọc, chỉ số rời tập: bị chặn hoặc
+        đã đủ trần).
+        """
+        code, amount, cap = rule.code, rule.amount, rule.max
+        allowed = (code, RESOURCE_NONE)
+        amt_a, res_a, pending, ttype = block.resource_amt, block.resource, block.pending, block.tile_type
+        regrown, finished = [], []
+        n, k = len(idx), 0
+        while k < n:
+            a = idx[k]
+            b = k + 1
+            while b < n and idx[b] == idx[b - 1] + 1:
+                b += 1
+            end = a + (b - k)
+            k = b
+            if end - a < SLICE_MIN_RUN:
+                for i in range(a, end):
+                    if pending[i] or ttype[i] in REGROW_BLOCKED_CODES or res_a[i] not in allowed:
+                        finished.append(i)
+                        continue
+                    v = amt_a[i] + amount
+                    if v >= cap:
+                        v = cap
+                        finished.append(i)
+                    amt_a[i] = v
+                    res_a[i] = code
+                    regrown.append(i)
+                continue
+            ok = [not p and t not in REGROW_BLOCKED_CODES and r in allowed
+                  for p, t, r in zip(pending[a:end], ttype[a:end], res_a[a:end])]
+            amts = [min(cap, v + amount) if g else v for v, g in zip(amt_a[a:end], ok)]
+            amt_a[a:end] = array("H", amts)
+            res_a[a:end] = array("B", [code if g else r for r, g in zip(res_a[a:end], ok)])
+            for i, (g, v) in enumerate(zip(ok, amts), a):
+                if g:
+                    regrown.append(i)
+                    if v >= cap:
+                        finished.append(i)
+                else:
+                    finished.append(i)
+        if regrown:
+            block.dirty = True
+        return regrown, finished
@@ -1,6 +1,6 @@
 from typing import List, Dict, Optional
 import uuid
-import random
+from core.rng import get_rng
 
 class Role:
     SECT_LEADER = "Tông Chủ"
@@ -24,7 +24,8 @@ DEFAULT_MAP_H = 48
 
 class SectMember:
     def __init__(self, name: str, role: str = Role.DISCIPLE, division: str = "", is_founder: bool = False, x: Optional[int]=None, y: Optional[int]=None):
-        self.id = str(uuid.uuid4())
+        # uuid4 rút từ luồng seed được nên cùng seed cho cùng id
+        self.id = str(uuid.UUID(int=get_rng("ids").getrandbits(128), version=4))
         self.name = name
         self.role = role
         self.division = division
@@ -37,8 +38,9 @@ class SectMember:
         self.state = "idle"
         self.build_target = None
         # Vị trí trên bản đồ, random hoặc truyền vào
-        self.x = x if x is not None else random.randint(0, DEFAULT_MAP_W-1)
-        self.y = y if y is not None else random.randint(0, DEFAULT_MAP_H-1)
+        spawn = get_rng("spawn")
+        self.x = x if x is not None else spawn.randint(0, DEFAULT_MAP_W-1)
+        self.y = y if y is not None else spawn.randint(0, DEFAULT_MAP_H-1)
 
     def receive_command(self, command: str):
         if self.alive:
@@ -62,6 +64,8 @@ class Sect:
         self.resources: Dict[str, int] = {"water": 10, "food": 10, "farm_land": 1, "tools": 2, "money": 5}
         self.famous = False
         self.holy_site = False
+        self.member_listeners = []  # gọi fn(member) khi member rời sect/chết (vd WorldMap.remove_member)
+        self.change_listeners = []  # gọi fn(member) khi lệnh/nhiệm vụ của member đổi
         self.add_member(founder, Role.SECT_LEADER, "", is_founder=True)
 
     def add_member(self, name, role, division, is_founder=False, x=None, y=None):
@@ -74,8 +78,25 @@ class Sect:
 
     def remove_member(self, member_id):
         if member_id in self.members:
-            self.members[member_id].alive = False
-            self.history.append(f"{self.members[member_id].name} đã rời khỏi tông môn hoặc đã chết.")
+            member = self.members[member_id]
+            member.alive = False
+            self.history.append(f"{member.name} đã rời khỏi tông môn hoặc đã chết.")
+            for fn in self.member_listeners:
+                fn(member)
+
+    def add_member_listener(self, fn):
+        self.member_listeners.append(fn)
+
+    def add_change_listener(self, fn):
+        self.change_listeners.append(fn)
+
+    def remove_change_listener(self, fn):
+        if fn in self.change_listeners:
+            self.change_listeners.remove(fn)
+
+    def _member_changed(self, member):
+        for fn in self.change_listeners:
+            fn(member)
 
     def get_leader(self) -> Optional[SectMember]:
         for m in self.members.values():
@@ -87,6 +108,7 @@ class Sect:
         leader = self.get_leader()
         if leader:
             leader.receive_command(command)
+            self._member_changed(leader)
             self.sect_commands.append(command)
             self.history.append(f"Tông Chủ ban lệnh: {command}")
 
@@ -94,6 +116,7 @@ class Sect:
         leader = self.get_leader()
         if leader:
             leader.assign_task(task)
+            self._member_changed(leader)
             self.history.append(f"Tông Chủ nhận nhiệm vụ: {task}")
 
     def get_resource(self, resource: str) -> int:
@@ -1,4 +1,4 @@
-import random
+from core.rng import get_rng
 
 class GameEvent:
     def __init__(self, key, data):
@@ -61,5 +61,5 @@ class EventManager:
                 continue
             pool.append(ev)
         if pool:
-            ev = random.choice(pool)
+            ev = get_rng("events").choice(pool)
             self.trigger(ev.key)
\ No newline at end of file
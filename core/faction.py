@@ -1,4 +1,4 @@
-import random
+from core.rng import get_rng
 from core.utils import load_json
 
 class Faction:
@@ -32,11 +32,12 @@ class FactionManager:
     def init_factions(self):
         self.factions = []
         for k, v in self.factions_data.items():
-            color = tuple(v.get("color", [random.randint(100,255),random.randint(100,255),random.randint(100,255)]))
+            rng = get_rng("factions")
+            color = tuple(v.get("color", [rng.randint(100,255),rng.randint(100,255),rng.randint(100,255)]))
             self.factions.append(Faction(k, v.get("desc",""), color, v.get("base_loyalty",0.5)))
 
     def get_random_faction(self):
-        return random.choice(self.factions)
+        return get_rng("factions").choice(self.factions)
 
     def get_by_name(self, name):
         for f in self.factions:
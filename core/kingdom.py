@@ -1,4 +1,4 @@
-import random
+from core.rng import get_rng
 from core.hero import Hero
 
 class KingdomState:
@@ -26,9 +26,10 @@ class KingdomState:
         self.leader_id = npc_or_hero_id
 
     def spawn_hero(self):
-        new_hero = Hero(f"hero{len(self.heroes)+1}", f"Hero-{random.randint(100,999)}", {
+        rng = get_rng("kingdom")
+        new_hero = Hero(f"hero{len(self.heroes)+1}", f"Hero-{rng.randint(100,999)}", {
             "job": "hero",
-            "level": random.randint(1, 5),
+            "level": rng.randint(1, 5),
             "rank": "C",
             "skills": ["lead", "combat", "special"]
         })
@@ -1,11 +1,12 @@
 from __future__ import annotations
 from typing import List, Dict, Any, Optional, Tuple
-import random
 import math
 
 from .tasks import TaskQueue
-from .entities import NPC
+from .assignment import assign, role_weighted_cost, travel_cost
+from .entities import Role, SectMember
 from .worldmap import WorldMap
+from .rng import get_rng
 
 PERSONALITY_ARCHETYPES = {
     "Expansionist": {"build_bias":1.4,"gather_bias":1.0,"scout_bias":1.0,"guard_bias":1.0,"reserve_ratio":0.5,"reassign_factor":1.0},
@@ -16,9 +17,10 @@ PERSONALITY_ARCHETYPES = {
 
 class LeaderProfile:
     def __init__(self):
-        self.archetype = random.choice(list(PERSONALITY_ARCHETYPES.keys()))
+        rng = get_rng("leader_profile")
+        self.archetype = rng.choice(list(PERSONALITY_ARCHETYPES.keys()))
         base = PERSONALITY_ARCHETYPES[self.archetype]
-        def jitter(k): return base[k] * random.uniform(0.9,1.1)
+        def jitter(k): return base[k] * rng.uniform(0.9,1.1)
         self.build_bias = jitter("build_bias")
         self.gather_bias = jitter("gather_bias")
         self.scout_bias = jitter("scout_bias")
@@ -42,9 +44,21 @@ class LeaderAIConfig:
         self.max_scout_tasks = 8
         self.max_gather_tasks = 40
         self.max_guard_patrol_tasks = 6
-        self.resource_scan_limit = 6000
+        self.resource_cache_size = 200
+        self.role_preference_weight = 12  # số ô đi thêm đổi lấy một bậc ưu tiên vai trò
+        self.build_search_radius = 12  # bán kính tìm chỗ xây nhà quanh nhà cũ/tâm map
+        self.gather_amount = 9  # số đơn vị thu mỗi task gather
+        self.build_ticks = 60
+        self.max_stuck = 10  # số tick không đi được trước khi huỷ task
+        self.unreachable_retry = 720  # tile gather không tới được thì bỏ qua bấy nhiêu tick
 
 class LeaderAI:
+    """
+    AI giao việc theo hàng task (build_house, gather, scout_explore, patrol)
+    cho member của sect trên WorldMap. Vai trò việc của member (gatherer,
+    builder, scout, guard) và task đang làm được giữ trong AI theo member id;
+    mỗi tick member có task đi tới ô của task rồi làm việc tại đó.
+    """
     def __init__(self, materials: Dict[str,int]):
         self.cfg = LeaderAIConfig()
         self.profile = LeaderProfile()
@@ -55,9 +69,30 @@ class LeaderAI:
         self.population_housing = 0
         self.stats = {"build_created":0,"gather_created":0,"scout_created":0,"guard_created":0}
         self.cached_resource_tiles: List[Tuple[int,int,int,str]] = []
+        self.reservations: Dict[Tuple[int,int], int] = {}  # tile gather: id task đang giữ (trong queue hoặc member đang làm)
+        self.roles: Dict[str, str] = {}  # member id: vai trò việc, chưa có = "idle"
+        self.active: Dict[str, Dict[str,Any]] = {}  # member id: task đang làm
+        self.unreachable: Dict[Tuple[int,int], int] = {}  # tile gather không tới được: tick được thử lại
+        self.tick = 0
 
-    def update(self, tick: int, npcs: List[NPC], world: WorldMap):
+    def role_of(self, member: SectMember) -> str:
+        return self.roles.get(member.id, "idle")
+
+    def task_of(self, member: SectMember) -> Optional[Dict[str,Any]]:
+        return self.active.get(member.id)
+
+    @staticmethod
+    def _is_leader(member: SectMember) -> bool:
+        return member.role == Role.SECT_LEADER
+
+    def update(self, tick: int, members: List[SectMember], world: WorldMap):
+        self.tick = tick
+        npcs = [m for m in members if m.alive]
+        alive = {m.id for m in npcs}
+        for mid in [mid for mid in self.active if mid not in alive]:
+            self.release_task(self.active.pop(mid))  # member chết/rời sect giữa chừng
         if tick - self.last_eval_tick >= self.cfg.evaluate_interval:
+            self._reconcile_reservations(npcs)
             self._evaluate_world_state(npcs, world)
             self._update_resource_cache(world)
             self._generate_tasks(npcs, world)
@@ -65,25 +100,40 @@ class LeaderAI:
         if tick - self.last_reassign_tick >= int(self.cfg.reassign_interval * self.profile.reassign_factor):
             self._rebalance_roles(npcs)
             self.last_reassign_tick = tick
-        self._assign_tasks(npcs)
+        self._assign_tasks(npcs, world)
+        self._work(npcs, world)
+
+    def release_task(self, task: Dict[str,Any]):
+        # Gọi khi task gather xong hoặc bị huỷ để trả tile về
+        pos = task.get("data", {}).get("pos")
+        if pos is not None and self.reservations.get(pos) == task.get("id"):
+            del self.reservations[pos]
 
-    def _evaluate_world_state(self, npcs: List[NPC], world: WorldMap):
-        houses = world.all_positions_of_type("house")
+    def cancel_task(self, tid: int) -> Optional[Dict[str,Any]]:
+        task = self.task_queue.remove(tid)
+        if task is not None:
+            self.release_task(task)
+        return task
+
+    def _reconcile_reservations(self, npcs: List[SectMember]):
+        # Bỏ giữ chỗ của task không còn trong queue và không member nào đang làm
+        # (xong/huỷ mà không gọi release_task), O(reservations + task đang làm)
+        active = {task["id"] for task in self.active.values()}
+        stale = [pos for pos, tid in self.reservations.items() if tid not in self.task_queue and tid not in active]
+        for pos in stale:
+            del self.reservations[pos]
+        for pos in [pos for pos, until in self.unreachable.items() if until <= self.tick]:
+            del self.unreachable[pos]
+
+    def _evaluate_world_state(self, npcs: List[SectMember], world: WorldMap):
+        houses = world.positions_of_type("home")
         self.population_housing = len(houses) * self.cfg.house_capacity
 
     def _update_resource_cache(self, world: WorldMap):
-        result: List[Tuple[int,int,int,str]] = []
-        for y in range(world.height):
-            row = world.tiles[y]
-            for x in range(world.width):
-                tile = row[x]
-                if tile.has_resource_stock():
-                    if len(result) < self.cfg.resource_scan_limit:
-                        result.append((tile.data.get("resource_stock",0), x, y, tile.data.get("resource_type","")))
-        result.sort(key=lambda t: t[0], reverse=True)
-        self.cached_resource_tiles = result[:200]
+        # Chỉ mục stock cập nhật theo tile listener, không quét lại map
+        self.cached_resource_tiles = world.get_stock_index().top(self.cfg.resource_cache_size)
 
-    def _rebalance_roles(self, npcs: List[NPC]):
+    def _rebalance_roles(self, npcs: List[SectMember]):
         total = len(npcs)
         if total <= 0:
             return
@@ -93,60 +143,56 @@ class LeaderAI:
         guards_desired = max(1, int((total-1) * self.cfg.base_guard_ratio * self.profile.guard_bias))
         gather_min = max(self.cfg.min_gatherers, (total-1) // 3)
 
-        counts = {"builder":0,"scout":0,"guard":0,"gatherer":0}
-        for n in npcs:
-            if n.role in counts:
-                counts[n.role] += 1
+        counts = self._role_counts(npcs)
 
         def promote(from_roles, target_role, needed):
             if needed <= 0:
                 return
             for n in npcs:
-                if n.npc_id == 0:  # leader không đổi role
+                if self._is_leader(n):  # leader không đổi role
                     continue
                 if needed <= 0:
                     break
-                if n.role in from_roles:
-                    n.assign_role(target_role)
+                if self.role_of(n) in from_roles:
+                    self.roles[n.id] = target_role
                     needed -= 1
 
         if counts["gatherer"] < gather_min:
             promote(["idle","builder","scout","guard"], "gatherer", gather_min - counts["gatherer"])
-            counts = {"builder":0,"scout":0,"guard":0,"gatherer":0}
-            for n in npcs:
-                if n.role in counts:
-                    counts[n.role] += 1
+            counts = self._role_counts(npcs)
 
         if counts["builder"] < builders_desired:
             promote(["idle","gatherer","scout","guard"], "builder", builders_desired - counts["builder"])
-        counts = {"builder":0,"scout":0,"guard":0,"gatherer":0}
-        for n in npcs:
-            if n.role in counts:
-                counts[n.role] += 1
+        counts = self._role_counts(npcs)
         if counts["scout"] < scouts_desired:
             promote(["idle","gatherer","builder","guard"], "scout", scouts_desired - counts["scout"])
-        counts = {"builder":0,"scout":0,"guard":0,"gatherer":0}
-        for n in npcs:
-            if n.role in counts:
-                counts[n.role] += 1
+        counts = self._role_counts(npcs)
         if counts["guard"] < guards_desired:
             promote(["idle","gatherer","builder","scout"], "guard", guards_desired - counts["guard"])
 
         for n in npcs:
-            if n.npc_id == 0:
+            if self._is_leader(n):
                 continue
-            if n.role == "idle":
-                n.assign_role("gatherer")
+            if self.role_of(n) == "idle":
+                self.roles[n.id] = "gatherer"
 
-    def _generate_tasks(self, npcs: List[NPC], world: WorldMap):
+    def _role_counts(self, npcs: List[SectMember]) -> Dict[str,int]:
+        counts = {"builder":0,"scout":0,"guard":0,"gatherer":0}
+        for n in npcs:
+            role = self.role_of(n)
+            if role in counts:
+                counts[role] += 1
+        return counts
+
+    def _generate_tasks(self, npcs: List[SectMember], world: WorldMap):
         total = len(npcs)
         if total <= 0:
             return
-        existing = self.task_queue.to_list()
-        cnt_build = sum(1 for t in existing if t["type"] == "build_house")
-        cnt_gather = sum(1 for t in existing if t["type"] == "gather")
-        cnt_scout = sum(1 for t in existing if t["type"] == "scout_explore")
-        cnt_guard = sum(1 for t in existing if t["type"] == "patrol")
+        rng = get_rng("leader_tasks")
+        cnt_build = self.task_queue.count("build_house")
+        cnt_gather = self.task_queue.count("gather")
+        cnt_scout = self.task_queue.count("scout_explore")
+        cnt_guard = self.task_queue.count("patrol")
         # BUILD
         housing_need = 0.0
         if total >= self.population_housing:
@@ -156,6 +202,8 @@ class LeaderAI:
             if self._materials_available(self.cfg.house_cost):
                 pos = self._pick_house_site(world)
                 if pos:
+                    # Giữ chỗ bằng pending_build, như SectLeaderAI
+                    world.set_pending_build(pos[0], pos[1], True, "Home")
                     self.task_queue.push({
                         "type":"build_house",
                         "priority":1,
@@ -171,9 +219,11 @@ class LeaderAI:
             res_idx += 1
             if stock <= 0:
                 continue
-            # Chỉ tạo gather task nếu chưa có NPC nào đang gather tại cùng (x,y)
-            if not any(npc.task and npc.task.get("type")=="gather" and npc.task.get("data",{}).get("pos")==(x,y) for npc in npcs):
-                self.task_queue.push({
+            if self.unreachable.get((x, y), -1) > self.tick:
+                continue
+            # Chỉ tạo gather task nếu tile chưa bị task nào (đang chờ hay đang làm) giữ
+            if (x, y) not in self.reservations:
+                self.reservations[(x, y)] = self.task_queue.push({
                     "type":"gather",
                     "priority":4,
                     "data":{"pos":(x,y),"rtype":rtype},
@@ -183,9 +233,10 @@ class LeaderAI:
                 self.stats["gather_created"] += 1
         # SCOUT
         desired_scout = min(int(self.profile.scout_bias * 5) + 1, self.cfg.max_scout_tasks)
+        new_tasks = []
         while cnt_scout < desired_scout:
-            pos = (random.randint(0, world.width-1), random.randint(0, world.height-1))
-            self.task_queue.push({
+            pos = (rng.randint(0, world.w-1), rng.randint(0, world.h-1))
+            new_tasks.append({
                 "type":"scout_explore",
                 "priority":6,
                 "data":{"pos":pos},
@@ -196,8 +247,8 @@ class LeaderAI:
         # GUARD
         desired_guard = min(int(self.profile.guard_bias * 5) + 1, self.cfg.max_guard_patrol_tasks)
         while cnt_guard < desired_guard:
-            pos = (random.randint(0, world.width-1), random.randint(0, world.height-1))
-            self.task_queue.push({
+            pos = (rng.randint(0, world.w-1), rng.randint(0, world.h-1))
+            new_tasks.append({
                 "type":"patrol",
                 "priority":7,
                 "data":{"pos":pos},
@@ -205,45 +256,126 @@ class LeaderAI:
             })
             cnt_guard += 1
             self.stats["guard_created"] += 1
+        self.task_queue.push_many(new_tasks)
 
-    def _assign_tasks(self, npcs: List[NPC]):
+    def _assign_tasks(self, npcs: List[SectMember], world: WorldMap):
         if len(self.task_queue) == 0:
             return
-        snapshot = sorted(self.task_queue.to_list(), key=lambda t: t["priority"])
+        idle = [npc for npc in npcs if not (self._is_leader(npc) or npc.id in self.active or npc.state != "idle")]
+        if not idle:
+            return
+        # Ứng viên: mỗi loại lấy tối đa len(idle) task ưu tiên nhất, rồi ghép theo quãng đường + vai trò
+        candidates = []
+        for ttype in self._candidate_types(idle):
+            candidates.extend(self.task_queue.peek_many(len(idle), ttype))
+        weight = self.cfg.role_preference_weight
+        def cost(npc, task):
+            pos = task.get("data", {}).get("pos")
+            dist = travel_cost(getattr(npc, "x", 0), getattr(npc, "y", 0), pos[0], pos[1]) if pos else 0
+            return role_weighted_cost(dist, task["type"], self._role_preference(self.role_of(npc)), weight)
+        started = []
+        for npc, task in assign(idle, candidates, cost):
+            if task["type"] == "build_house":
+                if not self._consume_materials(task["data"]["cost"]):
+                    continue
+            self.task_queue.remove(task["id"])
+            task["progress"] = task["stuck"] = 0
+            self.active[npc.id] = task
+            npc.current_task = task["type"]
+            npc.state = "moving"
+            started.append(npc)
+        if started:
+            world.members_changed(started)
+
+    def _work(self, npcs: List[SectMember], world: WorldMap):
+        # Member có task đi tới ô của task; tới nơi thì thu/xây, scout/patrol tới là xong
         for npc in npcs:
-            if npc.npc_id == 0 or npc.task is not None or not npc.alive or npc.state != "idle":
+            task = self.active.get(npc.id)
+            if task is None:
                 continue
-            task = self._pick_task_for_role(snapshot, npc.role)
-            if not task:
+            x, y = task["data"]["pos"]
+            ttype = task["type"]
+            if (int(npc.x), int(npc.y)) != (x, y):
+                if world.smart_move(npc, x, y):
+                    task["stuck"] = 0
+                else:
+                    task["stuck"] += 1
+                    if task["stuck"] > self.cfg.max_stuck:
+                        if ttype == "gather":
+                            self.unreachable[(x, y)] = self.tick + self.cfg.unreachable_retry
+                        self._end_task(npc, world, done=False)
                 continue
-            if task["type"] == "build_house":
-                if not self._consume_materials(task["data"]["cost"]):
+            if ttype == "gather":
+                tile = world.get_tile(x, y)
+                if not tile.is_resource():
+                    self._end_task(npc, world, done=False)
                     continue
-            tid = task["id"]
-            self.task_queue.remove_where(lambda tt: tt["id"] == tid)
-            npc.start_task(task)
-            snapshot = sorted(self.task_queue.to_list(), key=lambda t: t["priority"])
-            if len(snapshot) == 0:
-                break
+                self.materials[tile.resource] = self.materials.get(tile.resource, 0) + 1
+                tile.deplete_resource(1)
+                task["progress"] += 1
+                if npc.state != "collecting":
+                    npc.state = "collecting"
+                    world.members_changed((npc,))
+                if task["progress"] >= self.cfg.gather_amount or not tile.is_resource():
+                    self._end_task(npc, world)
+            elif ttype == "build_house":
+                if npc.state != "building":
+                    npc.state = "building"
+                    world.members_changed((npc,))
+                task["progress"] += 1
+                if task["progress"] >= self.cfg.build_ticks:
+                    world.set_pending_build(x, y, False, "Xây xong")
+                    world.get_tile(x, y).type = "home"
+                    self._end_task(npc, world)
+            else:
+                self._end_task(npc, world)
 
-    def _pick_task_for_role(self, tasks: List[Dict[str,Any]], role: str) -> Optional[Dict[str,Any]]:
-        prefer = {
+    def _end_task(self, npc: SectMember, world: WorldMap, done: bool = True):
+        task = self.active.pop(npc.id)
+        if not done and task["type"] == "build_house":
+            # Huỷ xây: trả chỗ, vật liệu đã dùng thì mất
+            x, y = task["data"]["pos"]
+            world.set_pending_build(x, y, False)
+            world.get_tile(x, y).type = "field"
+        self.release_task(task)
+        npc.current_task = None
+        npc.state = "idle"
+        world.members_changed((npc,))
+
+    def _candidate_types(self, npcs: List[SectMember]) -> List[str]:
+        types = []
+        for npc in npcs:
+            for p in self._role_preference(self.role_of(npc)):
+                if p not in types:
+                    types.append(p)
+        if not any(self.task_queue.count(t) for t in types):
+            best = self.task_queue.peek()
+            if best is not None:
+                types.append(best["type"])
+        return types
+
+    @staticmethod
+    def _role_preference(role: str) -> Tuple[str, ...]:
+        return {
             "builder": ("build_house","gather"),
             "gatherer": ("gather","build_house"),
             "scout": ("scout_explore","gather"),
             "guard": ("patrol","gather"),
             "idle": ("gather","build_house")
         }.get(role, ("gather",))
-        for p in prefer:
-            for t in tasks:
-                if t["type"] == p:
-                    return t
-        return tasks[0] if tasks else None
 
     def _pick_house_site(self, world: WorldMap) -> Optional[Tuple[int,int]]:
-        houses = world.all_positions_of_type("house")
-        targets = houses if houses else [(world.width//2, world.height//2)]
-        return world.find_build_spot_near(targets)
+        houses = world.positions_of_type("home")
+        targets = sorted(houses) if houses else [(world.w//2, world.h//2)]
+        # Ô field trống gần nhất quanh nhà cũ, theo vòng Chebyshev tăng dần
+        for r in range(1, self.cfg.build_search_radius + 1):
+            for tx, ty in targets:
+                for x, y in _ring(tx, ty, r):
+                    tile = world.get_tile(x, y)
+                    if (tile and tile.type == "field" and tile.resource == "none" and not tile.pending_build
+                            and not world.members_at(x, y)):
+                        return (x, y)
+        return None
 
     def _materials_available(self, cost: Dict[str,int]) -> bool:
         for k,v in cost.items():
@@ -256,4 +388,14 @@ class LeaderAI:
             return False
         for k,v in cost.items():
             self.materials[k] -= v
-        return True
\ No newline at end of file
+        return True
+
+def _ring(cx: int, cy: int, r: int):
+    # Các ô cách (cx,cy) đúng r theo Chebyshev, theo thứ tự cố định
+    for x in range(cx - r, cx + r + 1):
+        if x in (cx - r, cx + r):
+            for y in range(cy - r, cy + r + 1):
+                yield x, y
+        else:
+            yield x, cy - r
+            yield x, cy + r
@@ -0,0 +1,117 @@
+import pygame
+from core.worldmap import TILE_TYPES, RESOURCE_TYPES
+
+TILE_COLORS = dict(TILE_TYPES)
+RESOURCE_COLORS = dict(RESOURCE_TYPES)
+BUILT_TYPES = ("building", "home", "workshop", "farm")
+_fonts = {}
+
+def _font(size):
+    font = _fonts.get(size)
+    if font is None:
+        font = _fonts[size] = pygame.font.SysFont("consolas", size)
+    return font
+
+class MapLayer:
+    """
+    Surface địa hình vẽ sẵn cho một tile_size, phủ đúng vùng view của WorldMap.
+    Mỗi frame chỉ vẽ lại tile bị đánh dấu bẩn; khi view dịch thì scroll surface
+    và chỉ vẽ dải mới lộ ra. Member và highlight vẽ đè lên sau khi blit.
+    """
+    def __init__(self, tile_size):
+        self.tile_size = tile_size
+        self.surface = None
+        self.view = None  # (view_x, view_y, view_w, view_h) lúc vẽ
+        self.dirty = set()
+        self.stats = {"full_redraws": 0, "tiles_drawn": 0}
+
+    def mark_dirty(self, x, y):
+        self.dirty.add((x, y))
+
+    def sync(self, worldmap):
+        ts = self.tile_size
+        view = (worldmap.view_x, worldmap.view_y, worldmap.view_w, worldmap.view_h)
+        vx, vy, vw, vh = view
+        redraw = None
+        if self.surface is None or self.view[2:] != view[2:]:
+            self.surface = pygame.Surface((vw * ts, vh * ts))
+        elif view != self.view:
+            dx, dy = self.view[0] - vx, self.view[1] - vy
+            if abs(dx) < vw and abs(dy) < vh:
+                self.surface.scroll(dx * ts, dy * ts)
+                redraw = set()
+                cols = range(vx, vx + dx) if dx > 0 else range(vx + vw + dx, vx + vw)
+                rows = range(vy, vy + dy) if dy > 0 else range(vy + vh + dy, vy + vh)
+                for x in cols:
+                    redraw.update((x, y) for y in range(vy, vy + vh))
+                for y in rows:
+                    redraw.update((x, y) for x in range(vx, vx + vw))
+        else:
+            redraw = set()
+        if redraw is None:
+            self.surface.fill((0, 0, 0))
+            redraw = ((x, y) for x in range(vx, vx + vw) for y in range(vy, vy + vh))
+            self.stats["full_redraws"] += 1
+        self.view = view
+        for x, y in redraw:
+            self._draw_tile(worldmap, x, y)
+        for x, y in self.dirty:
+            if vx <= x < vx + vw and vy <= y < vy + vh:
+                self._draw_tile(worldmap, x, y)
+        self.dirty.clear()
+
+    def _draw_tile(self, worldmap, x, y):
+        ts = self.tile_size
+        rect = pygame.Rect((x - self.view[0]) * ts, (y - self.view[1]) * ts, ts, ts)
+        tile = worldmap.get_tile(x, y)
+        if tile is None:
+            self.surface.fill((0, 0, 0), rect)
+            return
+        self.stats["tiles_drawn"] += 1
+        pending = tile.pending_build
+        color = TILE_COLORS.get("pending_build" if pending else tile.type, (200,200,200))
+        pygame.draw.rect(self.surface, color, rect)
+        pygame.draw.rect(self.surface, (50,50,60), rect, 1)
+        if tile.resource != "none":
+            pygame.draw.rect(self.surface, RESOURCE_COLORS.get(tile.resource, (100, 80, 60)), rect.inflate(-8,-8))
+        if tile.type in BUILT_TYPES:
+            pygame.draw.rect(self.surface, (120,80,10), rect.inflate(-4,-4))
+        if pending:
+            pygame.draw.rect(self.surface, (250,200,40), rect.inflate(-8,-8), border_radius=2)
+
+    def render(self, worldmap, screen, ox, oy, members, camera=None, highlight_tile=None, alpha=1.0):
+        self.sync(worldmap)
+        screen.blit(self.surface, (ox, oy))
+        ts = self.tile_size
+        vx, vy, vw, vh = self.view
+        if highlight_tile and vx <= highlight_tile[0] < vx + vw and vy <= highlight_tile[1] < vy + vh:
+            rect = pygame.Rect(ox+(highlight_tile[0]-vx)*ts, oy+(highlight_tile[1]-vy)*ts, ts, ts)
+            pygame.draw.rect(screen, (255,255,0), rect, 2)
+        font = _font(10)
+        for m in members:
+            if not getattr(m, "alive", True): continue
+            tx, ty = int(m.x), int(m.y)
+            if not (vx <= tx < vx+vw and vy <= ty < vy+vh): continue
+            fx, fy = tx, ty
+            if alpha < 1.0 and getattr(m, "moved_tick", None) == worldmap.tick:
+                # Vừa đi trong tick mới nhất: vẽ giữa ô cũ và ô mới theo alpha
+                fx = m.prev_x + (tx - m.prev_x) * alpha
+                fy = m.prev_y + (ty - m.prev_y) * alpha
+            px, py = ox+int((fx-vx)*ts), oy+int((fy-vy)*ts)
+            color = (250,210,40) if getattr(m,"role","")=="Tông Chủ" else (90,180,255)
+            border = (255,120,40) if getattr(m,"role","")=="Tông Chủ" else (50,60,70)
+            if getattr(m,"state","") == "building":
+                color = (220,140,50)
+            elif getattr(m,"state","") == "moving":
+                color = (80,120,220)
+            elif getattr(m,"state","") == "collecting":
+                color = (120,180,140)
+            pygame.draw.rect(screen, color, (px+2,py+2,ts-4,ts-4))
+            pygame.draw.rect(screen, border, (px,py,ts,ts), 1)
+            label = m.name[0].upper()
+            screen.blit(font.render(label, True, (10,30,40)), (px+ts//2-5, py+ts//2-7))
+            if getattr(m,"state","") == "building": screen.blit(font.render("X",True,(130,30,0)), (px+ts//2-2, py+ts//2+1))
+            if getattr(m,"state","") == "moving": screen.blit(font.render("D",True,(40,80,130)), (px+ts//2-2, py+ts//2+1))
+            if getattr(m,"state","") == "collecting": screen.blit(font.render("C",True,(20,120,60)), (px+ts//2-2, py+ts//2+1))
+            if camera and camera.following_member == m:
+                pygame.draw.rect(screen, (255,80,80), (px-1, py-1, ts+2, ts+2), 2)
@@ -0,0 +1,480 @@
+import argparse
+import hashlib
+import math
+import multiprocessing
+import time
+from bisect import bisect_right
+
+from core.entities import Role, Division, SectMember
+from core.sect_manager import SectManager
+from core.sect_leader_ai import SectLeaderAI
+from core.simulation import DEFAULT_MATERIALS
+from core.worldmap import WorldMap
+from core.ecology import ResourceEcology
+from core.rng import RNGRegistry, derive_seed, use_registry
+
+MEMBER_DIVISIONS = (Division.WORKER, Division.WORKER, Division.SCOUT, Division.LOGISTICS, Division.GUARD)
+MIN_SECT_SIZE = 12  # cạnh tối thiểu vùng của một sect (cửa sổ căn cứ 7x7 + lề)
+HALO = 4  # số cột mỗi dải thấy thêm mỗi bên, cũng là số ô member được đi ra ngoài vùng sect
+STRIP_CHUNK = 16  # cạnh chunk world của dải, nhỏ để phần chunk thừa ngoài halo ít
+MESSAGE_ORDER = {"tiles": 0, "report": 1, "return": 1, "handoff": 2, "command": 3}
+
+def sect_grid(sects):
+    # Lưới vùng sect gần vuông: rows hàng x cols cột, đủ ô cho mọi sect
+    rows = max(1, math.isqrt(sects))
+    return rows, -(-sects // rows)
+
+def sect_regions(w, h, sects):
+    """Vùng của từng sect theo lưới cố định, chỉ phụ thuộc kích thước map và số sect (không theo partition)."""
+    rows, cols = sect_grid(sects)
+    xs = [w * c // cols for c in range(cols + 1)]
+    ys = [h * r // rows for r in range(rows + 1)]
+    return [(xs[s // rows], ys[s % rows], xs[s // rows + 1] - 1, ys[s % rows + 1] - 1) for s in range(sects)]
+
+def strip_bounds(w, h, sects):
+    # Mỗi cột của lưới vùng sect là một dải: đơn vị mô phỏng, không phụ thuộc số partition
+    _, cols = sect_grid(sects)
+    xs = [w * c // cols for c in range(cols + 1)]
+    return [(xs[c], 0, xs[c + 1] - 1, h - 1) for c in range(cols)]
+
+def partition_strips(sects, partitions):
+    # Partition gồm các dải liền nhau; dải là đơn vị nên số partition không đổi kết quả
+    _, cols = sect_grid(sects)
+    if partitions > cols:
+        raise ValueError(f"{sects} sect chỉ chia được tối đa {cols} partition")
+    edges = [cols * p // partitions for p in range(partitions + 1)]
+    return [list(range(edges[p], edges[p + 1])) for p in range(partitions)]
+
+def _clip(rect, other):
+    return (max(rect[0], other[0]), max(rect[1], other[1]), min(rect[2], other[2]), min(rect[3], other[3]))
+
+def _inside(x, y, rect):
+    return rect[0] <= x <= rect[2] and rect[1] <= y <= rect[3]
+
+def _cmd_key(cmd):
+    # Lệnh gửi giữa các dải là tuple (loại, id, x, y, chờ vật liệu); id chỉ duy nhất trong cùng loại
+    return cmd[:2] if cmd else None
+
+# Thuộc tính di chuyển đồng bộ giữa dải nhà và dải đang chạy hộ member
+MOVE_FIELDS = ("x", "y", "prev_x", "prev_y", "moved_tick", "state", "_stuck_count")
+
+class Strip:
+    """
+    Một cột của lưới vùng sect cùng các sect có vùng trong cột đó. World của
+    dải là world chunk dùng chung seed, chỉ chạm tới cột của mình cộng HALO
+    cột mỗi bên nên bộ nhớ của cả simulation cỡ W x H cộng phần halo, không
+    nhân theo số dải. Dải chỉ sửa tile trong cột của mình; tile đổi được gửi
+    cho dải bên cạnh ở barrier để cập nhật halo.
+
+    Member tìm đường trong vùng sect nới thêm HALO ô nên có thể bước sang dải
+    bên cạnh. Tới barrier, member đang đứng ngoài cột nhà được chuyển cho dải
+    chứa nó (khách): dải nhà giữ member lại (AI vẫn thấy, giao việc được) nhưng
+    không cho đi, dải khách cho đi về phía đích lệnh (kẹp vào vùng nó thấy)
+    và không thực thi lệnh. Mỗi barrier dải khách báo vị trí/trạng thái về
+    nhà, dải nhà gửi lệnh hiện tại sang; khách về lại cột nhà thì trả về.
+    Mỗi sect có RNGRegistry riêng sinh từ (seed, id sect).
+    """
+    def __init__(self, index, edges, sects, w, h, seed, members_per_sect=5, ai_work_units=8, lod_interval=1):
+        self.index = index
+        self.edges = edges  # x bắt đầu của từng dải, thêm w ở cuối
+        self.bounds = (edges[index], 0, edges[index + 1] - 1, h - 1)
+        x1, _, x2, _ = self.bounds
+        if x2 - x1 + 1 <= HALO:
+            raise ValueError(f"dải {index} hẹp hơn halo ({x2 - x1 + 1} <= {HALO})")
+        self.window = (max(0, x1 - HALO), 0, min(w - 1, x2 + HALO), h - 1)
+        wx1, _, wx2, _ = self.window
+        resident = (wx2 // STRIP_CHUNK - wx1 // STRIP_CHUNK + 1) * -(-h // STRIP_CHUNK)
+        self.tick = 0
+        self.world = WorldMap(w, h, chunked=True, chunk_size=STRIP_CHUNK, seed=seed, max_resident_chunks=resident)
+        self.world.index_bounds = self.window
+        # Không ai xem dải nào: mọi member xử lý gộp theo lod_interval
+        self.world.set_lod((), lod_interval)
+        self.ecology = ResourceEcology(self.world, bounds=self.bounds)
+        self.manager = SectManager()
+        self.runs = []  # (sid, sect, leader_ai, materials, rng, vùng đi lại)
+        self.by_sid = {}
+        for sid, region in sects:
+            rx1, ry1, rx2, ry2 = region
+            if rx2 - rx1 + 1 < MIN_SECT_SIZE or ry2 - ry1 + 1 < MIN_SECT_SIZE:
+                raise ValueError(f"vùng của sect {sid} quá nhỏ ({rx2 - rx1 + 1}x{ry2 - ry1 + 1})")
+            rng = RNGRegistry(derive_seed(seed, f"sect/{sid}"))
+            with use_registry(rng):
+                sect = self.manager.create_sect(f"Tông {sid}", f"Tông Chủ {sid}")
+                for n in range(members_per_sect):
+                    sect.add_member(f"Đệ Tử {sid}-{n}", Role.DISCIPLE, MEMBER_DIVISIONS[n % len(MEMBER_DIVISIONS)], True)
+            sect.add_member_listener(self.world.remove_member)
+            ai = SectLeaderAI(sect, sect.get_leader().id)
+            ai.bounds = region
+            ai.cfg.slice_work_units = ai_work_units
+            spawn = rng.stream("spawn")
+            for n, m in enumerate(sect.members.values()):
+                m.x, m.y = spawn.randint(rx1, rx2), spawn.randint(ry1, ry2)
+                # Pha LOD theo thứ tự trong sect thay vì thứ tự gặp trong dải
+                m._lod_phase = n
+            move_bounds = _clip((rx1 - HALO, ry1 - HALO, rx2 + HALO, ry2 + HALO), (0, 0, w - 1, h - 1))
+            run = (sid, sect, ai, dict(DEFAULT_MATERIALS), rng, move_bounds)
+            self.runs.append(run)
+            self.by_sid[sid] = run
+        self.away = {}  # member id: dải đang chạy hộ member của dải này
+        self.guests = {}  # member id: {"sect", "home", "member", "cmd", "bounds", "cancelled"}
+        self.changed = set()
+        self.world.add_tile_listener(self._on_tiles_changed)
+
+    def contains(self, x, y):
+        return _inside(x, y, self.bounds)
+
+    def strip_of(self, x):
+        return bisect_right(self.edges, x) - 1
+
+    def _on_tiles_changed(self, cells):
+        for x, y in cells:
+            if self.contains(x, y):
+                self.changed.add((x, y))
+
+    @staticmethod
+    def _command_of(ai, m):
+        # Lệnh member đang theo, cùng thứ tự ưu tiên như member_move_tick
+        cmd = ai.collect_queue.for_member(m)
+        kind = "collect"
+        if cmd is None:
+            cmd = ai.build_queue.for_member(m)
+            kind = "build"
+        if cmd is None:
+            return None
+        return kind, cmd["id"], cmd["x"], cmd["y"], bool(cmd.get("pending_materials", False))
+
+    def _cancel(self, ai, m, cancelled):
+        kind, cid, x, y = cancelled
+        queue = ai.collect_queue if kind == "collect" else ai.build_queue
+        for cmd in queue.at_tile(x, y):
+            if cmd["id"] == cid and cmd["member"] is m:
+                queue.remove(cmd)
+
+    def _sync_back(self, rec):
+        # Dải khách báo về: cập nhật member ở nhà, bỏ lệnh khách đã huỷ
+        _, sect, ai, _, _, _ = self.by_sid[rec["sect"]]
+        m = sect.members.get(rec["id"])
+        if m is None:
+            return
+        if rec["cancelled"]:
+            self._cancel(ai, m, rec["cancelled"])
+        current = self._command_of(ai, m)
+        state = m.state
+        for field, value in zip(MOVE_FIELDS, rec["move"]):
+            setattr(m, field, value)
+        if _cmd_key(current) != _cmd_key(rec["cmd"]):
+            # AI ở nhà đã giao lệnh mới trong lúc member đi vắng: giữ trạng thái nhà đặt
+            m.state = state
+
+    def apply(self, messages):
+        """Áp thư từ barrier trước: tile dải khác, member về/báo về nhà, khách tới, lệnh cho khách."""
+        wm = self.world
+        for kind, payload in sorted(messages, key=lambda msg: MESSAGE_ORDER[msg[0]]):
+            if kind == "tiles":
+                for x, y, state in payload:
+                    if not self.contains(x, y):
+                        wm.apply_tile_state(x, y, state)
+            elif kind == "report":
+                self._sync_back(payload)
+            elif kind == "return":
+                self._sync_back(payload)
+                del self.away[payload["id"]]
+                wm.place_member(self.by_sid[payload["sect"]][1].members[payload["id"]])
+            elif kind == "handoff":
+                m = SectMember.__new__(SectMember)
+                m.__dict__.update(payload["vars"])
+                self.guests[m.id] = {"sect": payload["sect"], "home": payload["home"], "member": m,
+                                     "cmd": payload["cmd"], "cancelled": None,
+                                     "bounds": _clip(payload["bounds"], self.window)}
+                wm.place_member(m)
+            elif kind == "command":
+                guest = self.guests.get(payload["id"])
+                if guest is not None:
+                    if _cmd_key(guest["cmd"]) != _cmd_key(payload["cmd"]):
+                        guest["member"].state = payload["state"]
+                    guest["cmd"] = payload["cmd"]
+
+    def _guest_step(self, guest, n):
+        wm = self.world
+        m, cmd = guest["member"], guest["cmd"]
+        if cmd is None or cmd[4]:
+            m.state = "idle"
+            return
+        bx1, by1, bx2, by2 = bounds = guest["bounds"]
+        # Khách không thực thi lệnh, chỉ đi về phía đích (kẹp vào vùng dải này thấy) rồi về nhà ở barrier
+        tx, ty = max(bx1, min(bx2, cmd[2])), max(by1, min(by2, cmd[3]))
+        if (m.x, m.y) == (tx, ty):
+            return
+        moved = wm.smart_move(m, tx, ty, bounds) if n == 1 else wm._coarse_move(m, tx, ty, n, bounds)
+        if moved:
+            m.state = "moving"
+            m._stuck_count = 0
+        else:
+            m._stuck_count += 1
+            if m._stuck_count > 10:
+                m.state = "idle"
+                guest["cancelled"] = cmd[:4]
+                guest["cmd"] = None
+
+    def run(self, ticks):
+        """Chạy ticks tick, trả về thư gửi các dải khác: list (dải nhận, loại, nội dung)."""
+        wm = self.world
+        for _ in range(ticks):
+            self.tick += 1
+            wm.tick = self.tick
+            for _, sect, ai, materials, rng, move_bounds in self.runs:
+                with use_registry(rng):
+                    ai.update(self.tick, wm, materials)
+                    alive = [m for m in sect.members.values() if m.alive and m.id not in self.away]
+                    wm.member_move_tick(alive, ai.build_queue, ai.collect_queue, resources=materials, bounds=move_bounds)
+                    wm.update_member_positions(alive)
+            changed = []
+            for guest in self.guests.values():
+                m = guest["member"]
+                n = wm.lod_turn(m)
+                if n == 0: continue
+                before = (m.x, m.y, m.state, m._stuck_count)
+                self._guest_step(guest, n)
+                if (m.x, m.y, m.state, m._stuck_count) != before:
+                    changed.append(m)
+            if changed:
+                wm.members_changed(changed)
+            self.ecology.step(self.tick)
+        return self._outbox()
+
+    def _outbox(self):
+        wm = self.world
+        out = []
+        deltas = [(x, y, wm.tile_state(x, y)) for x, y in sorted(self.changed)]
+        self.changed.clear()
+        if deltas:
+            x1, _, x2, _ = self.bounds
+            for dest in (self.index - 1, self.index + 1):
+                if 0 <= dest < len(self.edges) - 1:
+                    wx1, wx2 = self.edges[dest] - HALO, self.edges[dest + 1] - 1 + HALO
+                    near = [d for d in deltas if wx1 <= d[0] <= wx2]
+                    if near:
+                        out.append((dest, "tiles", near))
+        for sid, sect, ai, _, _, move_bounds in self.runs:
+            for m in sect.members.values():
+                if not m.alive:
+                    continue
+                if m.id in self.away:
+                    out.append((self.away[m.id], "command", {"id": m.id, "cmd": self._command_of(ai, m), "state": m.state}))
+                elif not self.contains(int(m.x), int(m.y)):
+                    host = self.strip_of(int(m.x))
+                    self.away[m.id] = host
+                    wm.remove_member(m)
+                    out.append((host, "handoff", {"sect": sid, "home": self.index, "vars": dict(vars(m)),
+                                                  "cmd": self._command_of(ai, m), "bounds": move_bounds}))
+        for mid in list(self.guests):
+            guest = self.guests[mid]
+            m = guest["member"]
+            rec = {"sect": guest["sect"], "id": mid, "move": tuple(getattr(m, f, None) for f in MOVE_FIELDS),
+                   "cmd": guest["cmd"], "cancelled": guest["cancelled"]}
+            guest["cancelled"] = None
+            if self.strip_of(int(m.x)) == guest["home"]:
+                del self.guests[mid]
+                wm.remove_member(m)
+                out.append((guest["home"], "return", rec))
+            else:
+                out.append((guest["home"], "report", rec))
+        return out
+
+    def digest(self):
+        """
+        Băm trạng thái dải làm chủ: từng cột tile trong dải, từng sect (vật
+        liệu) và từng member đang chạy ở dải này (member nhà không đi vắng và
+        khách), để MultiSectSimulation ghép theo thứ tự toàn cục bất kể chia
+        bao nhiêu partition. Trả về ({x: hash}, {tên sect: hash}, {id member: hash}).
+        """
+        x1, _, x2, _ = self.bounds
+        columns = {}
+        for x in range(x1, x2 + 1):
+            h = hashlib.blake2b(digest_size=16)
+            for y in range(self.world.h):
+                h.update(repr(self.world.tile_state(x, y)).encode())
+            columns[x] = h.hexdigest()
+        sects, members = {}, {}
+        running = [m for _, sect, _, _, _, _ in self.runs for m in sect.members.values() if m.id not in self.away]
+        running += [guest["member"] for guest in self.guests.values()]
+        for _, sect, _, materials, _, _ in self.runs:
+            sects[sect.name] = hashlib.blake2b(repr((sect.name, sorted(materials.items()))).encode(), digest_size=16).hexdigest()
+        for m in running:
+            members[m.id] = hashlib.blake2b(repr((m.name, int(m.x), int(m.y), m.state, m.alive)).encode(), digest_size=16).hexdigest()
+        return columns, sects, members
+
+    def summary(self):
+        collected = sum(sum(materials.values()) - sum(DEFAULT_MATERIALS.values()) for _, _, _, materials, _, _ in self.runs)
+        return {"sects": len(self.runs), "collected": collected, "guests": len(self.guests),
+                "chunks": len(self.world.chunks.resident),
+                "farms": sum(1 for x, y in self.world.positions_of_type("farm") if self.contains(x, y)),
+                "homes": sum(1 for x, y in self.world.positions_of_type("home") if self.contains(x, y))}
+
+def _worker_main(conn, specs):
+    strips = [Strip(*spec) for spec in specs]
+    conn.send("ready")
+    while True:
+        msg = conn.recv()
+        op = msg[0]
+        if op == "run":
+            _, incoming, ticks = msg
+            out = {}
+            for s in strips:
+                s.apply(incoming.get(s.index, ()))
+                out[s.index] = s.run(ticks)
+            conn.send(out)
+        elif op == "digest":
+            conn.send({s.index: s.digest() for s in strips})
+        elif op == "summary":
+            conn.send({s.index: s.summary() for s in strips})
+        elif op == "close":
+            conn.close()
+            return
+
+class MultiSectSimulation:
+    """
+    Nhiều sect trên một world lớn, mỗi sect một vùng trong lưới cố định
+    (sect_regions). Mỗi cột của lưới là một Strip; partitions nhóm các dải
+    liền nhau để chạy (mỗi partition giao cho một worker theo vòng). Các dải
+    chạy độc lập giữa hai barrier (mỗi barrier_interval tick), tới barrier
+    thư của từng dải (delta tile cho halo, member chuyển dải, báo cáo, lệnh)
+    được gom theo thứ tự dải rồi chuyển tới dải nhận. workers=0 chạy hết
+    trong process hiện tại; cùng seed thì kết quả giống hệt nhau bất kể số
+    partition và số worker.
+    """
+    def __init__(self, sects=16, w=256, h=256, partitions=4, workers=0, seed=0,
+                 members_per_sect=5, barrier_interval=1, ai_work_units=8, lod_interval=1):
+        self.partitions = partitions
+        self.barrier_interval = barrier_interval
+        self.tick = 0
+        self.stats = {"barriers": 0, "deltas": 0, "handoffs": 0, "returns": 0}
+        strips = strip_bounds(w, h, sects)
+        edges = [b[0] for b in strips] + [w]
+        regions = sect_regions(w, h, sects)
+        specs = [(i, edges, [(s, r) for s, r in enumerate(regions) if b[0] <= r[0] <= b[2]],
+                  w, h, seed, members_per_sect, ai_work_units, lod_interval) for i, b in enumerate(strips)]
+        groups = partition_strips(sects, partitions)
+        self._pending = {}  # dải: thư chờ áp ở lượt chạy sau
+        self._local = None
+        self._workers = []
+        if workers <= 0:
+            self._local = [Strip(*spec) for spec in specs]
+        else:
+            workers = min(workers, partitions)
+            for k in range(workers):
+                parent, child = multiprocessing.Pipe()
+                mine = [specs[i] for group in groups[k::workers] for i in group]
+                proc = multiprocessing.Process(target=_worker_main, args=(child, mine), daemon=True)
+                proc.start()
+                self._workers.append((proc, parent))
+            for _, conn in self._workers:
+                conn.recv()
+
+    def _broadcast(self, msg):
+        for _, conn in self._workers:
+            conn.send(msg)
+        result = {}
+        for _, conn in self._workers:
+            result.update(conn.recv())
+        return result
+
+    def step(self):
+        ticks = self.barrier_interval
+        if self._local is not None:
+            results = {}
+            for s in self._local:
+                s.apply(self._pending.get(s.index, ()))
+                results[s.index] = s.run(ticks)
+        else:
+            results = self._broadcast(("run", self._pending, ticks))
+        # Barrier: chuyển thư theo thứ tự dải gửi, mỗi dải nhận đúng phần của nó
+        pending = {}
+        for src in sorted(results):
+            for dest, kind, payload in results[src]:
+                pending.setdefault(dest, []).append((kind, payload))
+                if kind == "tiles":
+                    self.stats["deltas"] += len(payload)
+                elif kind == "handoff":
+                    self.stats["handoffs"] += 1
+                elif kind == "return":
+                    self.stats["returns"] += 1
+        self._pending = pending
+        self.tick += ticks
+        self.stats["barriers"] += 1
+
+    def run(self, ticks):
+        for _ in range(0, ticks, self.barrier_interval):
+            self.step()
+
+    def digest(self):
+        if self._local is not None:
+            parts = {s.index: s.digest() for s in self._local}
+        else:
+            parts = self._broadcast(("digest",))
+        columns, sects, members = {}, {}, {}
+        for part_columns, part_sects, part_members in parts.values():
+            columns.update(part_columns)
+            sects.update(part_sects)
+            members.update(part_members)
+        h = hashlib.blake2b(digest_size=16)
+        for x in sorted(columns):
+            h.update(columns[x].encode())
+        for name in sorted(sects):
+            h.update(sects[name].encode())
+        for mid in sorted(members):
+            h.update(members[mid].encode())
+        return h.hexdigest()
+
+    def summary(self):
+        if self._local is not None:
+            parts = {s.index: s.summary() for s in self._local}
+        else:
+            parts = self._broadcast(("summary",))
+        total = {}
+        for i in sorted(parts):
+            for k, v in parts[i].items():
+                total[k] = total.get(k, 0) + v
+        total["tick"] = self.tick
+        total.update(self.stats)
+        return total
+
+    def close(self):
+        for proc, conn in self._workers:
+            conn.send(("close",))
+            proc.join()
+        self._workers = []
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mô phỏng nhiều sect trên một world chia partition.")
+    parser.add_argument("--sects", type=int, default=16)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--barrier", type=int, default=1, help="Số tick giữa hai barrier")
+    parser.add_argument("--lod", type=int, default=1, help="Member xử lý gộp mỗi N tick")
+    parser.add_argument("--check", action="store_true", help="Chạy lại một partition, workers=0 và so digest")
+    args = parser.parse_args(argv)
+    opts = dict(sects=args.sects, w=args.size, h=args.size, partitions=args.partitions,
+                seed=args.seed, barrier_interval=args.barrier, lod_interval=args.lod)
+    sim = MultiSectSimulation(workers=args.workers, **opts)
+    t0 = time.perf_counter()
+    sim.run(args.ticks)
+    elapsed = time.perf_counter() - t0
+    digest = sim.digest()
+    print(f"{sim.tick} ticks trong {elapsed:.3f}s ({sim.tick / max(elapsed, 1e-9):.1f} ticks/s), {args.workers} worker")
+    print(sim.summary())
+    print("digest:", digest)
+    sim.close()
+    if args.check:
+        ref = MultiSectSimulation(workers=0, **dict(opts, partitions=1))
+        ref.run(args.ticks)
+        same = ref.digest() == digest
+        print("khớp với chạy một partition, một process:", same)
+        if not same:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
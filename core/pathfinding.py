@@ -0,0 +1,316 @@
+import heapq
+from array import array
+from collections import deque
+
+NEIGHBORS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+# Trần số ô mở rộng mỗi lần tìm: đích không tới được trên world lớn (chunk)
+# không kéo A* đi nạp cả world
+DEFAULT_MAX_EXPANSIONS = 20000
+
+class _CachedPath:
+    __slots__ = ("goal", "path", "cursor", "pos", "box")
+
+    def __init__(self, goal, path, pos, box=None):
+        self.goal = goal
+        self.path = path  # list (x,y) không gồm điểm xuất phát, None = không tới được
+        self.cursor = 0
+        self.pos = pos  # vị trí member mong đợi trước bước kế tiếp
+        self.box = box  # path None: vùng (x1,y1,x2,y2) lần tìm đã chạm tới
+
+class PathFinder:
+    """
+    A* 8 hướng trên lưới passable của WorldMap, mỗi member giữ một path cache.
+    Path chỉ bị huỷ khi một tile nằm trên nó đổi trạng thái passable; lần tìm
+    thất bại chỉ bị huỷ khi tile đổi nằm trong vùng lần tìm đó đã chạm tới.
+    """
+    def __init__(self, worldmap, max_expansions=DEFAULT_MAX_EXPANSIONS):
+        self.worldmap = worldmap
+        self.max_expansions = max_expansions  # None = không giới hạn
+        self.stats = {"searches": 0, "expansions": 0, "cache_hits": 0, "invalidations": 0, "failed": 0}
+        self._paths = {}  # member key: _CachedPath
+        self._by_tile = {}  # (x,y): set member key có path đi qua
+        self._failed = {}  # member key: vùng (x1,y1,x2,y2) của lần tìm thất bại còn cache
+
+    def find_path(self, sx, sy, tx, ty, max_expansions=None, bounds=None):
+        # bounds (x1,y1,x2,y2): chỉ tìm đường trong vùng này, None = cả map;
+        # max_expansions None = dùng trần của PathFinder
+        return self._search(sx, sy, tx, ty, max_expansions, bounds)[0]
+
+    def _search(self, sx, sy, tx, ty, max_expansions=None, bounds=None):
+        # (path, vùng đã chạm tới): ô đã mở rộng nới thêm một ô là đủ phủ mọi ô đã xét passable
+        wm = self.worldmap
+        if max_expansions is None:
+            max_expansions = self.max_expansions
+        self.stats["searches"] += 1
+        start, goal = (sx, sy), (tx, ty)
+        if start == goal:
+            return [], None
+        is_passable = wm.is_passable
+        in_bounds = wm.in_bounds
+        came_from = {start: None}
+        g_cost = {start: 0}
+        bx1, by1, bx2, by2 = bounds or (0, 0, wm.w - 1, wm.h - 1)
+        h0 = max(abs(tx - sx), abs(ty - sy))
+        open_heap = [(h0, h0, sx, sy)]
+        expansions = 0
+        found = False
+        x1 = x2 = sx
+        y1 = y2 = sy
+        while open_heap:
+            _, _, x, y = heapq.heappop(open_heap)
+            if (x, y) == goal:
+                found = True
+                break
+            g = g_cost[(x, y)]
+            expansions += 1
+            if max_expansions is not None and expansions > max_expansions:
+                break
+            if x < x1: x1 = x
+            elif x > x2: x2 = x
+            if y < y1: y1 = y
+            elif y > y2: y2 = y
+            for dx, dy in NEIGHBORS:
+                nx, ny = x + dx, y + dy
+                if not (bx1 <= nx <= bx2 and by1 <= ny <= by2):
+                    continue
+                node = (nx, ny)
+                # Ô đích luôn được vào (vd ô pending_build mà member tới để xây)
+                if node != goal and not is_passable(nx, ny):
+                    continue
+                if node == goal and not in_bounds(nx, ny):
+                    continue
+                ng = g + 1
+                old = g_cost.get(node)
+                if old is not None and old <= ng:
+                    continue
+                g_cost[node] = ng
+                came_from[node] = (x, y)
+                h = max(abs(tx - nx), abs(ty - ny))
+                heapq.heappush(open_heap, (ng + h, h, nx, ny))
+        self.stats["expansions"] += expansions
+        if not found:
+            self.stats["failed"] += 1
+            return None, (x1 - 1, y1 - 1, x2 + 1, y2 + 1)
+        path = []
+        node = goal
+        while node != start:
+            path.append(node)
+            node = came_from[node]
+        path.reverse()
+        return path, None
+
+    def next_step(self, m, tx, ty, bounds=None):
+        key = self.worldmap._member_key(m)
+        pos = (int(m.x), int(m.y))
+        goal = (tx, ty)
+        entry = self._paths.get(key)
+        if entry is not None and entry.goal == goal and entry.pos == pos:
+            if entry.path is None:
+                self.stats["cache_hits"] += 1
+                return None
+            if entry.cursor < len(entry.path):
+                self.stats["cache_hits"] += 1
+                return self._advance(entry)
+        self.forget(m)
+        path, box = self._search(pos[0], pos[1], tx, ty, bounds=bounds)
+        entry = _CachedPath(goal, path, pos, box)
+        self._paths[key] = entry
+        if path is None:
+            self._failed[key] = box
+            return None
+        if not path:
+            return None
+        for cell in path:
+            self._by_tile.setdefault(cell, set()).add(key)
+        return self._advance(entry)
+
+    def has_path(self, m, tx, ty):
+        entry = self._paths.get(self.worldmap._member_key(m))
+        return entry is not None and entry.goal == (tx, ty) and bool(entry.path)
+
+    def _advance(self, entry):
+        step = entry.path[entry.cursor]
+        entry.cursor += 1
+        entry.pos = step
+        return step
+
+    def forget(self, m):
+        self._drop(self.worldmap._member_key(m))
+
+    def _drop(self, key):
+        entry = self._paths.pop(key, None)
+        self._failed.pop(key, None)
+        if entry is None or not entry.path:
+            return
+        for cell in entry.path:
+            keys = self._by_tile.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tile[cell]
+
+    def on_passability_change(self, x, y):
+        keys = self._by_tile.pop((x, y), None)
+        if keys:
+            for key in keys:
+                self.stats["invalidations"] += 1
+                self._drop(key)
+        if self._failed:
+            stale = [key for key, (x1, y1, x2, y2) in self._failed.items() if x1 <= x <= x2 and y1 <= y <= y2]
+            for key in stale:
+                self.stats["invalidations"] += 1
+                self._drop(key)
+
+UNREACHED = 2**31 - 1
+
+class FlowField:
+    """
+    Bản đồ khoảng cách BFS đa nguồn tới một region (mọi ô passable trong region
+    là nguồn), tính trong cửa sổ region + margin, cắt theo clip nếu có. Mỗi ô
+    lưu sẵn ô kế tiếp nên bất kỳ số member nào đi về region cũng chỉ tốn một
+    lần tra mảng mỗi bước.
+    """
+    def __init__(self, worldmap, region, margin=64, clip=None):
+        x1, y1, x2, y2 = region
+        cx1, cy1, cx2, cy2 = clip or (0, 0, worldmap.w - 1, worldmap.h - 1)
+        self.worldmap = worldmap
+        self.region = region
+        self.wx1, self.wy1 = max(cx1, x1 - margin), max(cy1, y1 - margin)
+        self.wx2, self.wy2 = min(cx2, x2 + margin), min(cy2, y2 + margin)
+        self.ww = self.wx2 - self.wx1 + 1
+        self.wh = self.wy2 - self.wy1 + 1
+        self.stats = {"rebuilds": 0, "updates": 0, "lookups": 0}
+        self.rebuild()
+
+    def contains(self, x, y):
+        x1, y1, x2, y2 = self.region
+        return x1 <= x <= x2 and y1 <= y <= y2
+
+    def _local(self, x, y):
+        if self.wx1 <= x <= self.wx2 and self.wy1 <= y <= self.wy2:
+            return (x - self.wx1) * self.wh + (y - self.wy1)
+        return -1
+
+    def _coords(self, li):
+        return self.wx1 + li // self.wh, self.wy1 + li % self.wh
+
+    def _neighbors(self, li):
+        x, y = self._coords(li)
+        for dx, dy in NEIGHBORS:
+            nli = self._local(x + dx, y + dy)
+            if nli >= 0:
+                yield nli, x + dx, y + dy
+
+    def rebuild(self):
+        n = self.ww * self.wh
+        self.dist = array("i", [UNREACHED]) * n
+        self.next = array("i", [-1]) * n
+        is_passable = self.worldmap.is_passable
+        x1, y1, x2, y2 = self.region
+        frontier = []
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                li = self._local(x, y)
+                if li >= 0 and is_passable(x, y):
+                    self.dist[li] = 0
+                    frontier.append(li)
+        self._propagate_bfs(frontier)
+        self.stats["rebuilds"] += 1
+
+    def _propagate_bfs(self, frontier):
+        dist, nxt = self.dist, self.next
+        is_passable = self.worldmap.is_passable
+        queue = deque(frontier)
+        while queue:
+            li = queue.popleft()
+            d = dist[li] + 1
+            for nli, nx, ny in self._neighbors(li):
+                if dist[nli] > d and is_passable(nx, ny):
+                    dist[nli] = d
+                    nxt[nli] = li
+                    queue.append(nli)
+
+    def _propagate_heap(self, heap):
+        dist, nxt = self.dist, self.next
+        is_passable = self.worldmap.is_passable
+        while heap:
+            d, li, via = heapq.heappop(heap)
+            if d >= dist[li]:
+                continue
+            dist[li] = d
+            nxt[li] = via
+            for nli, nx, ny in self._neighbors(li):
+                if dist[nli] > d + 1 and is_passable(nx, ny):
+                    heapq.heappush(heap, (d + 1, nli, li))
+
+    def on_passability_change(self, x, y):
+        li = self._local(x, y)
+        if li < 0:
+            return
+        self.stats["updates"] += 1
+        dist, nxt = self.dist, self.next
+        if self.worldmap.is_passable(x, y):
+            if self.contains(x, y):
+                heap = [(0, li, -1)]
+            else:
+                best, via = UNREACHED, -1
+                for nli, _, _ in self._neighbors(li):
+                    if dist[nli] < best:
+                        best, via = dist[nli], nli
+                if best == UNREACHED:
+                    return
+                heap = [(best + 1, li, via)]
+            self._propagate_heap(heap)
+            return
+        if dist[li] == UNREACHED:
+            return
+        # Ô bị chặn: reset cả cây con (các ô có next trỏ về nó) rồi nối lại từ rìa
+        affected = {li}
+        stack = [li]
+        while stack:
+            c = stack.pop()
+            for nli, _, _ in self._neighbors(c):
+                if nxt[nli] == c and nli not in affected:
+                    affected.add(nli)
+                    stack.append(nli)
+        # Ô nào còn hàng xóm ngoài phần bị huỷ có dist đúng bằng d-1 thì chỉ cần
+        # nối sang đó, giữ nguyên dist; duyệt theo dist tăng dần để cha được xét trước con
+        invalid = {li}
+        for a in sorted(affected, key=dist.__getitem__):
+            if a == li:
+                continue
+            want = dist[a] - 1
+            for nli, _, _ in self._neighbors(a):
+                if dist[nli] == want and nli not in invalid:
+                    nxt[a] = nli
+                    break
+            else:
+                invalid.add(a)
+        affected = invalid
+        for a in affected:
+            dist[a] = UNREACHED
+            nxt[a] = -1
+        heap = []
+        for a in affected:
+            if a == li:
+                continue
+            for nli, _, _ in self._neighbors(a):
+                if nli not in affected and dist[nli] != UNREACHED:
+                    heapq.heappush(heap, (dist[nli] + 1, a, nli))
+        self._propagate_heap(heap)
+
+    def distance(self, x, y):
+        li = self._local(x, y)
+        if li < 0 or self.dist[li] == UNREACHED:
+            return None
+        return self.dist[li]
+
+    def next_step(self, x, y):
+        self.stats["lookups"] += 1
+        li = self._local(x, y)
+        if li < 0:
+            return None
+        nli = self.next[li]
+        if nli < 0:
+            return None
+        return self._coords(nli)
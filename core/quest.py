@@ -1,4 +1,4 @@
-import random
+from core.rng import get_rng
 
 class Quest:
     def __init__(self, key, data):
@@ -23,7 +23,7 @@ class QuestBoard:
     def add_random_quest(self):
         available = [k for k,q in self.quests.items() if q.status == "open"]
         if available:
-            key = random.choice(available)
+            key = get_rng("quests").choice(available)
             self.add_quest(key)
         elif not available:
             from core.autogen import AutoGen
@@ -0,0 +1,109 @@
+from collections import deque
+from itertools import accumulate
+from operator import add, sub
+
+from core.worldmap import RESOURCE_CODE, RESOURCE_NAMES
+
+class ResourceSAT:
+    """
+    Tổng tiền tố theo từng cột của điểm tài nguyên trong vùng bounds, mỗi bộ
+    trọng số một bảng. Tile đổi tài nguyên chỉ làm bẩn cột của nó; cột bẩn
+    được dựng lại (O(h)) lười tới lần truy vấn đầu tiên cần tới cột đó. Tổng
+    một cửa sổ là tổng hiệu tiền tố của các cột trong cửa sổ, best_window
+    trượt cửa sổ theo cột nên mỗi lượt quét chỉ tốn O(diện tích vùng quét).
+    """
+    def __init__(self, worldmap, bounds=None):
+        self.worldmap = worldmap
+        self.bounds = bounds or (0, 0, worldmap.w - 1, worldmap.h - 1)
+        x1, y1, x2, y2 = self.bounds
+        self.bw, self.bh = x2 - x1 + 1, y2 - y1 + 1
+        self._tables = {}  # weights key: [tập cột bẩn, tiền tố từng cột, điểm theo resource code]
+        self.stats = {"column_rebuilds": 0, "window_queries": 0}
+
+    def contains(self, x, y):
+        x1, y1, x2, y2 = self.bounds
+        return x1 <= x <= x2 and y1 <= y <= y2
+
+    def mark_dirty(self, x, y):
+        if not self.contains(x, y):
+            return
+        cx = x - self.bounds[0]
+        for entry in self._tables.values():
+            entry[0].add(cx)
+
+    def _column(self, x):
+        wm = self.worldmap
+        _, y1, _, y2 = self.bounds
+        if wm.chunks is None:
+            start = x * wm.h
+            return wm.grid.resource[start + y1:start + y2 + 1], wm.grid.resource_amt[start + y1:start + y2 + 1]
+        res, amt = [], []
+        for y in range(y1, y2 + 1):
+            block, i = wm._locate(x, y)
+            res.append(block.resource[i])
+            amt.append(block.resource_amt[i])
+        return res, amt
+
+    def _columns(self, weights, cx1, cx2):
+        # Tiền tố của mọi cột, các cột cx1..cx2 (toạ độ trong bounds) chắc chắn đã sạch
+        key = tuple(sorted(weights.items()))
+        entry = self._tables.get(key)
+        if entry is None:
+            score_of = [0] * len(RESOURCE_NAMES)
+            for r, w in weights.items():
+                score_of[RESOURCE_CODE[r]] = w
+            entry = self._tables[key] = [set(range(self.bw)), [None] * self.bw, score_of]
+        dirty, cols, score_of = entry
+        todo = [cx for cx in dirty if cx1 <= cx <= cx2]
+        for cx in todo:
+            res, amt = self._column(self.bounds[0] + cx)
+            cols[cx] = list(accumulate([score_of[r] if a > 0 else 0 for r, a in zip(res, amt)], initial=0))
+            self.stats["column_rebuilds"] += 1
+        dirty.difference_update(todo)
+        return cols
+
+    def score(self, x1, y1, x2, y2, weights):
+        # Tổng điểm trong [x1..x2] x [y1..y2] (toạ độ map, phải nằm trong bounds)
+        ax, bx = x1 - self.bounds[0], x2 - self.bounds[0]
+        ay, by = y1 - self.bounds[1], y2 - self.bounds[1] + 1
+        cols = self._columns(weights, ax, bx)
+        self.stats["window_queries"] += 1
+        return sum(cols[cx][by] - cols[cx][ay] for cx in range(ax, bx + 1))
+
+    def count(self, resource, x1, y1, x2, y2):
+        return self.score(x1, y1, x2, y2, {resource: 1})
+
+    def best_window(self, win_w, win_h, weights, within=None):
+        """
+        Duyệt hết mọi cửa sổ win_w x win_h nằm trong within (mặc định bounds),
+        trả về (score, (x1,y1,x2,y2)) tốt nhất; hoà điểm thì lấy cửa sổ gặp trước.
+        """
+        bx, by = self.bounds[0], self.bounds[1]
+        wx1, wy1, wx2, wy2 = within or self.bounds
+        wx1, wy1 = max(wx1, bx), max(wy1, by)
+        wx2, wy2 = min(wx2, self.bounds[2]), min(wy2, self.bounds[3])
+        if wx2 - wx1 + 1 < win_w or wy2 - wy1 + 1 < win_h:
+            return None, None
+        cols = self._columns(weights, wx1 - bx, wx2 - bx)
+        ys = wy1 - by
+        n = wy2 - wy1 - win_h + 2
+        # Tổng dọc win_h ô của từng cột cho mọi y, cộng trượt win_w cột liền nhau
+        strips = deque()
+        window = [0] * n
+        best_score, best_rect = None, None
+        for cx in range(wx1 - bx, wx2 - bx + 1):
+            c = cols[cx]
+            strip = list(map(sub, c[ys + win_h:ys + win_h + n], c[ys:ys + n]))
+            strips.append(strip)
+            window = list(map(add, window, strip))
+            if len(strips) > win_w:
+                window = list(map(sub, window, strips.popleft()))
+            if len(strips) < win_w:
+                continue
+            top = max(window)
+            if best_score is None or top > best_score:
+                x = bx + cx - win_w + 1
+                y = wy1 + window.index(top)
+                best_score, best_rect = top, (x, y, x + win_w - 1, y + win_h - 1)
+        self.stats["window_queries"] += 1
+        return best_score, best_rect
@@ -1,55 +1,158 @@
-import random
+from core.rng import get_rng
 import pygame
 from core.utils import load_json
 
+class ResourceIndex:
+    """
+    Lưới bucket theo từng loại tài nguyên: (bx,by) -> tập toạ độ. Tìm gần nhất
+    quét từng vòng bucket quanh điểm hỏi, dừng khi vòng kế tiếp chắc chắn xa hơn
+    kết quả đã có, nên không cần giới hạn khoảng cách. Khoảng cách Manhattan.
+    """
+    def __init__(self, width, height, bucket_size=8):
+        self.width = width
+        self.height = height
+        self.bucket_size = bucket_size
+        self.nbx = (width + bucket_size - 1) // bucket_size
+        self.nby = (height + bucket_size - 1) // bucket_size
+        self.grids = {}  # rtype: {(bx,by): set((x,y))}
+        self.positions = {}  # (x,y): rtype
+
+    def add(self, x, y, rtype):
+        if (x, y) in self.positions:
+            self.remove(x, y)
+        b = self.bucket_size
+        self.grids.setdefault(rtype, {}).setdefault((x // b, y // b), set()).add((x, y))
+        self.positions[(x, y)] = rtype
+
+    def remove(self, x, y):
+        rtype = self.positions.pop((x, y), None)
+        if rtype is None:
+            return
+        b = self.bucket_size
+        grid = self.grids[rtype]
+        cell = grid[(x // b, y // b)]
+        cell.discard((x, y))
+        if not cell:
+            del grid[(x // b, y // b)]
+            if not grid:
+                del self.grids[rtype]
+
+    def count(self, rtype=None):
+        if rtype is None:
+            return len(self.positions)
+        return sum(len(c) for c in self.grids.get(rtype, {}).values())
+
+    def _grids_for(self, rtype):
+        if rtype is None:
+            return list(self.grids.values())
+        grid = self.grids.get(rtype)
+        return [grid] if grid else []
+
+    def _ring(self, bx, by, r):
+        if r == 0:
+            yield bx, by
+            return
+        for i in range(bx - r, bx + r + 1):
+            yield i, by - r
+            yield i, by + r
+        for j in range(by - r + 1, by + r):
+            yield bx - r, j
+            yield bx + r, j
+
+    def k_nearest(self, x, y, k, rtype=None):
+        grids = self._grids_for(rtype)
+        if not grids or k <= 0:
+            return []
+        b = self.bucket_size
+        bx, by = x // b, y // b
+        max_r = max(bx, by, self.nbx - 1 - bx, self.nby - 1 - by, 0)
+        found = []  # (dist, x, y)
+        for r in range(max_r + 1):
+            for cell in self._ring(bx, by, r):
+                for grid in grids:
+                    pts = grid.get(cell)
+                    if pts:
+                        found.extend((abs(px - x) + abs(py - y), px, py) for px, py in pts)
+            if len(found) >= k:
+                found.sort()
+                del found[k:]
+                # Mọi điểm ở vòng r+1 trở đi cách ít nhất r*b+1
+                if found[-1][0] < r * b + 1:
+                    break
+        found.sort()
+        return [(px, py) for _, px, py in found[:k]]
+
+    def nearest(self, x, y, rtype=None):
+        res = self.k_nearest(x, y, 1, rtype)
+        return res[0] if res else None
+
+    def in_box(self, x1, y1, x2, y2, rtype=None):
+        b = self.bucket_size
+        result = []
+        for grid in self._grids_for(rtype):
+            for i in range(max(0, x1 // b), min(self.nbx - 1, x2 // b) + 1):
+                for j in range(max(0, y1 // b), min(self.nby - 1, y2 // b) + 1):
+                    pts = grid.get((i, j))
+                    if pts:
+                        result.extend(p for p in pts if x1 <= p[0] <= x2 and y1 <= p[1] <= y2)
+        return result
+
+    def within_radius(self, x, y, radius, rtype=None):
+        pts = self.in_box(x - radius, y - radius, x + radius, y + radius, rtype)
+        return sorted((p for p in pts if abs(p[0] - x) + abs(p[1] - y) <= radius),
+                      key=lambda p: (abs(p[0] - x) + abs(p[1] - y), p[0], p[1]))
+
 class ResourceManager:
     def __init__(self, json_path, tilemap):
         self.json_path = json_path
         self.resources_data = load_json(json_path)
         self.tilemap = tilemap
+        self.index = ResourceIndex(tilemap.width, tilemap.height)
+        self._build_index()
         self.spawn_resources()
 
+    def _build_index(self):
+        for i in range(self.tilemap.width):
+            for j in range(self.tilemap.height):
+                tile = self.tilemap.get_tile(i, j)
+                if tile and tile.resource:
+                    self.index.add(i, j, tile.resource)
+
     def reload(self):
         self.resources_data = load_json(self.json_path)
 
     def spawn_resources(self):
+        rng = get_rng("resources")
         for _ in range(120):
-            x = random.randint(0, self.tilemap.width-1)
-            y = random.randint(0, self.tilemap.height-1)
-            t = random.choice(list(self.resources_data.keys()))
+            x = rng.randint(0, self.tilemap.width-1)
+            y = rng.randint(0, self.tilemap.height-1)
+            t = rng.choice(list(self.resources_data.keys()))
             tile = self.tilemap.get_tile(x, y)
             if tile and tile.resource is None:
                 tile.resource = t
+                self.index.add(x, y, t)
 
     def update(self):
         pass
 
-    def has_nearby_resource(self, x, y):
-        for dx in range(-4,5):
-            for dy in range(-4,5):
-                tx, ty = x+dx, y+dy
-                tile = self.tilemap.get_tile(tx, ty)
-                if tile and tile.resource:
-                    return True
-        return False
+    def has_nearby_resource(self, x, y, radius=4):
+        return bool(self.index.in_box(x-radius, y-radius, x+radius, y+radius))
 
-    def find_nearest_resource(self, x, y):
-        min_dist = 99
-        target = (None, None)
-        for i in range(self.tilemap.width):
-            for j in range(self.tilemap.height):
-                tile = self.tilemap.get_tile(i,j)
-                if tile and tile.resource:
-                    dist = abs(x-i)+abs(y-j)
-                    if dist < min_dist:
-                        min_dist = dist
-                        target = (i,j)
-        return target
+    def find_nearest_resource(self, x, y, rtype=None):
+        target = self.index.nearest(x, y, rtype)
+        return target if target else (None, None)
+
+    def find_k_nearest_resources(self, x, y, k, rtype=None):
+        return self.index.k_nearest(x, y, k, rtype)
+
+    def find_resources_within(self, x, y, radius, rtype=None):
+        return self.index.within_radius(x, y, radius, rtype)
 
     def harvest(self, x, y):
         tile = self.tilemap.get_tile(x, y)
         if tile and tile.resource:
             tile.resource = None
+            self.index.remove(x, y)
             return True
         return False
 
@@ -8,8 +8,7 @@ class ResourceManager:
 
     def update(self, members):
         # Farm: food tăng nếu có người làm tại farm
-        farm_tiles = [(x, y) for x in range(self.worldmap.w) for y in range(self.worldmap.h) if self.worldmap.get_tile(x, y).type == "farm"]
-        for fx, fy in farm_tiles:
+        for fx, fy in self.worldmap.positions_of_type("farm"):
             if (fx, fy) in self.occupancy:
                 self.resources["food"] += 1
         # Home: morale tăng nếu có người ở
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import random
+from contextlib import contextmanager
+
+class BufferedStream:
+    """
+    Luồng số ngẫu nhiên rút trước theo lô. take(n) trả về n số [0,1) cắt từ
+    buffer, rẻ hơn gọi random() n lần ở vòng lặp nóng (vd sinh tile theo cột).
+    Dãy số giống hệt gọi thẳng stream.random() nên cùng seed cho cùng kết quả.
+    """
+    def __init__(self, stream, size=4096):
+        self.stream = stream
+        self.size = size
+        self._buf = []
+        self._pos = 0
+
+    def _refill(self, n):
+        rnd = self.stream.random
+        self._buf = self._buf[self._pos:] + [rnd() for _ in range(max(n, self.size))]
+        self._pos = 0
+
+    def take(self, n):
+        if self._pos + n > len(self._buf):
+            self._refill(n)
+        pos = self._pos
+        self._pos = pos + n
+        return self._buf[pos:pos + n]
+
+    def random(self):
+        if self._pos >= len(self._buf):
+            self._refill(1)
+        self._pos += 1
+        return self._buf[self._pos - 1]
+
+    def getstate(self):
+        return {"stream": _encode_state(self.stream.getstate()), "buffer": self._buf[self._pos:]}
+
+    def setstate(self, state):
+        self.stream.setstate(_decode_state(state["stream"]))
+        self._buf = list(state["buffer"])
+        self._pos = 0
+
+def _encode_state(state):
+    # Trạng thái random.Random dạng JSON được
+    version, internal, gauss = state
+    return [version, list(internal), gauss]
+
+def _decode_state(state):
+    version, internal, gauss = state
+    return (version, tuple(internal), gauss)
+
+def derive_seed(seed, name):
+    digest = hashlib.blake2b(f"{seed}/{name}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+class RNGRegistry:
+    """
+    Các luồng random độc lập có tên, đều sinh từ một seed gốc: seed của luồng
+    là hash(seed gốc, tên) nên thêm/bớt lượt rút ở hệ này không làm lệch hệ
+    khác, và cùng seed gốc luôn cho cùng world, cùng chuỗi tick.
+    seed=None lấy seed ngẫu nhiên từ hệ điều hành như random toàn cục.
+    """
+    def __init__(self, seed=None):
+        self.seed = int.from_bytes(os.urandom(8), "little") if seed is None else seed
+        self._streams = {}  # name: random.Random
+        self._buffered = {}  # name: BufferedStream
+
+    def stream(self, name):
+        r = self._streams.get(name)
+        if r is None:
+            r = self._streams[name] = random.Random(derive_seed(self.seed, name))
+        return r
+
+    def buffered(self, name, size=4096):
+        b = self._buffered.get(name)
+        if b is None:
+            b = self._buffered[name] = BufferedStream(random.Random(derive_seed(self.seed, f"{name}#buffered")), size)
+        return b
+
+    def reseed(self, seed):
+        # Seed lại tại chỗ để ai đang giữ tham chiếu tới luồng vẫn dùng được
+        self.seed = seed
+        for name, r in self._streams.items():
+            r.seed(derive_seed(seed, name))
+        for name, b in self._buffered.items():
+            b.stream.seed(derive_seed(seed, f"{name}#buffered"))
+            b._buf, b._pos = [], 0
+
+    def getstate(self):
+        return {"seed": self.seed,
+                "streams": {name: _encode_state(r.getstate()) for name, r in self._streams.items()},
+                "buffered": {name: b.getstate() for name, b in self._buffered.items()}}
+
+    def setstate(self, state):
+        self.seed = state["seed"]
+        for name, s in state["streams"].items():
+            self.stream(name).setstate(_decode_state(s))
+        for name, s in state["buffered"].items():
+            self.buffered(name).setstate(s)
+
+_registry = RNGRegistry()
+
+def get_registry():
+    return _registry
+
+def get_rng(name):
+    """Luồng random có tên của registry đang dùng. Gọi lại mỗi lần dùng, đừng giữ qua use_registry."""
+    return _registry.stream(name)
+
+def seed_all(seed):
+    _registry.reseed(seed)
+
+@contextmanager
+def use_registry(registry):
+    # Tạm đổi registry mặc định, vd mỗi partition của multisect có registry riêng
+    global _registry
+    saved = _registry
+    _registry = registry
+    try:
+        yield registry
+    finally:
+        _registry = saved
@@ -0,0 +1,369 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import deque
+
+from core.ecology import ResourceEcology
+from core.rng import get_registry
+from core.entities import Sect, SectMember
+from core.sect_leader_ai import SectLeaderAI, Stage
+from core.sect_manager import SectManager
+from core.simulation import Simulation
+from core.worldmap import WorldMap, TileBlock
+
+SAVE_MAGIC = b"FWSAVE\0\0"
+SAVE_VERSION = 1
+ALIGN = 64
+# magic, version, cờ little-endian, w, h, rồi (offset, length) của meta, tiles, members, commands
+HEADER = struct.Struct("<8sHBxII8Q")
+# id, name, role, division (chỉ số chuỗi), x, y, cờ, state, loyalty, stuck, lod phase, prev_x, prev_y, moved_tick
+MEMBER = struct.Struct("<IIIIiiBIiHiiii")
+# loại (0 collect, 1 build), id, chỉ số member, x, y, progress, type (chuỗi), pending_materials
+COMMAND = struct.Struct("<BIIiiiIB")
+NO_STRING = 0xFFFFFFFF
+MEMBER_ALIVE, MEMBER_FOUNDER, MEMBER_MOVED = 1, 2, 4
+STRING_FIELDS = (0, 1, 2, 3, 7)  # vị trí các chuỗi trong record member
+# Các list chỉ được append: file delta chỉ ghi phần đuôi mới
+APPEND_ONLY = (("sect", "history"), ("sect", "sect_commands"), ("ai", "memory"))
+
+def _pad(n, align=ALIGN):
+    return (n + align - 1) // align * align
+
+class StringTable:
+    def __init__(self):
+        self.items = []
+        self._index = {}
+
+    def __call__(self, s):
+        if s is None:
+            return NO_STRING
+        i = self._index.get(s)
+        if i is None:
+            i = self._index[s] = len(self.items)
+            self.items.append(s)
+        return i
+
+def pack_member(m, strings):
+    """Record struct và phần phụ (skills, memory...) của một member."""
+    flags = (MEMBER_ALIVE if m.alive else 0) | (MEMBER_FOUNDER if m.is_founder else 0)
+    if hasattr(m, "moved_tick"):
+        flags |= MEMBER_MOVED
+    record = MEMBER.pack(
+        strings(m.id), strings(m.name), strings(m.role), strings(m.division), int(m.x), int(m.y), flags,
+        strings(m.state), m.loyalty, getattr(m, "_stuck_count", 0), getattr(m, "_lod_phase", -1),
+        getattr(m, "prev_x", -1), getattr(m, "prev_y", -1), getattr(m, "moved_tick", -1))
+    extra = {k: v for k, v in (("skills", dict(m.skills)), ("memory", list(m.memory)),
+                               ("current_task", m.current_task), ("build_target", m.build_target)) if v}
+    return record, extra
+
+def pack_commands(ai, member_index, strings):
+    recs = bytearray()
+    for kind, queue in ((0, ai.collect_queue), (1, ai.build_queue)):
+        for cmd in queue:
+            recs += COMMAND.pack(kind, cmd["id"], member_index[cmd["member"].id], cmd["x"], cmd["y"],
+                                 cmd["progress"], strings(cmd.get("type")), 1 if cmd.get("pending_materials") else 0)
+    return bytes(recs)
+
+def unpack_members(data, strings):
+    # Record member đã giải chuỗi, tuple theo thứ tự trường của MEMBER
+    result = []
+    for rec in MEMBER.iter_unpack(data):
+        rec = list(rec)
+        for k in STRING_FIELDS:
+            rec[k] = None if rec[k] == NO_STRING else strings[rec[k]]
+        result.append(tuple(rec))
+    return result
+
+def unpack_commands(data, strings):
+    return [(kind, cid, midx, x, y, progress, None if ctype == NO_STRING else strings[ctype], pending)
+            for kind, cid, midx, x, y, progress, ctype, pending in COMMAND.iter_unpack(data)]
+
+def list_lengths(sim):
+    # Độ dài hiện tại của các list chỉ-append, làm mốc cho lần ghi delta sau
+    parts = {"sect": sim.sect, "ai": sim.leader_ai}
+    return {f"{part}.{key}": len(getattr(parts[part], key)) for part, key in APPEND_ONLY}
+
+def state_meta(sim, since=None, ecology=True):
+    """
+    Phần JSON của trạng thái, mọi thứ đều là bản copy nên ghi được ở thread
+    khác. Có since (từ list_lengths) thì list chỉ-append chỉ lấy phần đuôi;
+    ecology=False bỏ qua tập tile đang mọc lại.
+    """
+    wm, ai, sect = sim.worldmap, sim.leader_ai, sim.sect
+    since = since or {}
+    tail = lambda part, obj, key: getattr(obj, key)[since.get(f"{part}.{key}", 0):]
+    meta = {
+        "tick": sim.tick,
+        "materials": dict(sim.materials),
+        "lod_interval": sim.lod_interval,
+        "rng": get_registry().getstate(),
+        "since": dict(since),
+        "world": {
+            "building_names": list(wm.building_names),
+            "view": [wm.view_x, wm.view_y, wm.view_w, wm.view_h],
+            "tick": wm.tick,
+            "lod_seq": wm._lod_seq,
+            "flow_fields": [list(r) for r in wm.flow_fields],
+        },
+        "ecology": {str(code): [c for cell in sorted(cells) for c in cell]
+                    for code, cells in sim.ecology.regrowing.items()} if ecology else None,
+        "sect": {
+            "name": sect.name, "founder_id": sect.founder_id, "timeline_stage": sect.timeline_stage,
+            "history": tail("sect", sect, "history"), "sect_commands": tail("sect", sect, "sect_commands"),
+            "resources": dict(sect.resources), "famous": sect.famous, "holy_site": sect.holy_site,
+        },
+        "ai": {
+            "leader_id": ai.leader_id, "stage": ai.stage.name, "stage_years": ai.stage_years,
+            "memory": tail("ai", ai, "memory"), "blueprint_region": ai.blueprint_region, "bounds": ai.bounds,
+            "last_eval_tick": ai.last_eval_tick, "cfg": dict(vars(ai.cfg)), "ml_history": list(ai.ml_history),
+            "next_ids": [ai.collect_queue._next_id, ai.build_queue._next_id],
+            "wake": ai._wake, "plan": _plan_cursor(ai),
+        },
+    }
+    if not ecology:
+        del meta["ecology"]
+    return meta
+
+def _plan_cursor(ai):
+    # Bản copy tiến độ kế hoạch đang chia lát dở (None nếu không có kế hoạch nào)
+    cursor = ai._plan_cursor
+    if ai._plan is None or cursor is None:
+        return None
+    copy = dict(cursor, members=list(cursor["members"]))
+    if "tiles" in copy:
+        copy["tiles"] = [list(t) for t in copy["tiles"]]
+    return copy
+
+def merge_meta(meta, newer):
+    # Meta mới thay meta cũ, riêng list chỉ-append thì nối phần đuôi vào;
+    # phần delta không ghi (vd ecology không đổi) giữ nguyên bản cũ
+    merged = dict(newer)
+    for key, value in meta.items():
+        merged.setdefault(key, value)
+    for part in {part for part, _ in APPEND_ONLY}:
+        merged[part] = dict(newer[part])
+    for part, key in APPEND_ONLY:
+        start = newer["since"].get(f"{part}.{key}", 0)
+        merged[part][key] = meta[part][key][:start] + newer[part][key]
+    return merged
+
+def capture_state(sim, strings=None):
+    """
+    Chụp toàn bộ trạng thái ở ranh giới tick thành dữ liệu bất biến (bytes,
+    dict/list copy). Phần tốn nhất là copy mảng tile; đóng gói JSON và ghi
+    file để cho write_state, chạy được ở thread khác.
+    """
+    wm = sim.worldmap
+    if wm.chunks is not None:
+        raise ValueError("Chưa hỗ trợ lưu world dạng chunk")
+    strings = strings if strings is not None else StringTable()
+    members = list(sim.sect.members.values())
+    member_recs, extras = [], {}
+    for i, m in enumerate(members):
+        record, extra = pack_member(m, strings)
+        member_recs.append(record)
+        if extra:
+            extras[str(i)] = extra
+    commands = pack_commands(sim.leader_ai, {m.id: i for i, m in enumerate(members)}, strings)
+    meta = state_meta(sim)
+    meta["members_extra"] = extras
+    meta["strings"] = list(strings.items)
+    return {"w": wm.w, "h": wm.h, "meta": meta, "tiles": [bytes(a) for a in wm.grid.fields()],
+            "members": b"".join(member_recs), "commands": commands}
+
+def layout(sections, start):
+    # Offset/length của từng section, mỗi section căn lề ALIGN
+    offset = _pad(start)
+    table, placed = [], []
+    for data in sections:
+        table += [offset, len(data)]
+        placed.append((data, offset))
+        offset = _pad(offset + len(data))
+    return table, placed
+
+def write_sections(path, header, placed):
+    # Ghi qua file tạm rồi đổi tên, không bao giờ để lại file save dở
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for data, offset in placed:
+            f.seek(offset)
+            f.write(data)
+        f.truncate(_pad(f.tell()))
+    os.replace(tmp, path)
+
+def write_state(state, path):
+    tiles = bytearray()
+    for raw in state["tiles"]:
+        tiles += raw + bytes(_pad(len(raw), 8) - len(raw))
+    meta_raw = json.dumps(state["meta"], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    table, placed = layout([meta_raw, bytes(tiles), state["members"], state["commands"]], HEADER.size)
+    header = HEADER.pack(SAVE_MAGIC, SAVE_VERSION, sys.byteorder == "little", state["w"], state["h"], *table)
+    write_sections(path, header, placed)
+
+def save_simulation(sim, path):
+    """
+    Ghi toàn bộ trạng thái Simulation ra file nhị phân có version: tile dạng
+    mảng đóng gói (mỗi mảng căn lề để nạp bằng mmap), member và lệnh dạng
+    record struct, phần còn lại (sect, AI, kho, RNG...) là JSON.
+    """
+    write_state(capture_state(sim), path)
+
+def _tile_views(buf, size, native):
+    views, offset = [], 0
+    for fmt in TileBlock.FIELD_TYPES:
+        n = size * struct.calcsize(fmt)
+        view = buf[offset:offset + n].cast(fmt)
+        if not native and view.itemsize > 1:
+            view = array(fmt, bytes(view))
+            view.byteswap()
+        views.append(view)
+        offset += _pad(n, 8)
+    return views
+
+def read_state(path):
+    """
+    Đọc file save: phần tile được mmap (ACCESS_COPY, sửa không ghi ngược vào
+    file) và dùng thẳng làm mảng của TileBlock. Trả về (w, h, meta, grid,
+    member records, command records) cho build_simulation.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    buf = memoryview(mm)
+    magic, version, little, w, h, *table = HEADER.unpack_from(buf, 0)
+    if magic != SAVE_MAGIC:
+        raise ValueError(f"{path} không phải file save")
+    if version > SAVE_VERSION:
+        raise ValueError(f"File save version {version} mới hơn bản này hỗ trợ ({SAVE_VERSION})")
+    meta_off, meta_len, tiles_off, tiles_len, mem_off, mem_len, cmd_off, cmd_len = table
+    meta = json.loads(bytes(buf[meta_off:meta_off + meta_len]).decode("utf-8"))
+    native = bool(little) == (sys.byteorder == "little")
+    grid = TileBlock.from_views(w * h, _tile_views(buf[tiles_off:tiles_off + tiles_len], w * h, native))
+    strings = meta["strings"]
+    members = unpack_members(buf[mem_off:mem_off + mem_len], strings)
+    commands = unpack_commands(buf[cmd_off:cmd_off + cmd_len], strings)
+    return w, h, meta, grid, members, commands
+
+def build_simulation(w, h, meta, grid, members, commands):
+    """
+    Dựng Simulation từ trạng thái đã đọc. Tham chiếu member trong lệnh nối
+    lại theo chỉ số; các chỉ mục suy ra (đếm type, occupancy, flow field)
+    được dựng lại. Kế hoạch AI đang chia lát dở được dựng lại từ cursor đã
+    lưu nên chạy tiếp đúng lát kế tiếp như khi chưa lưu.
+    """
+    wmeta = meta["world"]
+    wm = WorldMap(w, h, grid=grid, building_names=wmeta["building_names"])
+    wm.view_x, wm.view_y, wm.view_w, wm.view_h = wmeta["view"]
+    wm.tick = wmeta["tick"]
+    wm._lod_seq = wmeta["lod_seq"]
+
+    smeta = meta["sect"]
+    sect = Sect.__new__(Sect)
+    sect.name = smeta["name"]
+    sect.members = {}
+    sect.member_listeners = []
+    sect.change_listeners = []
+    for key in ("founder_id", "timeline_stage", "history", "sect_commands", "resources", "famous", "holy_site"):
+        setattr(sect, key, smeta[key])
+    objs = []
+    extras = meta["members_extra"]
+    for i, rec in enumerate(members):
+        (mid, name, role, division, x, y, flags, state, loyalty, stuck, phase,
+         prev_x, prev_y, moved_tick) = rec
+        m = SectMember(name, role, division, bool(flags & MEMBER_FOUNDER), x, y)
+        m.id = mid
+        m.alive = bool(flags & MEMBER_ALIVE)
+        m.state = state
+        m.loyalty = loyalty
+        m._stuck_count = stuck
+        if phase >= 0:
+            m._lod_phase = phase
+        if flags & MEMBER_MOVED:
+            m.prev_x, m.prev_y, m.moved_tick = prev_x, prev_y, moved_tick
+        for k, v in extras.get(str(i), {}).items():
+            setattr(m, k, v)
+        sect.members[m.id] = m
+        objs.append(m)
+    manager = SectManager()
+    manager.sects[sect.name] = sect
+
+    ameta = meta["ai"]
+    ai = SectLeaderAI(sect, ameta["leader_id"])
+    ai.stage = Stage[ameta["stage"]]
+    ai.stage_years = ameta["stage_years"]
+    ai.memory = ameta["memory"]
+    ai.blueprint_region = tuple(ameta["blueprint_region"]) if ameta["blueprint_region"] else None
+    ai.bounds = tuple(ameta["bounds"]) if ameta["bounds"] else None
+    ai.last_eval_tick = ameta["last_eval_tick"]
+    for k, v in ameta["cfg"].items():
+        setattr(ai.cfg, k, v)
+    ai.ml_history = deque(ameta["ml_history"], maxlen=ai.cfg.ml_history_size)
+    # Save cũ không có wake/plan: lập kế hoạch lại ngay ở tick đầu như trước
+    ai._wake = ameta.get("wake", True)
+    queues = (ai.collect_queue, ai.build_queue)
+    for kind, cid, midx, x, y, progress, ctype, pending in commands:
+        cmd = {"id": cid, "member": objs[midx], "x": x, "y": y, "progress": progress}
+        if kind == 1:
+            cmd["type"] = ctype
+            cmd["pending_materials"] = bool(pending)
+        queues[kind].append(cmd)
+    for queue, next_id in zip(queues, ameta["next_ids"]):
+        queue._next_id = next_id
+
+    wm.update_member_positions([m for m in objs if m.alive])
+    for region in wmeta["flow_fields"]:
+        wm.flow_field(tuple(region))
+    ecology = ResourceEcology(wm)
+    for code, flat in meta["ecology"].items():
+        ecology.add(int(code), zip(flat[::2], flat[1::2]))
+
+    get_registry().setstate(meta["rng"])
+    sim = Simulation.from_state(manager, sect, ai, wm, ecology, meta["materials"],
+                                tick=meta["tick"], lod_interval=meta["lod_interval"])
+    if ameta.get("plan"):
+        ai._plan_cursor = ameta["plan"]
+        ai._plan = ai._plan_slices(wm, sim.materials, ai._plan_cursor)
+    return sim
+
+def load_simulation(path):
+    """Nạp file do save_simulation ghi."""
+    return build_simulation(*read_state(path))
+
+def check_resume(sim, at, ticks, directory=None):
+    """
+    Kiểm tra lưu rồi nạp không làm lệch mô phỏng: chạy sim tới at tick, lưu,
+    chạy tiếp cho đủ ticks rồi lưu lần nữa; nạp lại bản lưu giữa chừng, chạy
+    cùng số tick còn lại và so hai bản lưu cuối. Trả về tên các phần khác
+    nhau (meta theo khoá, tiles, members, commands); rỗng là khớp.
+    """
+    import tempfile
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        mid, straight, resumed = (os.path.join(tmp, f"{name}.fws") for name in ("mid", "straight", "resumed"))
+        sim.run(at)
+        save_simulation(sim, mid)
+        sim.run(ticks - at)
+        save_simulation(sim, straight)
+        again = load_simulation(mid)
+        again.run(ticks - at)
+        save_simulation(again, resumed)
+        with open(straight, "rb") as a, open(resumed, "rb") as b:
+            if a.read() == b.read():
+                return []
+        (_, _, meta_a, grid_a, mem_a, cmd_a), (_, _, meta_b, grid_b, mem_b, cmd_b) = read_state(straight), read_state(resumed)
+    diff = []
+    for part, value in meta_a.items():
+        other = meta_b.get(part)
+        if isinstance(value, dict) and isinstance(other, dict):
+            diff += [f"meta.{part}.{key}" for key in value.keys() | other.keys() if value.get(key) != other.get(key)]
+        elif value != other:
+            diff.append(f"meta.{part}")
+    if grid_a.to_bytes() != grid_b.to_bytes():
+        diff.append("tiles")
+    if mem_a != mem_b:
+        diff.append("members")
+    if cmd_a != cmd_b:
+        diff.append("commands")
+    return sorted(diff)
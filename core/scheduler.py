@@ -0,0 +1,75 @@
+import time
+from collections import deque
+
+def tick_budget(fps, share=0.5):
+    # Phần thời gian của một frame dành cho tick, phần còn lại để render giữ được fps
+    return share / fps
+
+class FixedStepScheduler:
+    """
+    Chạy tick mô phỏng theo nhịp cố định tick_rate * speed (tick/giây), tách
+    khỏi FPS render. Mỗi frame chỉ được tiêu tối đa frame_budget giây cho
+    tick (mặc định nửa frame ở 60 FPS, xem tick_budget); chạy không kịp thì
+    bỏ phần tick dư thay vì dồn nợ, số tick bị bỏ đếm trong stats["dropped"],
+    nhịp thực tế báo qua effective_rate. alpha là phần lẻ giữa hai tick để
+    render nội suy.
+    """
+    def __init__(self, tick_rate=30, speed=1, frame_budget=tick_budget(60), rate_window=1.0, clock=time.perf_counter):
+        self.tick_rate = tick_rate
+        self.speed = speed
+        self.frame_budget = frame_budget
+        self.rate_window = rate_window
+        self.clock = clock
+        self.accumulator = 0.0  # số tick (có phần lẻ) đang chờ chạy
+        self.last_time = None
+        self._history = deque()  # (thời điểm, số tick chạy) trong rate_window
+        self.stats = {"ticks": 0, "dropped": 0, "frames": 0, "over_budget_frames": 0}
+
+    @property
+    def target_rate(self):
+        return self.tick_rate * self.speed
+
+    @property
+    def alpha(self):
+        return min(1.0, self.accumulator)
+
+    def reset(self):
+        self.accumulator = 0.0
+        self.last_time = None
+        self._history.clear()
+
+    def advance(self, step):
+        """Gọi step() đủ số tick đến hạn cho frame này, trả về số tick đã chạy."""
+        now = self.clock()
+        if self.last_time is not None:
+            self.accumulator += (now - self.last_time) * self.target_rate
+        self.last_time = now
+        deadline = now + self.frame_budget
+        ran = 0
+        while self.accumulator >= 1.0:
+            step()
+            ran += 1
+            self.accumulator -= 1.0
+            if self.clock() >= deadline:
+                break
+        if self.accumulator >= 1.0:
+            # Tụt lại sau: bỏ phần tick dư, giữ phần lẻ cho nội suy
+            dropped = int(self.accumulator)
+            self.accumulator -= dropped
+            self.stats["dropped"] += dropped
+            self.stats["over_budget_frames"] += 1
+        self.stats["ticks"] += ran
+        self.stats["frames"] += 1
+        self._history.append((now, ran))
+        while self._history and now - self._history[0][0] > self.rate_window:
+            self._history.popleft()
+        return ran
+
+    @property
+    def effective_rate(self):
+        if len(self._history) < 2:
+            return 0.0
+        span = self._history[-1][0] - self._history[0][0]
+        if span <= 0:
+            return 0.0
+        return sum(n for _, n in list(self._history)[1:]) / span
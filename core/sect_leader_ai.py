@@ -1,9 +1,14 @@
+from collections import deque
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Deque, Dict, List, Optional
 import math
-import random
+import time
+
+from core.assignment import assign, travel_cost
+from core.commands import CommandTable
 
 HOUSE_CAPACITY = 4  # Số người mỗi nhà ở tối đa
+BASE_REGION_WEIGHTS = {"soil": 2, "wood": 2, "stone": 1}  # Điểm mỗi tile còn tài nguyên khi chọn vùng căn cứ
 
 class Stage(Enum):
     SHADOW = 1
@@ -19,18 +24,33 @@ class SectPolicy:
         self.commands = commands
         self.description = description
 
+class SectAIConfig:
+    def __init__(self):
+        self.evaluate_interval = 15  # số tick giữa hai lượt lập kế hoạch (trừ khi có member rảnh ra)
+        self.slice_budget_us = 1000  # thời gian tối đa cho lập kế hoạch mỗi tick
+        self.slice_work_units = None  # nếu đặt: ngân sách theo số lát việc thay vì thời gian (chạy tất định)
+        self.ml_history_size = 256  # số record ML gần nhất giữ trong bộ nhớ, toàn bộ thì ghi qua ml_sink
+
 class SectLeaderAI:
     def __init__(self, sect, leader_id):
+        self.cfg = SectAIConfig()
         self.sect = sect
         self.leader_id = leader_id
         self.stage = Stage.SHADOW
         self.stages_policy = self._build_stages_policy()
         self.memory: List[str] = []
         self.stage_years = 0
-        self.build_queue = []
-        self.collect_queue = []
-        self.ml_history: List[Dict] = []
+        self.build_queue = CommandTable()
+        self.collect_queue = CommandTable()
+        self.ml_history: Deque[Dict] = deque(maxlen=self.cfg.ml_history_size)
+        self.ml_sink = None  # TrajectorySink (core.trajectory): nhận mọi record ML để ghi ra file
         self.blueprint_region = None
+        self.bounds = None  # (x1,y1,x2,y2): vùng của sect (đặt căn cứ, đếm công trình, flow field), None = cả map
+        self.last_eval_tick = None
+        self._plan = None  # generator lập kế hoạch đang dở, chạy tiếp ở tick sau
+        self._wake = False  # có member vừa rảnh, lập kế hoạch lại không chờ interval
+        self._plan_cursor = None  # tiến độ của _plan, xem _plan_slices
+        self.stats = {"plans_started": 0, "plans_completed": 0, "slices": 0, "suspended": 0}
 
     def _build_stages_policy(self) -> Dict[Stage, SectPolicy]:
         return {
@@ -53,90 +73,175 @@ class SectLeaderAI:
     def get_current_policy(self):
         return self.stages_policy.get(self.stage) or list(self.stages_policy.values())[0]
 
-    def choose_base_region(self, worldmap, population):
-        best_score = -1
-        best_rect = None
-        for _ in range(20):
-            x1 = random.randint(2, worldmap.w-9)
-            y1 = random.randint(2, worldmap.h-9)
-            x2, y2 = x1+6, y1+6
-            score = 0
-            for xx in range(x1, x2+1):
-                for yy in range(y1, y2+1):
-                    t = worldmap.get_tile(xx, yy)
-                    if t and t.resource in ["soil", "wood"] and t.resource_amt > 0: score += 2
-                    elif t and t.resource == "stone" and t.resource_amt > 0: score += 1
-            if score > best_score:
-                best_score = score
-                best_rect = (x1,y1,x2,y2)
+    def choose_base_region(self, worldmap, population, size=7, weights=None):
+        # Chấm điểm mọi cửa sổ size x size bằng summed-area table, lấy vùng tốt nhất
+        sat = worldmap.get_region_score()
+        within = (2, 2, worldmap.w - 3, worldmap.h - 3)
+        if self.bounds:
+            bx1, by1, bx2, by2 = self.bounds
+            within = (max(within[0], bx1), max(within[1], by1), min(within[2], bx2), min(within[3], by2))
+        _, best_rect = sat.best_window(size, size, weights or BASE_REGION_WEIGHTS, within)
         self.blueprint_region = best_rect
         return best_rect
 
+    def count_type(self, worldmap, ttype):
+        # AI bị giới hạn bounds chỉ tính công trình trong vùng của mình
+        if not self.bounds:
+            return worldmap.count_type(ttype)
+        x1, y1, x2, y2 = self.bounds
+        return sum(1 for x, y in worldmap.positions_of_type(ttype) if x1 <= x <= x2 and y1 <= y <= y2)
+
     def is_tile_in_queue(self, queue, x, y):
-        return any(cmd.get("x")==x and cmd.get("y")==y for cmd in queue)
+        return queue.has_tile(x, y)
 
     def get_idle_npc(self, members, exclude_ids=None):
         if exclude_ids is None:
             exclude_ids = set()
         return [m for m in members if getattr(m, "state", "idle") == "idle" and m.id not in exclude_ids]
 
-    def assign_collect_task(self, worldmap, members):
+    def _collect_slices(self, worldmap, members, cursor=None):
+        # Quét region từng cột (mỗi cột một lát), giao việc khi quét xong.
+        # cursor giữ cột kế tiếp và các tile đã gom để chạy tiếp được sau khi nạp save
         if not self.blueprint_region: return
         (x1,y1,x2,y2) = self.blueprint_region
-        task_tiles = []
-        for x in range(x1, x2+1):
+        cursor = {} if cursor is None else cursor
+        task_tiles = cursor.setdefault("tiles", [])
+        for x in range(cursor.get("x", x1), x2+1):
             for y in range(y1, y2+1):
                 tile = worldmap.get_tile(x, y)
                 if tile and tile.is_resource() and not self.is_tile_in_queue(self.collect_queue, x, y):
                     task_tiles.append((x, y))
-        idle_members = self.get_idle_npc(members)
-        for tilepos, m in zip(task_tiles, idle_members):
-            self.collect_queue.append({"member": m, "x": tilepos[0], "y": tilepos[1], "progress": 0})
+            cursor["x"] = x + 1
+            yield
+        # Tile có thể đã đổi giữa các lát, kiểm lại trước khi giao
+        open_tiles = []
+        for tx, ty in task_tiles:
+            tile = worldmap.get_tile(tx, ty)
+            if tile and tile.is_resource() and not self.is_tile_in_queue(self.collect_queue, tx, ty):
+                open_tiles.append((tx, ty))
+        # Ghép member rảnh với tile theo quãng đường thay vì theo thứ tự quét
+        pairs = assign(self.get_idle_npc(members), open_tiles,
+                       lambda m, pos: travel_cost(int(m.x), int(m.y), pos[0], pos[1]))
+        for m, (tx, ty) in pairs:
+            self.collect_queue.append({"member": m, "x": tx, "y": ty, "progress": 0})
             m.state = "moving"
+        if pairs:
+            worldmap.members_changed([m for m, _ in pairs])
 
-    def assign_build_task(self, worldmap, members, type_name):
+    def _build_slices(self, worldmap, members, type_name, cursor=None):
         if not self.blueprint_region: return
         (x1,y1,x2,y2) = self.blueprint_region
-        for x in range(x1, x2+1):
+        cursor = {} if cursor is None else cursor
+        for x in range(cursor.get("x", x1), x2+1):
             for y in range(y1, y2+1):
                 tile = worldmap.get_tile(x, y)
                 if tile and tile.resource=="none" and not tile.pending_build and tile.type=="field" and not self.is_tile_in_queue(self.build_queue, x, y):
-                    idle = next((m for m in members if getattr(m, "state", "idle") == "idle"), None)
+                    idle = min((m for m in members if getattr(m, "state", "idle") == "idle"),
+                               key=lambda m: travel_cost(int(m.x), int(m.y), x, y), default=None)
                     if idle:
                         self.build_queue.append({"member": idle, "x": x, "y": y, "progress": 0, "type": type_name, "pending_materials": False})
                         idle.state = "moving"
+                        worldmap.members_changed((idle,))
                         worldmap.set_pending_build(x, y, True, f"{type_name.title()}")
-                        break
+                        return
+            cursor["x"] = x + 1
+            yield
 
-    def decide_action(self, worldmap, materials):
-        leader = self.sect.get_leader()
-        if not leader: return
-        members = [m for m in self.sect.members.values() if m.alive]
+    def assign_collect_task(self, worldmap, members):
+        for _ in self._collect_slices(worldmap, members): pass
+
+    def assign_build_task(self, worldmap, members, type_name):
+        for _ in self._build_slices(worldmap, members, type_name): pass
+
+    def _plan_slices(self, worldmap, materials, cursor=None):
+        """
+        Kế hoạch chia lát. Tiến độ ghi vào cursor (dict JSON được: pha, cột kế
+        tiếp, tile đã gom, id member lúc bắt đầu) nên savegame lưu được kế
+        hoạch đang dở và dựng lại generator chạy tiếp từ đúng lát đó.
+        """
+        cursor = {} if cursor is None else cursor
+        if "phase" not in cursor:
+            leader = self.sect.get_leader()
+            if not leader: return
+            members = [m for m in self.sect.members.values() if m.alive]
+            cursor.update(phase="region", members=[m.id for m in members])
+        else:
+            members = [self.sect.members[mid] for mid in cursor["members"] if mid in self.sect.members]
+            if "tiles" in cursor:
+                cursor["tiles"] = [tuple(t) for t in cursor["tiles"]]
         population = len(members)
-        # Nếu chưa có blueprint thì chọn vùng
-        if not self.blueprint_region:
-            region = self.choose_base_region(worldmap, population)
-            if region:
-                x = (region[0] + region[2]) // 2
-                y = (region[1] + region[3]) // 2
-                leader.x, leader.y = x, y
-        # Giao collect task cho các tile còn resource (ưu tiên farm đầu tiên)
-        self.assign_collect_task(worldmap, members)
-        if self.collect_queue: return
-        # Khi vùng đã clear, xây farm trước, sau đó nhà, rồi mới tới các công trình khác
-        num_farm = sum(1 for x in range(worldmap.w) for y in range(worldmap.h) if worldmap.get_tile(x, y).type == "farm")
-        num_home = sum(1 for x in range(worldmap.w) for y in range(worldmap.h) if worldmap.get_tile(x, y).type == "home")
-        required_farm = max(1, population // 2)
-        required_home = max(1, math.ceil(population / HOUSE_CAPACITY))
-        # Ưu tiên farm, rồi home, rồi mới đến các công trình khác
-        if num_farm < required_farm:
-            self.assign_build_task(worldmap, members, "farm")
-        elif num_home < required_home:
-            self.assign_build_task(worldmap, members, "home")
-        # TODO: phát triển các công trình tiếp theo (workshop, defense...)
+        if cursor["phase"] == "region":
+            cursor["phase"] = "collect"
+            # Nếu chưa có blueprint thì chọn vùng
+            if not self.blueprint_region:
+                leader = self.sect.get_leader()
+                region = self.choose_base_region(worldmap, population)
+                if region:
+                    worldmap.flow_field(region, self.bounds)
+                    x = (region[0] + region[2]) // 2
+                    y = (region[1] + region[3]) // 2
+                    worldmap.move_member(leader, x, y)
+                yield
+        if cursor["phase"] == "collect":
+            # Giao collect task cho các tile còn resource (ưu tiên farm đầu tiên)
+            yield from self._collect_slices(worldmap, members, cursor)
+            if self.collect_queue: return
+            # Khi vùng đã clear, xây farm trước, sau đó nhà, rồi mới tới các công trình khác
+            num_farm = self.count_type(worldmap, "farm")
+            num_home = self.count_type(worldmap, "home")
+            required_farm = max(1, population // 2)
+            required_home = max(1, math.ceil(population / HOUSE_CAPACITY))
+            # Ưu tiên farm, rồi home, rồi mới đến các công trình khác
+            if num_farm < required_farm:
+                build = "farm"
+            elif num_home < required_home:
+                build = "home"
+            else:
+                # TODO: phát triển các công trình tiếp theo (workshop, defense...)
+                return
+            cursor.pop("tiles", None)
+            cursor.pop("x", None)
+            cursor["phase"], cursor["build"] = "build", build
+        yield from self._build_slices(worldmap, members, cursor["build"], cursor)
+
+    def decide_action(self, worldmap, materials):
+        # Lập trọn một kế hoạch ngay (không chia lát)
+        for _ in self._plan_slices(worldmap, materials): pass
+
+    def update(self, tick, worldmap, materials):
+        """
+        Gọi mỗi tick: lập kế hoạch lại theo evaluate_interval (hoặc ngay khi có
+        member rảnh), chia thành lát và chỉ chạy trong ngân sách của tick này,
+        phần còn lại chạy tiếp ở tick sau. Tiến độ collect/build vẫn cập nhật
+        mỗi tick.
+        """
+        cfg = self.cfg
+        if self._plan is None and (self._wake or self.last_eval_tick is None or tick - self.last_eval_tick >= cfg.evaluate_interval):
+            self._plan_cursor = {}
+            self._plan = self._plan_slices(worldmap, materials, self._plan_cursor)
+            self.last_eval_tick = tick
+            self._wake = False
+            self.stats["plans_started"] += 1
+        if self._plan is not None:
+            self._run_slices()
+        self.sync_build_queue(worldmap, materials)
+
+    def _run_slices(self):
+        cfg = self.cfg
+        units = 0
+        deadline = None if cfg.slice_work_units else time.perf_counter() + cfg.slice_budget_us / 1e6
+        for _ in self._plan:
+            units += 1
+            self.stats["slices"] += 1
+            if (units >= cfg.slice_work_units) if deadline is None else (time.perf_counter() >= deadline):
+                self.stats["suspended"] += 1
+                return
+        self._plan = None
+        self._plan_cursor = None
+        self.stats["plans_completed"] += 1
 
     def sync_build_queue(self, worldmap, materials):
-        for cmd in self.collect_queue[:]:
+        for cmd in list(self.collect_queue):
             member = cmd.get("member")
             tx, ty = cmd.get("x"), cmd.get("y")
             tile = worldmap.get_tile(tx, ty)
@@ -144,11 +249,12 @@ class SectLeaderAI:
                 self.collect_queue.remove(cmd)
                 continue
             if getattr(member, "state", "") == "collecting":
-                cmd["progress"] += 1
-                if tile.resource_amt == 0 or cmd["progress"] > 8:
+                if self.collect_queue.advance(cmd, worldmap.lod_turn(member)) > 8 or tile.resource_amt == 0:
                     member.state = "idle"
+                    worldmap.members_changed((member,))
+                    self._wake = True
                     self.collect_queue.remove(cmd)
-        for cmd in self.build_queue[:]:
+        for cmd in list(self.build_queue):
             member = cmd.get("member")
             tx, ty = cmd.get("x"), cmd.get("y")
             tile = worldmap.get_tile(tx, ty)
@@ -156,20 +262,21 @@ class SectLeaderAI:
                 self.build_queue.remove(cmd)
                 continue
             if getattr(member, "state", "") == "building":
-                cmd["progress"] += 1
-                if cmd["progress"] >= 60:
+                if self.build_queue.advance(cmd, worldmap.lod_turn(member)) >= 60:
                     worldmap.set_pending_build(tx, ty, False, "Xây xong")
                     if cmd["type"] == "farm":
                         tile.type = "farm"
                     elif cmd["type"] == "home":
                         tile.type = "home"
                     member.state = "idle"
+                    worldmap.members_changed((member,))
+                    self._wake = True
                     self.build_queue.remove(cmd)
                     self.ml_record_reward(member, f"build_{cmd['type']}", (tx, ty), reward=1.0)
 
     def ml_record_state_action(self, member, action, target):
         state = self._ml_get_state_snapshot()
-        self.ml_history.append({
+        self._ml_record({
             "t": "state_action",
             "member_id": member.id,
             "action": action,
@@ -178,7 +285,7 @@ class SectLeaderAI:
         })
 
     def ml_record_reward(self, member, action, target, reward):
-        self.ml_history.append({
+        self._ml_record({
             "t": "reward",
             "member_id": member.id,
             "action": action,
@@ -186,6 +293,11 @@ class SectLeaderAI:
             "reward": reward
         })
 
+    def _ml_record(self, rec):
+        self.ml_history.append(rec)
+        if self.ml_sink is not None:
+            self.ml_sink.record(rec)
+
     def _ml_get_state_snapshot(self):
         return {
             "members_alive": sum(1 for m in self.sect.members.values() if m.alive),
@@ -0,0 +1,160 @@
+import argparse
+import os
+import time
+from collections import Counter
+
+from core.entities import Role, Division
+from core.sect_manager import SectManager
+from core.sect_leader_ai import SectLeaderAI
+from core.worldmap import WorldMap
+from core.ecology import ResourceEcology
+from core.rng import seed_all
+
+# Có --seed mà không có --ai-work-units: ngân sách AI tính theo lát việc thay vì đồng hồ để chạy lại ra đúng kết quả
+SEEDED_AI_WORK_UNITS = 8
+DEFAULT_SECT = "Vô Cực Môn"
+DEFAULT_FOUNDER = "Vô Cực Tông Chủ"
+DEFAULT_MEMBERS = [
+    ("A Nhị", Role.DISCIPLE, Division.WORKER),
+    ("A Tam", Role.DISCIPLE, Division.WORKER),
+    ("A Tứ", Role.DISCIPLE, Division.SCOUT),
+    ("A Ngũ", Role.DISCIPLE, Division.LOGISTICS),
+    ("A Đại", Role.DISCIPLE, Division.GUARD),
+]
+DEFAULT_MATERIALS = {"wood": 20, "stone": 20, "food": 10, "water": 10, "soil": 20}
+
+class Simulation:
+    """
+    Engine mô phỏng không phụ thuộc pygame: giữ sect, AI tông chủ, world,
+    ecology và kho vật liệu. Mỗi step() là một tick; GUI hay batch run đều
+    chỉ gọi step()/run() rồi đọc trạng thái ra.
+    """
+    def __init__(self, sect_name=DEFAULT_SECT, founder=DEFAULT_FOUNDER, members=DEFAULT_MEMBERS,
+                 materials=None, worldmap=None, lod_interval=1):
+        self.manager = SectManager()
+        self.sect = self.manager.create_sect(sect_name, founder)
+        self.leader_ai = SectLeaderAI(self.sect, self.sect.get_leader().id)
+        for name, role, division in members:
+            self.manager.add_member(sect_name, name, role, division, True)
+        self.worldmap = worldmap if worldmap is not None else WorldMap()
+        self.ecology = ResourceEcology(self.worldmap)
+        self.sect.add_member_listener(self.worldmap.remove_member)
+        self.materials = dict(DEFAULT_MATERIALS if materials is None else materials)
+        self.tick = 0
+        self.lod_interval = lod_interval
+        self.set_view(())
+
+    @classmethod
+    def from_state(cls, manager, sect, leader_ai, worldmap, ecology, materials, tick=0, lod_interval=1):
+        # Dựng Simulation từ các phần đã có sẵn (vd nạp từ file save) thay vì tạo sect mới
+        sim = cls.__new__(cls)
+        sim.manager, sim.sect, sim.leader_ai = manager, sect, leader_ai
+        sim.worldmap, sim.ecology = worldmap, ecology
+        sect.add_member_listener(worldmap.remove_member)
+        sim.materials = dict(materials)
+        sim.tick = tick
+        sim.lod_interval = lod_interval
+        sim.set_view(())
+        return sim
+
+    def set_view(self, rects, followed=None):
+        # Member trong rects hoặc đang được theo chạy chi tiết, còn lại theo lod_interval
+        self.worldmap.set_lod(rects, self.lod_interval, followed)
+
+    def alive_members(self):
+        return [m for m in self.sect.members.values() if m.alive]
+
+    def step(self):
+        wm, ai = self.worldmap, self.leader_ai
+        self.tick += 1
+        wm.tick = self.tick
+        # AI leader lập kế hoạch theo interval/ngân sách, cập nhật tiến độ collect/build
+        ai.update(self.tick, wm, self.materials)
+        # NPC di chuyển, collect, build, resource tăng đúng
+        alive = self.alive_members()
+        wm.member_move_tick(alive, ai.build_queue, ai.collect_queue, resources=self.materials)
+        wm.update_member_positions(alive)
+        self.ecology.step(self.tick)
+
+    def run(self, ticks):
+        for _ in range(ticks):
+            self.step()
+
+    def summary(self):
+        wm = self.worldmap
+        return {
+            "tick": self.tick,
+            "materials": dict(self.materials),
+            "buildings": {t: wm.count_type(t) for t in ("building", "farm", "home", "workshop")},
+            "members": dict(Counter(m.state for m in self.alive_members())),
+            "build_queue": len(self.leader_ai.build_queue),
+            "collect_queue": len(self.leader_ai.collect_queue),
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chạy mô phỏng Frost World không cần cửa sổ.")
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--ai-work-units", type=int, default=None,
+                        help=f"Ngân sách AI theo số lát việc mỗi tick thay vì thời gian (kết quả tất định; "
+                             f"mặc định {SEEDED_AI_WORK_UNITS} khi có --seed)")
+    parser.add_argument("--lod", type=int, default=1, help="Không có người xem: mọi member xử lý gộp mỗi N tick")
+    parser.add_argument("--load", default=None, help="Chạy tiếp từ file save (hoặc thư mục autosave) thay vì tạo sect mới")
+    parser.add_argument("--save", default=None, help="Ghi file save sau khi chạy xong")
+    parser.add_argument("--autosave", default=None, help="Thư mục autosave, checkpoint mỗi --autosave-interval tick")
+    parser.add_argument("--autosave-interval", type=int, default=300)
+    parser.add_argument("--trajectories", default=None, help="Thư mục ghi trajectory ML của AI tông chủ (JSONL nén)")
+    parser.add_argument("--check-resume", type=int, default=None, metavar="TICK",
+                        help="Lưu ở tick TICK, nạp lại, chạy tiếp tới --ticks và so với lần chạy thẳng")
+    args = parser.parse_args(argv)
+    if args.seed is not None:
+        seed_all(args.seed)
+    if args.load:
+        from core.savegame import load_simulation
+        from core.autosave import load_autosave
+        t0 = time.perf_counter()
+        sim = load_autosave(args.load) if os.path.isdir(args.load) else load_simulation(args.load)
+        print(f"Nạp {args.load} (tick {sim.tick}) trong {time.perf_counter() - t0:.3f}s")
+    else:
+        sim = Simulation(lod_interval=args.lod)
+    cfg = sim.leader_ai.cfg
+    if args.ai_work_units is not None:
+        cfg.slice_work_units = args.ai_work_units
+    elif args.seed is not None and cfg.slice_work_units is None:
+        cfg.slice_work_units = SEEDED_AI_WORK_UNITS
+    if args.check_resume is not None:
+        from core.savegame import check_resume
+        diff = check_resume(sim, args.check_resume, args.ticks)
+        print("resume khớp lần chạy thẳng" if not diff else "resume lệch: " + ", ".join(diff))
+        raise SystemExit(1 if diff else 0)
+    sink = None
+    if args.trajectories:
+        from core.trajectory import TrajectorySink
+        sink = sim.leader_ai.ml_sink = TrajectorySink(args.trajectories)
+    autosave = None
+    if args.autosave:
+        from core.autosave import AutoSaver
+        autosave = AutoSaver(sim, args.autosave, args.autosave_interval)
+    t0 = time.perf_counter()
+    if autosave is None:
+        sim.run(args.ticks)
+    else:
+        for _ in range(args.ticks):
+            sim.step()
+            autosave.maybe_checkpoint()
+    elapsed = time.perf_counter() - t0
+    print(f"{args.ticks} ticks trong {elapsed:.3f}s ({args.ticks / max(elapsed, 1e-9):.0f} ticks/s)")
+    for key, value in sim.summary().items():
+        print(f"{key}: {value}")
+    if sink is not None:
+        sink.close()
+        print("trajectories:", sink.stats)
+    if autosave is not None:
+        autosave.close()
+        print("autosave:", autosave.stats)
+    if args.save:
+        from core.savegame import save_simulation
+        save_simulation(sim, args.save)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from core.worldmap import RESOURCE_CODE, RESOURCE_NAMES, RESOURCE_NONE
+
+class StockIndex:
+    """
+    Chỉ mục tile còn tài nguyên theo lượng tồn (stock), mỗi loại tài nguyên
+    một dict stock -> tập (x,y). Quét bounds một lần lúc tạo, sau đó chỉ cập
+    nhật qua tile listener của WorldMap (cạn, mọc lại, đổi loại), nên truy
+    vấn top-K tile giàu nhất không phải quét lại cả map.
+    """
+    def __init__(self, worldmap, bounds=None):
+        self.worldmap = worldmap
+        self.bounds = bounds or (0, 0, worldmap.w - 1, worldmap.h - 1)
+        self._buckets = [dict() for _ in RESOURCE_NAMES]  # code: {stock: set((x,y))}
+        self._entry = {}  # (x,y): (code, stock) đang nằm trong chỉ mục
+        self.stats = {"updates": 0, "queries": 0}
+        x1, y1, x2, y2 = self.bounds
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                self._update(x, y)
+        worldmap.add_tile_listener(self.on_tiles_changed)
+
+    def contains(self, x, y):
+        x1, y1, x2, y2 = self.bounds
+        return x1 <= x <= x2 and y1 <= y <= y2
+
+    def _update(self, x, y):
+        block, i = self.worldmap._locate(x, y)
+        code, amt = block.resource[i], block.resource_amt[i]
+        new = (code, amt) if code != RESOURCE_NONE and amt > 0 else None
+        old = self._entry.get((x, y))
+        if old == new:
+            return
+        if old is not None:
+            bucket = self._buckets[old[0]]
+            cells = bucket[old[1]]
+            cells.discard((x, y))
+            if not cells:
+                del bucket[old[1]]
+        if new is None:
+            self._entry.pop((x, y), None)
+        else:
+            self._entry[(x, y)] = new
+            self._buckets[code].setdefault(amt, set()).add((x, y))
+
+    def on_tiles_changed(self, cells):
+        for x, y in cells:
+            if self.contains(x, y):
+                self._update(x, y)
+                self.stats["updates"] += 1
+
+    def stock(self, x, y):
+        entry = self._entry.get((x, y))
+        return entry[1] if entry else 0
+
+    def count(self, rtype=None):
+        if rtype is None:
+            return len(self._entry)
+        return sum(len(cells) for cells in self._buckets[RESOURCE_CODE[rtype]].values())
+
+    def top(self, k, rtype=None):
+        """
+        k tile giàu nhất (của rtype, hoặc mọi loại), dạng (stock, x, y, rtype),
+        stock giảm dần, hoà thì theo (x,y) để kết quả tất định.
+        """
+        self.stats["queries"] += 1
+        codes = range(len(RESOURCE_NAMES)) if rtype is None else (RESOURCE_CODE[rtype],)
+        stocks = sorted({(s, c) for c in codes for s in self._buckets[c]}, key=lambda sc: -sc[0])
+        result = []
+        i = 0
+        while i < len(stocks) and len(result) < k:
+            # Gộp mọi loại cùng stock rồi mới sắp theo toạ độ
+            s = stocks[i][0]
+            level = []
+            while i < len(stocks) and stocks[i][0] == s:
+                c = stocks[i][1]
+                level.extend((s, x, y, RESOURCE_NAMES[c]) for x, y in self._buckets[c][s])
+                i += 1
+            level.sort()
+            result.extend(level[:k - len(result)])
+        return result
+
+    def close(self):
+        self.worldmap.remove_tile_listener(self.on_tiles_changed)
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Iterable
 import heapq
 import itertools
 
@@ -9,41 +9,116 @@ class TaskQueue:
     Priority queue: priority thấp => ưu tiên cao.
     Task:
       id, type, priority, data, difficulty
+    Ngoài heap chung còn một heap riêng cho mỗi type. Xoá theo id là xoá lười
+    (chỉ bỏ khỏi _idx, entry cũ trong heap bị bỏ qua khi nổi lên đỉnh), nên
+    push/pop/remove đều O(log n) và count(type) là O(1).
     """
     def __init__(self):
         self._heap: List[tuple] = []
+        self._by_type: Dict[str, List[tuple]] = {}
         self._idx: Dict[int, Dict[str, Any]] = {}
+        self._type_counts: Dict[str, int] = {}
 
-    def push(self, task: Dict[str, Any]):
+    def push(self, task: Dict[str, Any]) -> int:
         if "priority" not in task:
             task["priority"] = 10
         if "difficulty" not in task:
             task["difficulty"] = 1.0
         tid = next(_task_counter)
         task["id"] = tid
-        heapq.heappush(self._heap, (task["priority"], tid, task))
+        entry = (task["priority"], tid, task)
+        heapq.heappush(self._heap, entry)
+        heapq.heappush(self._by_type.setdefault(task.get("type"), []), entry)
         self._idx[tid] = task
+        self._type_counts[task.get("type")] = self._type_counts.get(task.get("type"), 0) + 1
+        return tid
 
-    def pop(self) -> Optional[Dict[str, Any]]:
-        while self._heap:
-            _, tid, task = heapq.heappop(self._heap)
-            if tid in self._idx:
-                self._idx.pop(tid, None)
-                return task
-        return None
+    def push_many(self, tasks: Iterable[Dict[str, Any]]) -> List[int]:
+        return [self.push(t) for t in tasks]
+
+    def _top(self, heap: List[tuple]) -> Optional[Dict[str, Any]]:
+        # Bỏ entry đã xoá khỏi đỉnh heap
+        idx = self._idx
+        while heap and heap[0][1] not in idx:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def peek(self, task_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if task_type is None:
+            return self._top(self._heap)
+        heap = self._by_type.get(task_type)
+        return self._top(heap) if heap else None
+
+    def peek_many(self, n: int, task_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        # n task tốt nhất (không lấy ra): pop n entry còn sống (entry đã xoá gặp
+        # trên đường thì bỏ luôn) rồi đẩy lại, O((n + số entry cũ) log T)
+        heap = self._heap if task_type is None else self._by_type.get(task_type)
+        if not heap:
+            return []
+        idx = self._idx
+        live = []
+        while heap and len(live) < n:
+            entry = heapq.heappop(heap)
+            if entry[1] in idx:
+                live.append(entry)
+        for entry in live:
+            heapq.heappush(heap, entry)
+        return [e[2] for e in live]
+
+    def pop(self, task_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        task = self.peek(task_type)
+        if task is not None:
+            self.remove(task["id"])
+        return task
+
+    def pop_many(self, n: int, task_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        result = []
+        while len(result) < n:
+            task = self.pop(task_type)
+            if task is None:
+                break
+            result.append(task)
+        return result
+
+    def remove(self, tid: int) -> Optional[Dict[str, Any]]:
+        task = self._idx.pop(tid, None)
+        if task is None:
+            return None
+        ttype = task.get("type")
+        self._type_counts[ttype] -= 1
+        if not self._type_counts[ttype]:
+            del self._type_counts[ttype]
+            self._by_type.pop(ttype, None)
+        if len(self._heap) > 2 * len(self._idx) + 64:
+            self._compact()
+        return task
 
     def remove_where(self, predicate: Callable[[Dict[str,Any]], bool]):
-        new_heap = []
-        for (p, tid, task) in self._heap:
-            if predicate(task):
-                self._idx.pop(tid, None)
-            else:
-                new_heap.append((p, tid, task))
-        heapq.heapify(new_heap)
-        self._heap = new_heap
+        for tid in [tid for tid, task in self._idx.items() if predicate(task)]:
+            self.remove(tid)
+
+    def _compact(self):
+        # Quá nhiều entry đã xoá: dựng lại heap từ task còn sống
+        idx = self._idx
+        self._heap = [e for e in self._heap if e[1] in idx]
+        heapq.heapify(self._heap)
+        for ttype, heap in self._by_type.items():
+            heap[:] = [e for e in heap if e[1] in idx]
+            heapq.heapify(heap)
+
+    def get(self, tid: int) -> Optional[Dict[str, Any]]:
+        return self._idx.get(tid)
+
+    def count(self, task_type: Optional[str] = None) -> int:
+        if task_type is None:
+            return len(self._idx)
+        return self._type_counts.get(task_type, 0)
 
     def to_list(self) -> List[Dict[str, Any]]:
-        return [t for (_,_,t) in self._heap]
+        return [t for (_,tid,t) in self._heap if tid in self._idx]
+
+    def __contains__(self, tid: int) -> bool:
+        return tid in self._idx
 
     def __len__(self):
-        return len(self._idx)
\ No newline at end of file
+        return len(self._idx)
@@ -1,4 +1,4 @@
-import random
+from core.rng import get_rng
 from core.utils import load_json
 
 class TraitManager:
@@ -8,7 +8,7 @@ class TraitManager:
         self.trait_keys = list(self.traits_data.keys())
 
     def random_traits(self):
-        return random.sample(self.trait_keys, 2)
+        return get_rng("traits").sample(self.trait_keys, 2)
 
     def reload(self):
         self.traits_data = load_json(self.json_path)
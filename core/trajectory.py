@@ -0,0 +1,148 @@
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+
+CHUNK_NAME = "{prefix}-{seq:06d}.jsonl.gz"
+
+class TrajectorySink:
+    """
+    Ghi record trajectory ML (state/action/reward của SectLeaderAI) ra các
+    file JSONL nén gzip, mỗi file tối đa chunk_records dòng. record() chỉ
+    append vào buffer; đủ batch_records thì cả batch được giao cho thread nền
+    mã hoá và ghi. Hàng batch chờ ghi có giới hạn: thread ghi không theo kịp
+    thì batch mới bị bỏ (đếm trong stats["dropped"]) chứ tick không phải chờ,
+    nên bộ nhớ giữ phẳng dù chạy bao lâu. Chunk đang ghi dở mang đuôi .tmp,
+    chỉ đổi tên khi đã đóng nên reader không bao giờ đọc phải file dở; ghi
+    lỗi thì chunk dở bị xoá và record trong đó tính vào dropped. "written"
+    đếm record nằm trong các chunk đã đóng.
+    """
+    def __init__(self, directory="saves/trajectories", prefix="traj", chunk_records=50000,
+                 batch_records=1024, max_pending=8, compresslevel=6):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.chunk_records = chunk_records
+        self.batch_records = batch_records
+        self.compresslevel = compresslevel
+        self.last_error = None
+        self.stats = {"records": 0, "written": 0, "dropped": 0, "chunks": 0, "errors": 0}
+        self._buf = []
+        self._dropped_lock = threading.Lock()  # "dropped" được cộng từ cả thread tick lẫn thread ghi
+        self._batch_left = 0  # record của batch đang ghi chưa vào file
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        self._seq = max(_chunk_seqs(directory, prefix), default=0)
+        self._file = None
+        self._file_path = None
+        self._file_records = 0
+        self._jobs = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._writer, name="trajectory", daemon=True)
+        self._thread.start()
+
+    def record(self, rec):
+        # rec không được sửa sau khi đã giao cho sink
+        buf = self._buf
+        buf.append(rec)
+        self.stats["records"] += 1
+        if len(buf) >= self.batch_records:
+            self._hand_off()
+
+    def _hand_off(self):
+        batch, self._buf = self._buf, []
+        try:
+            self._jobs.put_nowait(batch)
+        except queue.Full:
+            self._drop(len(batch))
+
+    def _drop(self, n):
+        with self._dropped_lock:
+            self.stats["dropped"] += n
+
+    def _writer(self):
+        while True:
+            batch = self._jobs.get()
+            try:
+                if batch is None:
+                    self._close_chunk()
+                else:
+                    self._write(batch)
+            except OSError as e:
+                self._abort_chunk(e)
+            finally:
+                self._jobs.task_done()
+            if batch is None:
+                return
+
+    def _write(self, batch):
+        encode = self._encoder.encode
+        start = 0
+        self._batch_left = len(batch)
+        while start < len(batch):
+            if self._file is None:
+                self._seq += 1
+                self._file_path = os.path.join(self.directory, CHUNK_NAME.format(prefix=self.prefix, seq=self._seq))
+                self._file = gzip.open(self._file_path + ".tmp", "wt", encoding="utf-8", compresslevel=self.compresslevel)
+                self._file_records = 0
+            part = batch[start:start + self.chunk_records - self._file_records]
+            self._file.write("\n".join(map(encode, part)) + "\n")
+            self._file_records += len(part)
+            start += len(part)
+            self._batch_left = len(batch) - start
+            if self._file_records >= self.chunk_records:
+                self._close_chunk()
+
+    def _close_chunk(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._file_path + ".tmp", self._file_path)
+        self._file = None
+        self.stats["written"] += self._file_records
+        self._file_records = 0
+        self.stats["chunks"] += 1
+
+    def _abort_chunk(self, error):
+        # Chunk dở không dùng được nữa: đóng handle, xoá .tmp, record trong đó và phần batch còn lại coi như bỏ
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            try:
+                os.remove(self._file_path + ".tmp")
+            except OSError:
+                pass
+            self._file = None
+        self.last_error = error
+        self.stats["errors"] += 1
+        self._drop(self._file_records + self._batch_left)
+        self._file_records = 0
+        self._batch_left = 0
+
+    def flush(self):
+        # Giao phần còn trong buffer (chờ chỗ trong hàng, không bỏ) rồi chờ ghi xong
+        if self._buf:
+            batch, self._buf = self._buf, []
+            self._jobs.put(batch)
+        self._jobs.join()
+
+    def close(self):
+        self.flush()
+        self._jobs.put(None)
+        self._thread.join()
+
+def _chunk_seqs(directory, prefix):
+    pattern = re.compile(re.escape(prefix) + r"-(\d{6})\.jsonl\.gz$")
+    if not os.path.isdir(directory):
+        return []
+    return [int(m.group(1)) for m in map(pattern.match, os.listdir(directory)) if m]
+
+def read_trajectories(directory="saves/trajectories", prefix="traj"):
+    """Đọc lần lượt mọi record của các chunk đã đóng, theo thứ tự ghi, không nạp cả file vào bộ nhớ."""
+    for seq in sorted(_chunk_seqs(directory, prefix)):
+        path = os.path.join(directory, CHUNK_NAME.format(prefix=prefix, seq=seq))
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
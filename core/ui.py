@@ -58,7 +58,7 @@ class UIManager:
             gy = self.worldmap.view_y + (my-oy)//16
             tile = self.worldmap.get_tile(gx, gy)
             if tile:
-                npclist = [n for n in tile.occupants]
+                npclist = self.worldmap.members_at(gx, gy)
                 txt = f"Tile ({gx},{gy}) [{tile.type}]\n"
                 if tile.type == "building":
                     txt += f"Công trình: {getattr(tile,'building_name','Chưa rõ')}\n"
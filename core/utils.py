@@ -1,5 +1,12 @@
 import json
+import os
+
+from core.data_bundle import DATA_DIR, get_bundle
 
 def load_json(path):
+    # File trong data/ đi qua bundle đã biên dịch (parse một lần, cache trong process)
+    folder, name = os.path.split(os.path.abspath(path))
+    if folder == DATA_DIR and name.endswith(".json"):
+        return get_bundle(folder).table(name)
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
\ No newline at end of file
+        return json.load(f)
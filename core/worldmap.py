@@ -1,5 +1,9 @@
-import pygame
 import random
+from array import array
+from bisect import bisect_right
+from core.chunks import ChunkStore
+from core.rng import BufferedStream, get_registry, get_rng
+from core.pathfinding import PathFinder, FlowField
 
 MAP_W, MAP_H, TILE_SIZE = 64, 58, 16
 RESOURCE_TYPES = [
@@ -26,48 +30,252 @@ RESOURCE_INIT = {
     "none": 0,
 }
 
+TILE_NAMES = [name for name, _ in TILE_TYPES]
+TILE_CODE = {name: i for i, name in enumerate(TILE_NAMES)}
+RESOURCE_NAMES = [name for name, _ in RESOURCE_TYPES]
+RESOURCE_CODE = {name: i for i, name in enumerate(RESOURCE_NAMES)}
+RESOURCE_NONE = RESOURCE_CODE["none"]
+IMPASSABLE_TYPES = ("river", "danger", "dungeon")
+IMPASSABLE_CODES = frozenset(TILE_CODE[t] for t in IMPASSABLE_TYPES)
+UNINDEXED_TYPES = ("field",)  # loại phủ gần hết map, chỉ đếm chứ không giữ tập toạ độ
+
+# Ngưỡng xác suất tích luỹ của từng loại tài nguyên khi sinh tile, phần còn lại là "none"
+RESOURCE_ROLL = ((0.13, "wood"), (0.22, "stone"), (0.27, "water"), (0.40, "soil"))
+_ROLL_EDGES = [edge for edge, _ in RESOURCE_ROLL]
+_ROLL_NAMES = [name for _, name in RESOURCE_ROLL] + ["none"]
+
+def gen_resource(rng=None):
+    r = (rng or get_rng("worldgen")).random()
+    return _ROLL_NAMES[bisect_right(_ROLL_EDGES, r)]
+
+class TileBlock:
+    """
+    Lưu tile dạng struct-of-arrays: mỗi thuộc tính là một mảng kiểu cố định,
+    tile thứ i nằm ở vị trí i của mọi mảng.
+    """
+    __slots__ = ("size", "tile_type", "zone", "resource", "resource_amt", "pending", "building_id", "passable", "origin", "dirty")
+    FIELD_TYPES = ("B", "B", "B", "H", "B", "H", "B", "B")  # kiểu phần tử của fields(), cùng thứ tự
+
+    def __init__(self, size):
+        self.size = size
+        self.tile_type = array("B", bytes(size))
+        self.zone = array("B", bytes(size))
+        self.resource = array("B", bytes([RESOURCE_NONE])) * size
+        self.resource_amt = array("H", [0]) * size
+        self.pending = bytearray(size)
+        self.building_id = array("H", [0]) * size  # 0 = không có công trình
+        self.passable = bytearray(size)  # suy ra từ tile_type + pending
+        self.origin = array("B", bytes([RESOURCE_NONE])) * size  # tài nguyên lúc sinh, để mọc lại
+        self.dirty = False  # đã sửa sau khi sinh/nạp, cần ghi lại khi evict
+
+    def fields(self):
+        return (self.tile_type, self.zone, self.resource, self.resource_amt, self.pending, self.building_id, self.passable, self.origin)
+
+    def to_bytes(self):
+        return b"".join(bytes(a) for a in self.fields())
+
+    @classmethod
+    def from_views(cls, size, views):
+        # Dùng thẳng các memoryview (vd trỏ vào mmap của file save) làm mảng, không copy
+        block = cls.__new__(cls)
+        block.size = size
+        (block.tile_type, block.zone, block.resource, block.resource_amt, block.pending,
+         block.building_id, block.passable, block.origin) = views
+        block.dirty = False
+        return block
+
+    @classmethod
+    def from_bytes(cls, size, data):
+        block = cls(size)
+        offset = 0
+        for a in block.fields():
+            view = memoryview(a).cast("B")
+            view[:] = data[offset:offset + view.nbytes]
+            offset += view.nbytes
+        return block
+
 class Tile:
-    def __init__(self, x, y, ttype="field"):
+    """
+    View nhẹ trỏ vào một ô của TileBlock, giữ API cũ cho code gọi tới. Ở world
+    chunk, chunk của view có thể bị evict trong lúc view còn được giữ, nên mỗi
+    lần đọc/ghi đi qua _live() để lấy lại block đang nạp của ô.
+    """
+    __slots__ = ("x", "y", "_map", "_block", "_i")
+
+    def __init__(self, worldmap, block, i, x, y):
+        self._map = worldmap
+        self._block = block
+        self._i = i
         self.x, self.y = x, y
-        self.type = ttype
-        self.occupants = []
-        self.zone = ttype
-        self.pending_build = False
-        self.building_name = None
-        self.resource = self.gen_resource()
-        self.resource_amt = RESOURCE_INIT[self.resource]
-
-    def gen_resource(self):
-        r = random.random()
-        if r < 0.13: return "wood"
-        if r < 0.22: return "stone"
-        if r < 0.27: return "water"
-        if r < 0.40: return "soil"
-        return "none"
+
+    def _live(self):
+        chunks = self._map.chunks
+        if chunks is not None and not chunks.holds(self.x, self.y, self._block):
+            self._block, self._i = chunks.locate(self.x, self.y)
+        return self._block
+
+    @property
+    def type(self):
+        return TILE_NAMES[self._live().tile_type[self._i]]
+
+    @type.setter
+    def type(self, value):
+        self._map._set_type(self._live(), self._i, self.x, self.y, TILE_CODE[value])
+
+    @property
+    def zone(self):
+        return TILE_NAMES[self._live().zone[self._i]]
+
+    @property
+    def resource(self):
+        return RESOURCE_NAMES[self._live().resource[self._i]]
+
+    @resource.setter
+    def resource(self, value):
+        block = self._live()
+        block.resource[self._i] = RESOURCE_CODE[value]
+        block.dirty = True
+        self._map._resource_changed(self.x, self.y)
+
+    @property
+    def resource_amt(self):
+        return self._live().resource_amt[self._i]
+
+    @resource_amt.setter
+    def resource_amt(self, value):
+        block = self._live()
+        block.resource_amt[self._i] = value
+        block.dirty = True
+        self._map._resource_changed(self.x, self.y)
+
+    @property
+    def pending_build(self):
+        return bool(self._live().pending[self._i])
+
+    @pending_build.setter
+    def pending_build(self, value):
+        self._map._set_pending(self._live(), self._i, self.x, self.y, value)
+
+    @property
+    def building_name(self):
+        return self._map.building_names[self._live().building_id[self._i]]
+
+    @building_name.setter
+    def building_name(self, value):
+        block = self._live()
+        block.building_id[self._i] = self._map.intern_building(value)
+        block.dirty = True
+
+    @property
+    def occupants(self):
+        return self._map.members_at(self.x, self.y)
 
     def is_passable(self):
-        return self.type not in ["river", "danger", "dungeon"] and not self.pending_build
+        return bool(self._live().passable[self._i])
 
     def is_resource(self):
-        return self.resource != "none" and self.resource_amt > 0
+        block = self._live()
+        return block.resource[self._i] != RESOURCE_NONE and block.resource_amt[self._i] > 0
 
     def deplete_resource(self, amt):
-        self.resource_amt = max(0, self.resource_amt - amt)
-        if self.resource_amt == 0:
-            self.type = "field"
-            self.resource = "none"
+        self._map._deplete(self._live(), self._i, self.x, self.y, amt)
 
 class WorldMap:
-    def __init__(self):
-        self.w, self.h = MAP_W, MAP_H
-        self.tiles = [[Tile(x, y, self.gen_tiletype(x, y)) for y in range(self.h)] for x in range(self.w)]
+    def __init__(self, w=MAP_W, h=MAP_H, chunked=False, chunk_size=32, seed=None, max_resident_chunks=256, cache_dir=None,
+                 grid=None, building_names=None):
+        self.w, self.h = w, h
+        self.building_names = list(building_names or [None])
+        self._building_ids = {name: bid for bid, name in enumerate(self.building_names)}
+        self.occupants = {}  # (x,y): {member key: member}
+        self._member_cell = {}  # member key: (x,y) đang ghi trong occupants
+        self.type_counts = [0] * len(TILE_NAMES)
+        self.type_positions = {code: set() for code in range(len(TILE_NAMES)) if TILE_NAMES[code] not in UNINDEXED_TYPES}
+        if chunked:
+            # Chế độ chunk: không sinh gì lúc khởi tạo, chunk được sinh khi chạm tới
+            self.grid = None
+            seed = get_rng("worldgen").getrandbits(32) if seed is None else seed
+            self.chunks = ChunkStore(self, chunk_size, seed, max_resident_chunks, cache_dir)
+        elif grid is not None:
+            # Tile có sẵn (vd nạp từ file save): không sinh, chỉ dựng lại bộ đếm theo type
+            self.grid = grid
+            self.chunks = None
+            self._rebuild_type_index()
+        else:
+            self.grid = TileBlock(self.w * self.h)
+            self.chunks = None
+            rng = get_registry().buffered("worldgen") if seed is None else random.Random(seed)
+            self._generate(self.grid, 0, 0, self.w, self.h, self.h, rng)
+        self.passability_version = 0
+        self.pathfinder = PathFinder(self)
+        self.flow_fields = {}  # region (x1,y1,x2,y2): FlowField
+        self.region_score = None  # ResourceSAT, tạo khi cần
+        self.stock_index = None  # StockIndex, tạo khi cần
+        self.index_bounds = None  # (x1,y1,x2,y2): vùng lập chỉ mục SAT/stock của world chunk, None = quanh view
+        self.map_layers = {}  # tile_size: MapLayer, tạo khi render lần đầu
+        self.tile_listeners = []  # fn(cells): nhận list (x,y) vừa đổi trạng thái
+        self.member_listeners = []  # fn(members): nhận list member vừa đổi vị trí/trạng thái
+        self.tick = 0  # tick mô phỏng hiện tại, để member ghi lại lúc di chuyển
+        self.lod_interval = 1  # >1: member ngoài vùng nhìn chỉ được xử lý mỗi lod_interval tick, gộp nhiều tick một lần
+        self.lod_rects = ()  # các vùng (x1,y1,x2,y2) luôn mô phỏng chi tiết
+        self.lod_followed = None  # member key đang được camera theo, luôn chi tiết
+        self._lod_seq = 0
         self.view_x = 0
         self.view_y = 0
         self.view_w = 32
         self.view_h = 34
 
+    def _generate(self, block, x0, y0, w, h, stride, rng, count=True):
+        counts, positions = self.type_counts, self.type_positions
+        # Rút số ngẫu nhiên cả cột một lần; thứ tự rút giống hệt rút từng tile
+        rolls_src = rng if isinstance(rng, BufferedStream) else BufferedStream(rng, h)
+        for x in range(x0, x0 + w):
+            rolls = rolls_src.take(h)
+            for y in range(y0, y0 + h):
+                i = (x - x0) * stride + (y - y0)
+                code = TILE_CODE[self.gen_tiletype(x, y)]
+                res = _ROLL_NAMES[bisect_right(_ROLL_EDGES, rolls[y - y0])]
+                block.tile_type[i] = code
+                block.zone[i] = code
+                block.resource[i] = RESOURCE_CODE[res]
+                block.origin[i] = RESOURCE_CODE[res]
+                block.resource_amt[i] = RESOURCE_INIT[res]
+                block.passable[i] = code not in IMPASSABLE_CODES
+                if count:
+                    counts[code] += 1
+                    if code in positions:
+                        positions[code].add((x, y))
+
+    def close(self):
+        # Giải phóng chunk store (xoá thư mục cache tự tạo); map thường không có gì để đóng
+        if self.chunks is not None:
+            self.chunks.close()
+
+    def _rebuild_type_index(self):
+        types = bytes(self.grid.tile_type)
+        h = self.h
+        for code in range(len(TILE_NAMES)):
+            self.type_counts[code] = types.count(code)
+            if code in self.type_positions:
+                cells = self.type_positions[code]
+                cells.clear()
+                i = types.find(code)
+                while i >= 0:
+                    cells.add((i // h, i % h))
+                    i = types.find(code, i + 1)
+
+    def _new_chunk(self, cx, cy, rng, first=True):
+        # Chunk sinh lại sau khi bị bỏ (chưa sửa) giống hệt lần đầu nên không đếm lại
+        cs = self.chunks.chunk_size
+        block = TileBlock(cs * cs)
+        x0, y0 = cx * cs, cy * cs
+        self._generate(block, x0, y0, min(cs, self.w - x0), min(cs, self.h - y0), cs, rng, count=first)
+        return block
+
+    def _block_from_bytes(self, size, data):
+        return TileBlock.from_bytes(size, data)
+
     def gen_tiletype(self, x, y):
-        cx, cy = MAP_W//2, MAP_H//2
+        cx, cy = self.w//2, self.h//2
         if abs(x-cx)<3 and abs(y-cy)<2:
             return "village"
         elif (x in [0, self.w-1] or y in [0, self.h-1]):
@@ -81,121 +289,423 @@ class WorldMap:
         else:
             return "field"
 
+    def index(self, x, y):
+        return x * self.h + y
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.w and 0 <= y < self.h
+
+    def _locate(self, x, y):
+        if self.chunks is None:
+            return self.grid, x * self.h + y
+        return self.chunks.locate(x, y)
+
     def get_tile(self, x, y):
         if 0 <= x < self.w and 0 <= y < self.h:
-            return self.tiles[x][y]
+            block, i = self._locate(x, y)
+            return Tile(self, block, i, x, y)
         return None
 
+    def is_passable(self, x, y):
+        if 0 <= x < self.w and 0 <= y < self.h:
+            if self.chunks is None:
+                return bool(self.grid.passable[x * self.h + y])
+            block, i = self.chunks.locate(x, y)
+            return bool(block.passable[i])
+        return False
+
+    def intern_building(self, name):
+        bid = self._building_ids.get(name)
+        if bid is None:
+            bid = len(self.building_names)
+            self.building_names.append(name)
+            self._building_ids[name] = bid
+        return bid
+
+    # Mọi thay đổi tile đi qua các hàm dưới để passable và path cache luôn đồng bộ
+    def _set_type(self, block, i, x, y, code):
+        old = block.tile_type[i]
+        if old != code:
+            self.type_counts[old] -= 1
+            self.type_counts[code] += 1
+            if old in self.type_positions:
+                self.type_positions[old].discard((x, y))
+            if code in self.type_positions:
+                self.type_positions[code].add((x, y))
+        block.tile_type[i] = code
+        block.dirty = True
+        self._update_passable(block, i, x, y)
+        if old != code:
+            self._tile_changed(x, y)
+
+    def _set_pending(self, block, i, x, y, val):
+        block.pending[i] = 1 if val else 0
+        block.dirty = True
+        self._update_passable(block, i, x, y)
+        self._tile_changed(x, y)
+
+    def count_type(self, ttype):
+        code = TILE_CODE.get(ttype)
+        return 0 if code is None else self.type_counts[code]
+
+    def positions_of_type(self, ttype):
+        # Tập toạ độ được cập nhật tại chỗ, không sửa trong lúc duyệt
+        code = TILE_CODE.get(ttype)
+        if code is None:
+            return set()
+        if code in self.type_positions:
+            return self.type_positions[code]
+        return {(x, y) for x in range(self.w) for y in range(self.h) if self.get_tile(x, y).type == ttype}
+
+    def _update_passable(self, block, i, x, y):
+        passable = block.tile_type[i] not in IMPASSABLE_CODES and not block.pending[i]
+        if passable != block.passable[i]:
+            block.passable[i] = passable
+            self.passability_version += 1
+            self.pathfinder.on_passability_change(x, y)
+            for field in self.flow_fields.values():
+                field.on_passability_change(x, y)
+
+    def _deplete(self, block, i, x, y, amt):
+        # Đổi type kéo theo sửa path/flow field và listener, có thể nạp chunk khác:
+        # pin chunk của ô để block vẫn là chunk đang nạp khi ghi resource sau đó
+        pin = self.chunks.pin(x, y) if self.chunks is not None else None
+        try:
+            had_stock = block.resource_amt[i] > 0
+            block.resource_amt[i] = max(0, block.resource_amt[i] - amt)
+            block.dirty = True
+            if block.resource_amt[i] == 0:
+                self._set_type(block, i, x, y, TILE_CODE["field"])
+                block.resource[i] = RESOURCE_NONE
+                if had_stock:
+                    self._resource_changed(x, y)
+                    return
+            self._tile_changed(x, y)
+        finally:
+            if pin is not None:
+                self.chunks.unpin(pin)
+
+    def _resource_changed(self, x, y):
+        # Tile đổi loại tài nguyên hoặc hết/có lại hàng
+        if self.region_score is not None:
+            self.region_score.mark_dirty(x, y)
+        self._tile_changed(x, y)
+
+    def _tile_changed(self, x, y):
+        for layer in self.map_layers.values():
+            layer.mark_dirty(x, y)
+        for fn in self.tile_listeners:
+            fn(((x, y),))
+
+    def tiles_changed(self, cells, resource=True):
+        # Báo một lô tile đã bị sửa trực tiếp trên mảng (vd bước mọc lại tài nguyên)
+        if resource and self.region_score is not None:
+            for x, y in cells:
+                self.region_score.mark_dirty(x, y)
+        for layer in self.map_layers.values():
+            for x, y in cells:
+                layer.mark_dirty(x, y)
+        for fn in self.tile_listeners:
+            fn(cells)
+
+    def add_tile_listener(self, fn):
+        self.tile_listeners.append(fn)
+
+    def remove_tile_listener(self, fn):
+        if fn in self.tile_listeners:
+            self.tile_listeners.remove(fn)
+
+    def members_changed(self, members):
+        # Báo member đã đổi vị trí/trạng thái/lệnh (vd AI giao việc, member xong việc)
+        for fn in self.member_listeners:
+            fn(members)
+
+    def add_member_listener(self, fn):
+        self.member_listeners.append(fn)
+
+    def remove_member_listener(self, fn):
+        if fn in self.member_listeners:
+            self.member_listeners.remove(fn)
+
+    def _index_bounds(self):
+        if self.chunks is None:
+            return None
+        if self.index_bounds is not None:
+            return self.index_bounds
+        # World chunk quá lớn để lập chỉ mục toàn map: chỉ lấy vùng quanh view
+        margin = 4 * self.chunks.chunk_size
+        return (max(0, self.view_x - margin), max(0, self.view_y - margin),
+                min(self.w - 1, self.view_x + self.view_w + margin), min(self.h - 1, self.view_y + self.view_h + margin))
+
+    def get_region_score(self):
+        if self.region_score is None:
+            from core.region_score import ResourceSAT
+            self.region_score = ResourceSAT(self, self._index_bounds())
+        return self.region_score
+
+    def get_stock_index(self):
+        if self.stock_index is None:
+            from core.stock_index import StockIndex
+            self.stock_index = StockIndex(self, self._index_bounds())
+        return self.stock_index
+
+    def deplete_resource(self, x, y, amt):
+        if self.in_bounds(x, y):
+            block, i = self._locate(x, y)
+            self._deplete(block, i, x, y, amt)
+
+    @staticmethod
+    def _member_key(m):
+        return getattr(m, "id", None) or id(m)
+
+    def _remove_occupant(self, key):
+        cell = self._member_cell.pop(key, None)
+        if cell is None:
+            return
+        bucket = self.occupants.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self.occupants[cell]
+
+    def place_member(self, m):
+        # Cập nhật index cho một member, chỉ tốn O(1) khi vị trí không đổi
+        key = self._member_key(m)
+        if not getattr(m, "alive", True):
+            self._remove_occupant(key)
+            return
+        x, y = int(getattr(m, "x", 0)), int(getattr(m, "y", 0))
+        cell = (x, y) if 0 <= x < self.w and 0 <= y < self.h else None
+        old = self._member_cell.get(key)
+        if old == cell:
+            return
+        self._remove_occupant(key)
+        if cell is not None:
+            self.occupants.setdefault(cell, {})[key] = m
+            self._member_cell[key] = cell
+
+    def remove_member(self, m):
+        # Member chết/rời sect: bỏ khỏi occupancy và path cache
+        self._remove_occupant(self._member_key(m))
+        self.pathfinder.forget(m)
+        self.members_changed((m,))
+
+    def move_member(self, m, nx, ny):
+        # Giữ vị trí cũ và tick di chuyển để render nội suy giữa hai tick
+        m.prev_x, m.prev_y = int(m.x), int(m.y)
+        m.moved_tick = self.tick
+        m.x, m.y = nx, ny
+        self.place_member(m)
+        self.members_changed((m,))
+
     def update_member_positions(self, members):
-        for col in self.tiles:
-            for tile in col:
-                tile.occupants = []
+        # Chỉ đối soát member (chết, bị dịch chuyển ngoài smart_move), không quét map
         for m in members:
-            if not getattr(m, "alive", True): continue
-            x, y = int(getattr(m, "x", 0)), int(getattr(m, "y", 0))
-            if 0 <= x < self.w and 0 <= y < self.h:
-                tile = self.get_tile(x, y)
-                if tile:
-                    tile.occupants.append(m)
+            self.place_member(m)
+
+    def members_at(self, x, y):
+        bucket = self.occupants.get((x, y))
+        return list(bucket.values()) if bucket else []
 
-    def member_move_tick(self, members, build_queue, collect_queue, resources=None):
+    def members_in_rect(self, x1, y1, x2, y2):
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(self.w - 1, x2), min(self.h - 1, y2)
+        if x2 < x1 or y2 < y1:
+            return []
+        result = []
+        if (x2 - x1 + 1) * (y2 - y1 + 1) <= len(self.occupants):
+            for x in range(x1, x2 + 1):
+                for y in range(y1, y2 + 1):
+                    bucket = self.occupants.get((x, y))
+                    if bucket:
+                        result.extend(bucket.values())
+        else:
+            for (x, y), bucket in self.occupants.items():
+                if x1 <= x <= x2 and y1 <= y <= y2:
+                    result.extend(bucket.values())
+        return result
+
+    def set_lod(self, rects=(), interval=1, followed=None):
+        self.lod_rects = tuple(rects)
+        self.lod_interval = max(1, int(interval))
+        self.lod_followed = None if followed is None else self._member_key(followed)
+
+    def lod_turn(self, m):
+        """
+        Số tick cần mô phỏng cho member ở tick này: 1 = chi tiết như thường,
+        0 = chưa tới lượt, lod_interval = tới lượt, xử lý gộp cả quãng.
+        Mỗi member có pha riêng để lượt gộp rải đều qua các tick.
+        """
+        n = self.lod_interval
+        if n <= 1 or (self.lod_followed is not None and self._member_key(m) == self.lod_followed):
+            return 1
+        x, y = int(m.x), int(m.y)
+        for x1, y1, x2, y2 in self.lod_rects:
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                return 1
+        phase = getattr(m, "_lod_phase", None)
+        if phase is None:
+            phase = m._lod_phase = self._lod_seq
+            self._lod_seq += 1
+            self.members_changed((m,))
+        return n if (self.tick + phase) % n == 0 else 0
+
+    def member_move_tick(self, members, build_queue, collect_queue, resources=None, bounds=None):
+        # bounds (x1,y1,x2,y2): member chỉ tìm đường trong vùng này (vd vùng của sect), None = cả map
+        changed = []
         for m in members:
             if not getattr(m, "alive", True): continue
-            # Clamp vị trí trong map
-            m.x = max(0, min(self.w - 1, int(m.x)))
-            m.y = max(0, min(self.h - 1, int(m.y)))
-            m._stuck_count = getattr(m, "_stuck_count", 0)
-            # Collect task (ưu tiên)
-            cmd = next((cmd for cmd in collect_queue if cmd.get("member") == m), None)
-            if cmd:
-                tx, ty = cmd["x"], cmd["y"]
-                reached = (m.x, m.y) == (tx, ty)
-                moved = self.smart_move(m, tx, ty)
-                if reached:
-                    tile = self.get_tile(tx, ty)
-                    if tile and tile.is_resource():
-                        # Tăng resource tổng khi thu thập
-                        if resources is not None and tile.resource in resources:
-                            resources[tile.resource] += 1
-                        tile.deplete_resource(1)
-                        m.state = "collecting"
-                        cmd["progress"] += 1
-                        m._stuck_count = 0
-                        if tile.resource_amt == 0 or cmd["progress"] > 8:
-                            m.state = "idle"
-                            collect_queue.remove(cmd)
-                    else:
-                        m.state = "idle"
-                        collect_queue.remove(cmd)
-                elif moved:
-                    m.state = "moving"
+            n = self.lod_turn(m)
+            if n == 0: continue
+            before = (m.x, m.y, m.state, getattr(m, "_stuck_count", None))
+            self._member_step(m, n, build_queue, collect_queue, resources, bounds)
+            if (m.x, m.y, m.state, m._stuck_count) != before:
+                changed.append(m)
+        if changed:
+            self.members_changed(changed)
+
+    def _member_step(self, m, n, build_queue, collect_queue, resources, bounds):
+        if n == 1:
+            move = lambda m, tx, ty: self.smart_move(m, tx, ty, bounds)
+        else:
+            move = lambda m, tx, ty: self._coarse_move(m, tx, ty, n, bounds)
+        # Clamp vị trí trong map
+        m.x = max(0, min(self.w - 1, int(m.x)))
+        m.y = max(0, min(self.h - 1, int(m.y)))
+        m._stuck_count = getattr(m, "_stuck_count", 0)
+        # Collect task (ưu tiên)
+        cmd = collect_queue.for_member(m)
+        if cmd:
+            tx, ty = cmd["x"], cmd["y"]
+            reached = (m.x, m.y) == (tx, ty)
+            moved = move(m, tx, ty)
+            if reached:
+                tile = self.get_tile(tx, ty)
+                if tile and tile.is_resource():
+                    # Lượt gộp thu luôn sản lượng của cả quãng (không quá hàng còn lại)
+                    take = 1 if n == 1 else max(1, min(n, tile.resource_amt, 9 - cmd["progress"]))
+                    # Tăng resource tổng khi thu thập
+                    if resources is not None and tile.resource in resources:
+                        resources[tile.resource] += take
+                    tile.deplete_resource(take)
+                    m.state = "collecting"
+                    collect_queue.advance(cmd, take)
                     m._stuck_count = 0
-                else:
-                    m._stuck_count += 1
-                    # Nếu stuck quá 10 lần, huỷ task
-                    if m._stuck_count > 10:
+                    if tile.resource_amt == 0 or cmd["progress"] > 8:
                         m.state = "idle"
                         collect_queue.remove(cmd)
-                continue
-            # Build task
-            cmd = next((cmd for cmd in build_queue if cmd.get("member") == m), None)
-            if cmd and not cmd.get("pending_materials", False):
-                tx, ty = cmd["x"], cmd["y"]
-                reached = (m.x, m.y) == (tx, ty)
-                moved = self.smart_move(m, tx, ty)
-                if reached:
-                    m.state = "building"
-                    m._stuck_count = 0
-                elif moved:
-                    m.state = "moving"
-                    m._stuck_count = 0
                 else:
-                    m._stuck_count += 1
-                    if m._stuck_count > 10:
-                        m.state = "idle"
-                        build_queue.remove(cmd)
+                    m.state = "idle"
+                    collect_queue.remove(cmd)
+            elif moved:
+                m.state = "moving"
+                m._stuck_count = 0
             else:
-                m.state = "idle"
+                m._stuck_count += 1
+                # Nếu stuck quá 10 lần, huỷ task
+                if m._stuck_count > 10:
+                    m.state = "idle"
+                    collect_queue.remove(cmd)
+            return
+        # Build task
+        cmd = build_queue.for_member(m)
+        if cmd and not cmd.get("pending_materials", False):
+            tx, ty = cmd["x"], cmd["y"]
+            reached = (m.x, m.y) == (tx, ty)
+            moved = move(m, tx, ty)
+            if reached:
+                m.state = "building"
+                m._stuck_count = 0
+            elif moved:
+                m.state = "moving"
                 m._stuck_count = 0
+            else:
+                m._stuck_count += 1
+                if m._stuck_count > 10:
+                    m.state = "idle"
+                    build_queue.remove(cmd)
+        else:
+            m.state = "idle"
+            m._stuck_count = 0
 
-    def smart_move(self, m, tx, ty):
+    def flow_field(self, region, clip=None):
+        field = self.flow_fields.get(region)
+        if field is None:
+            field = FlowField(self, region, clip=clip)
+            self.flow_fields[region] = field
+        return field
+
+    def drop_flow_field(self, region):
+        self.flow_fields.pop(region, None)
+
+    def _next_move(self, m, tx, ty, bounds=None):
         # Defensive: clamp target trong map
         tx = max(0, min(self.w - 1, int(tx)))
         ty = max(0, min(self.h - 1, int(ty)))
-        dx = tx - m.x
-        dy = ty - m.y
-        step_x = 1 if dx > 0 else -1 if dx < 0 else 0
-        step_y = 1 if dy > 0 else -1 if dy < 0 else 0
-        options = []
-        if step_x != 0:
-            options.append((m.x + step_x, m.y))
-        if step_y != 0:
-            options.append((m.x, m.y + step_y))
-        if step_x != 0 and step_y != 0:
-            options.append((m.x + step_x, m.y + step_y))
-        options = [(x, y) for x, y in options if 0 <= x < self.w and 0 <= y < self.h]
-        for nx, ny in options:
-            tile = self.get_tile(nx, ny)
-            if tile and tile.is_passable():
-                m.x, m.y = nx, ny
-                return True
-        # fallback: random step in bound
-        for _ in range(4):
-            dx, dy = random.choice([-1,0,1]), random.choice([-1,0,1])
-            tx2, ty2 = max(0, min(self.w-1, m.x+dx)), max(0, min(self.h-1, m.y+dy))
-            t2 = self.get_tile(tx2, ty2)
-            if t2 and t2.is_passable():
-                m.x, m.y = tx2, ty2
-                return True
-        return False
+        mx, my = int(m.x), int(m.y)
+        if (mx, my) == (tx, ty):
+            return None
+        # Đích nằm trong region có flow field: đi theo field tới mép region, vào trong mới dùng A*
+        for field in self.flow_fields.values():
+            if field.contains(tx, ty):
+                if not field.contains(mx, my) and not self.pathfinder.has_path(m, tx, ty):
+                    step = field.next_step(mx, my)
+                    if step is not None:
+                        return step
+                break
+        return self.pathfinder.next_step(m, tx, ty, bounds)
+
+    def smart_move(self, m, tx, ty, bounds=None):
+        step = self._next_move(m, tx, ty, bounds)
+        if step is None:
+            return False
+        self.move_member(m, step[0], step[1])
+        return True
+
+    def _coarse_move(self, m, tx, ty, n, bounds=None):
+        # Đi liền tối đa n bước theo cùng đường field/A*, chỉ cập nhật occupancy một lần
+        sx, sy = int(m.x), int(m.y)
+        moved = False
+        for _ in range(n):
+            step = self._next_move(m, tx, ty, bounds)
+            if step is None:
+                break
+            m.x, m.y = step
+            moved = True
+        if moved:
+            x, y = m.x, m.y
+            m.x, m.y = sx, sy
+            self.move_member(m, x, y)
+        return moved
 
     def set_pending_build(self, x, y, val=True, building_name=None):
-        tile = self.get_tile(x, y)
-        if tile:
-            tile.pending_build = val
-            tile.building_name = building_name if val else None
-            if not val:
-                tile.type = "building"
+        if not self.in_bounds(x, y):
+            return
+        block, i = self._locate(x, y)
+        self._set_pending(block, i, x, y, val)
+        block.building_id[i] = self.intern_building(building_name if val else None)
+        if not val:
+            self._set_type(block, i, x, y, TILE_CODE["building"])
+
+    def tile_state(self, x, y):
+        # Trạng thái có thể đổi của tile, dạng tuple gọn để gửi giữa các process
+        block, i = self._locate(x, y)
+        return (block.tile_type[i], block.resource[i], block.resource_amt[i], block.pending[i],
+                self.building_names[block.building_id[i]])
+
+    def apply_tile_state(self, x, y, state):
+        # Ghi trạng thái nhận từ nơi khác qua các setter để chỉ mục, cache và listener đồng bộ
+        code, res, amt, pending, building_name = state
+        block, i = self._locate(x, y)
+        block.building_id[i] = self.intern_building(building_name)
+        if block.pending[i] != pending:
+            self._set_pending(block, i, x, y, pending)
+        self._set_type(block, i, x, y, code)
+        if block.resource[i] != res or block.resource_amt[i] != amt:
+            block.resource[i] = res
+            block.resource_amt[i] = amt
+            block.dirty = True
+            self._resource_changed(x, y)
 
     def get_tile_info(self, x, y):
         tile = self.get_tile(x, y)
@@ -209,9 +719,10 @@ class WorldMap:
             s += "Đang chờ xây dựng\n"
         if tile.building_name:
             s += f"Công trình: {tile.building_name}\n"
-        if tile.occupants:
+        occupants = self.members_at(x, y)
+        if occupants:
             s += "NPC trên tile:\n"
-            for o in tile.occupants:
+            for o in occupants:
                 s += f" - {o.name} ({o.role})\n"
         return s.strip()
 
@@ -222,45 +733,9 @@ class WorldMap:
             return tx, ty
         return None, None
 
-    def render(self, screen, ox, oy, members, sect, build_queue, camera=None, tile_size=16, highlight_tile=None):
-        font = pygame.font.SysFont("consolas", 10)
-        for x in range(self.view_x, min(self.view_x+self.view_w, self.w)):
-            for y in range(self.view_y, min(self.view_y+self.view_h, self.h)):
-                tile = self.tiles[x][y]
-                color = dict(TILE_TYPES).get(tile.type, (200,200,200))
-                if tile.pending_build:
-                    color = dict(TILE_TYPES).get("pending_build",(250,230,64))
-                rect = pygame.Rect(ox+(x-self.view_x)*tile_size, oy+(y-self.view_y)*tile_size, tile_size, tile_size)
-                pygame.draw.rect(screen, color, rect)
-                pygame.draw.rect(screen, (50,50,60), rect, 1)
-                if tile.resource and tile.resource != "none":
-                    rcolor = dict(RESOURCE_TYPES).get(tile.resource, (100, 80, 60))
-                    pygame.draw.rect(screen, rcolor, rect.inflate(-8,-8))
-                if tile.type in ["building", "home", "workshop", "farm"]:
-                    pygame.draw.rect(screen, (120,80,10), rect.inflate(-4,-4))
-                if tile.pending_build:
-                    pygame.draw.rect(screen, (250,200,40), rect.inflate(-8,-8), border_radius=2)
-                if highlight_tile and (x, y) == highlight_tile:
-                    pygame.draw.rect(screen, (255,255,0), rect, 2)
-        for m in members:
-            if not getattr(m, "alive", True): continue
-            tx, ty = int(m.x), int(m.y)
-            if not (self.view_x <= tx < self.view_x+self.view_w and self.view_y <= ty < self.view_y+self.view_h): continue
-            px, py = ox+(tx-self.view_x)*tile_size, oy+(ty-self.view_y)*tile_size
-            color = (250,210,40) if getattr(m,"role","")=="Tông Chủ" else (90,180,255)
-            border = (255,120,40) if getattr(m,"role","")=="Tông Chủ" else (50,60,70)
-            if getattr(m,"state","") == "building":
-                color = (220,140,50)
-            elif getattr(m,"state","") == "moving":
-                color = (80,120,220)
-            elif getattr(m,"state","") == "collecting":
-                color = (120,180,140)
-            pygame.draw.rect(screen, color, (px+2,py+2,tile_size-4,tile_size-4))
-            pygame.draw.rect(screen, border, (px,py,tile_size,tile_size), 1)
-            label = m.name[0].upper()
-            screen.blit(font.render(label, True, (10,30,40)), (px+tile_size//2-5, py+tile_size//2-7))
-            if getattr(m,"state","") == "building": screen.blit(font.render("X",True,(130,30,0)), (px+tile_size//2-2, py+tile_size//2+1))
-            if getattr(m,"state","") == "moving": screen.blit(font.render("D",True,(40,80,130)), (px+tile_size//2-2, py+tile_size//2+1))
-            if getattr(m,"state","") == "collecting": screen.blit(font.render("C",True,(20,120,60)), (px+tile_size//2-2, py+tile_size//2+1))
-            if camera and camera.following_member == m:
-                pygame.draw.rect(screen, (255,80,80), (px-1, py-1, tile_size+2, tile_size+2), 2)
\ No newline at end of file
+    def render(self, screen, ox, oy, members, sect, build_queue, camera=None, tile_size=16, highlight_tile=None, alpha=1.0):
+        layer = self.map_layers.get(tile_size)
+        if layer is None:
+            from core.map_layer import MapLayer
+            layer = self.map_layers[tile_size] = MapLayer(tile_size)
+        layer.render(self, screen, ox, oy, members, camera, highlight_tile, alpha)
@@ -23,6 +23,9 @@ class GameGUI:
         self.zoom = 1
         self.history_offset = 0
         self.speed = 1  # x1, x3, x10
+        self.alpha = 1.0  # phần lẻ giữa hai tick, do scheduler đặt mỗi frame
+        self.effective_rate = None  # tick/giây thực chạy được
+        self.dropped_ticks = 0  # tổng tick scheduler đã bỏ vì quá ngân sách frame
         self.highlight_tile = None
         self.tile_info = ""
 
@@ -83,7 +86,7 @@ class GameGUI:
         surf = pygame.Surface((self.screen.get_width(), 48))
         surf.fill(self.header_color)
         lines = [
-            f"{s.name} | Giai đoạn: {s.timeline_stage}/5 | Tông Chủ: {s.get_leader().name if s.get_leader() else 'Không rõ'} | Thành viên: {s.get_population()} | Tốc độ: x{self.speed}",
+            f"{s.name} | Giai đoạn: {s.timeline_stage}/5 | Tông Chủ: {s.get_leader().name if s.get_leader() else 'Không rõ'} | Thành viên: {s.get_population()} | Tốc độ: x{self.speed}{'' if self.effective_rate is None else f' ({self.effective_rate:.0f} tick/s)'}{f' | Bỏ {self.dropped_ticks} tick' if self.dropped_ticks else ''}",
             f"Tài nguyên: Nước {s.get_resource('water')} | Thức ăn {s.get_resource('food')} | Đất NN {s.get_resource('farm_land')} | Dụng cụ {s.get_resource('tools')} | Tiền {s.get_resource('money')} | Nổi tiếng: {'Có' if s.is_famous() else 'Chưa'} | Thánh địa: {'Có' if s.has_holy_site() else 'Chưa'}"
         ]
         for i, line in enumerate(lines):
@@ -117,7 +120,7 @@ class GameGUI:
         surf_w = map_w * tile_sz
         surf_h = map_h * tile_sz
         map_surf = pygame.Surface((surf_w, surf_h))
-        self.worldmap.render(map_surf, 0, 0, [m for m in self.sect.members.values() if m.alive], self.sect, self.leader_ai.build_queue, self.camera, tile_size=tile_sz, highlight_tile=self.highlight_tile)
+        self.worldmap.render(map_surf, 0, 0, [m for m in self.sect.members.values() if m.alive], self.sect, self.leader_ai.build_queue, self.camera, tile_size=tile_sz, highlight_tile=self.highlight_tile, alpha=self.alpha)
         self.screen.blit(map_surf, (ox, oy))
 
     def draw_member_detail_panel(self):
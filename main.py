@@ -1,35 +1,43 @@
+import argparse
+import os
 import pygame
-from core.entities import Sect, Role, Division
-from core.sect_manager import SectManager
-from core.sect_leader_ai import SectLeaderAI
-from core.worldmap import WorldMap
+from core.simulation import Simulation
+from core.scheduler import FixedStepScheduler, tick_budget
+from core.autosave import AutoSaver, load_autosave
 from core.camera import Camera
 from gui.game_gui import GameGUI
 
-def main():
+FPS = 60
+TICK_SHARE = 0.5  # tối đa nửa frame cho tick, còn lại cho render
+LOD_INTERVAL = 4  # member ngoài màn hình được xử lý gộp mỗi 4 tick
+LOD_MARGIN = 2
+AUTOSAVE_INTERVAL = 300  # tick, ~10 giây ở 30 tick/s
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Frost World - Tông Chủ Quyết")
+    parser.add_argument("--autosave", default=None, metavar="DIR",
+                        help="Bật autosave vào DIR; DIR đã có autosave thì chơi tiếp từ đó")
+    parser.add_argument("--autosave-interval", type=int, default=AUTOSAVE_INTERVAL)
+    args = parser.parse_args(argv)
+
     pygame.init()
     screen = pygame.display.set_mode((1280, 864))  # H tăng 20%
     pygame.display.set_caption("Frost World - Tông Chủ Quyết")
     clock = pygame.time.Clock()
 
-    manager = SectManager()
-    sect = manager.create_sect("Vô Cực Môn", "Vô Cực Tông Chủ")
-    leader = sect.get_leader()
-    leader_ai = SectLeaderAI(sect, leader.id)
-
-    # Khởi tạo đệ tử
-    manager.add_member("Vô Cực Môn", "A Nhị", Role.DISCIPLE, Division.WORKER, True)
-    manager.add_member("Vô Cực Môn", "A Tam", Role.DISCIPLE, Division.WORKER, True)
-    manager.add_member("Vô Cực Môn", "A Tứ", Role.DISCIPLE, Division.SCOUT, True)
-    manager.add_member("Vô Cực Môn", "A Ngũ", Role.DISCIPLE, Division.LOGISTICS, True)
-    manager.add_member("Vô Cực Môn", "A Đại", Role.DISCIPLE, Division.GUARD, True)
+    sim = None
+    if args.autosave and os.path.isdir(args.autosave):
+        try:
+            sim = load_autosave(args.autosave)
+        except FileNotFoundError:
+            pass  # thư mục trống: bắt đầu ván mới
+    if sim is None:
+        sim = Simulation(lod_interval=LOD_INTERVAL)
+    camera = Camera(sim.worldmap.w, sim.worldmap.h, 640, 500, 16)
+    gui = GameGUI(screen, sim.sect, sim.leader_ai, sim.manager, sim.worldmap, camera)
 
-    worldmap = WorldMap()
-    camera = Camera(worldmap.w, worldmap.h, 640, 500, 16)
-    gui = GameGUI(screen, sect, leader_ai, manager, worldmap, camera)
-
-    # Resource tổng: bổ sung các loại
-    materials = {"wood": 20, "stone": 20, "food": 10, "water": 10, "soil": 20}
+    scheduler = FixedStepScheduler(frame_budget=tick_budget(FPS, TICK_SHARE))
+    autosave = AutoSaver(sim, args.autosave, args.autosave_interval) if args.autosave else None
     running = True
     while running:
         for event in pygame.event.get():
@@ -46,25 +54,28 @@ def main():
                 elif event.key == pygame.K_s:
                     camera.move(0, 4)
 
-        # AI leader quyết định blueprint, clear, build, task
-        leader_ai.decide_action(worldmap, materials)
-        leader_ai.sync_build_queue(worldmap, materials)
-
-        # NPC di chuyển, collect, build, resource tăng đúng
-        worldmap.member_move_tick([m for m in sect.members.values() if m.alive], leader_ai.build_queue, leader_ai.collect_queue, resources=materials)
-        worldmap.update_member_positions([m for m in sect.members.values() if m.alive])
-
-        for _ in range(gui.speed-1):  # Speed x3, x10...
-            leader_ai.decide_action(worldmap, materials)
-            leader_ai.sync_build_queue(worldmap, materials)
-            worldmap.member_move_tick([m for m in sect.members.values() if m.alive], leader_ai.build_queue, leader_ai.collect_queue, resources=materials)
-            worldmap.update_member_positions([m for m in sect.members.values() if m.alive])
+        # Tick chạy theo nhịp cố định, speed chỉ nhân nhịp; frame quá tải thì bỏ tick
+        # Vùng đang hiện và vài ô quanh camera chạy chi tiết, ngoài đó gộp tick
+        wm = sim.worldmap
+        sim.set_view([camera.view_rect(LOD_MARGIN), (wm.view_x - LOD_MARGIN, wm.view_y - LOD_MARGIN,
+                      wm.view_x + wm.view_w - 1 + LOD_MARGIN, wm.view_y + wm.view_h - 1 + LOD_MARGIN)],
+                     camera.following_member)
+        scheduler.speed = gui.speed
+        scheduler.advance(sim.step)
+        # Chỉ chụp phần đã đổi, ghi file ở thread nền
+        if autosave is not None:
+            autosave.maybe_checkpoint()
+        gui.alpha = scheduler.alpha
+        gui.effective_rate = scheduler.effective_rate
+        gui.dropped_ticks = scheduler.stats["dropped"]
 
         gui.update()
         gui.render()
         pygame.display.flip()
-        clock.tick(30)
+        clock.tick(FPS)
 
+    if autosave is not None:
+        autosave.close()
     pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,22 @@
+from core.multisect import MultiSectSimulation
+
+OPTS = dict(sects=4, w=96, h=96, seed=1, members_per_sect=5)
+
+def _digest(ticks, **kwargs):
+    sim = MultiSectSimulation(**dict(OPTS, **kwargs))
+    try:
+        sim.run(ticks)
+        return sim.digest(), sim.stats
+    finally:
+        sim.close()
+
+def test_workers_match_single_process():
+    ref, _ = _digest(300, partitions=1)
+    got, stats = _digest(300, partitions=2, workers=2)
+    assert got == ref
+    assert stats["barriers"] == 300
+
+def test_barrier_and_lod_match_single_process():
+    ref, _ = _digest(300, partitions=1, barrier_interval=3, lod_interval=4)
+    got, _ = _digest(300, partitions=2, workers=2, barrier_interval=3, lod_interval=4)
+    assert got == ref
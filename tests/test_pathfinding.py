@@ -0,0 +1,31 @@
+import random
+
+from core.pathfinding import FlowField, UNREACHED
+from core.worldmap import WorldMap
+
+REGION = (18, 18, 23, 23)
+
+def _check_against_rebuild(wm, field):
+    fresh = FlowField(wm, REGION, margin=12)
+    assert list(field.dist) == list(fresh.dist)
+    # Ô kế tiếp có thể khác khi nhiều hàng xóm cùng khoảng cách, chỉ cần hợp lệ
+    for li, d in enumerate(field.dist):
+        nli = field.next[li]
+        if d == UNREACHED or d == 0:
+            assert nli == -1
+        else:
+            assert field.dist[nli] == d - 1 and wm.is_passable(*field._coords(nli))
+
+def test_flow_field_repair_matches_rebuild():
+    rng = random.Random(3)
+    wm = WorldMap(48, 48, seed=11)
+    # Đăng ký thẳng vào world để mọi đổi passable đi qua on_passability_change
+    field = wm.flow_fields[REGION] = FlowField(wm, REGION, margin=12)
+    for step in range(300):
+        x, y = rng.randint(4, 37), rng.randint(4, 37)
+        tile = wm.get_tile(x, y)
+        tile.type = "field" if tile.type == "river" else "river"
+        if step % 10 == 0:
+            _check_against_rebuild(wm, field)
+    _check_against_rebuild(wm, field)
+    assert field.stats["updates"] > 0 and field.stats["rebuilds"] == 1
@@ -0,0 +1,44 @@
+from core.autosave import AutoSaver, load_autosave
+from core.rng import seed_all
+from core.savegame import check_resume, save_simulation
+from core.simulation import Simulation
+
+def _simulation(seed, lod_interval=1):
+    seed_all(seed)
+    sim = Simulation(lod_interval=lod_interval)
+    # Ngân sách AI theo lát việc thay vì thời gian để kết quả tất định
+    sim.leader_ai.cfg.slice_work_units = 8
+    return sim
+
+def _saved(sim, path):
+    save_simulation(sim, str(path))
+    with open(path, "rb") as f:
+        return f.read()
+
+def test_resume_matches_straight_run(tmp_path):
+    assert check_resume(_simulation(5), 150, 400, directory=tmp_path) == []
+
+def test_resume_matches_straight_run_with_lod(tmp_path):
+    assert check_resume(_simulation(2, lod_interval=4), 300, 900, directory=tmp_path) == []
+
+def test_same_seed_same_save(tmp_path):
+    a, b = _simulation(9), _simulation(9)
+    a.run(200)
+    b.run(200)
+    assert _saved(a, tmp_path / "a.fws") == _saved(b, tmp_path / "b.fws")
+
+def test_autosave_round_trip(tmp_path):
+    sim = _simulation(4, lod_interval=2)
+    saver = AutoSaver(sim, str(tmp_path / "auto"), interval=40, compact_every=3)
+    for _ in range(500):
+        sim.step()
+        saver.maybe_checkpoint()
+    saver.checkpoint()
+    saver.close()
+    loaded = load_autosave(str(tmp_path / "auto"))
+    assert loaded.tick == sim.tick
+    assert _saved(loaded, tmp_path / "loaded.fws") == _saved(sim, tmp_path / "sim.fws")
+    # Chạy tiếp từ bản nạp phải đi đúng đường của bản gốc
+    sim.run(200)
+    loaded.run(200)
+    assert _saved(loaded, tmp_path / "loaded.fws") == _saved(sim, tmp_path / "sim.fws")
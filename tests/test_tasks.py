@@ -0,0 +1,48 @@
+import random
+
+from core.tasks import TaskQueue
+
+TYPES = ("collect", "build", "patrol", None)
+
+def _best(model, task_type=None, n=1):
+    # Mô hình tham chiếu: sắp lại toàn bộ task còn sống theo (priority, id)
+    live = [t for t in model.values() if task_type is None or t.get("type") == task_type]
+    return sorted(live, key=lambda t: (t["priority"], t["id"]))[:n]
+
+def test_task_queue_matches_reference_model():
+    rng = random.Random(7)
+    queue, model = TaskQueue(), {}
+    for _ in range(5000):
+        op = rng.random()
+        task_type = rng.choice(TYPES)
+        if op < 0.4:
+            task = {"type": task_type}
+            if rng.random() < 0.8:
+                task["priority"] = rng.randint(0, 20)
+            tid = queue.push(task)
+            model[tid] = task
+        elif op < 0.55:
+            want = _best(model, task_type)
+            got = queue.pop(task_type)
+            assert got == (want[0] if want else None)
+            if got is not None:
+                del model[got["id"]]
+        elif op < 0.7 and model:
+            tid = rng.choice(list(model) + [-1])
+            assert queue.remove(tid) is model.pop(tid, None)
+        elif op < 0.8:
+            n = rng.randint(1, 5)
+            assert queue.peek_many(n, task_type) == _best(model, task_type, n)
+        elif op < 0.85:
+            n = rng.randint(1, 3)
+            got = queue.pop_many(n, task_type)
+            assert got == _best(model, task_type, n)
+            for task in got:
+                del model[task["id"]]
+        elif op < 0.9:
+            queue.remove_where(lambda t: t["priority"] % 7 == 0)
+            model = {tid: t for tid, t in model.items() if t["priority"] % 7 != 0}
+        assert len(queue) == len(model)
+        assert queue.count(task_type) == len(_best(model, task_type, len(model)))
+        assert queue.peek() == (_best(model)[0] if model else None)
+    assert sorted(t["id"] for t in queue.to_list()) == sorted(model)